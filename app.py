@@ -5,390 +5,3802 @@
 # Nama author tidak boleh diubah atau dihapus.
 
 import os
+import re
+import gzip
+import base64
+import io
+import csv
+import json
+import time
+import math
+import random
+import bisect
+import fnmatch
+import itertools
+import textwrap
+import hmac
+import queue
+import hashlib
 import secrets
+import logging
+import sqlite3
+import mimetypes
+import threading
+from collections import OrderedDict, deque
+import brotli
 import requests
 from dotenv import load_dotenv
-from flask_compress import Compress
+from urllib.parse import urlencode, urlsplit, parse_qsl, unquote_plus
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session
+from werkzeug.security import safe_join
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, render_template, redirect, url_for, session, send_from_directory, g
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
+logger = logging.getLogger(__name__)
+
+# Route, hook dan error handler didaftarkan ke blueprint ini; app Flask-nya
+# dibangun oleh create_app()
+routes = Blueprint('main', __name__, cli_group=None)
 
 # Konfigurasi dari environment variables atau fallback ke default
 FB_APP_ID = os.getenv('FB_APP_ID')
 FB_APP_SECRET = os.getenv('FB_APP_SECRET')
 REDIRECT_URI = os.getenv('REDIRECT_URI')
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(32))
+SECRET_KEY = os.getenv('SECRET_KEY', secrets.token_hex(32))
+
+# Graph API (versi dan base URL hanya didefinisikan di sini)
+GRAPH_API_VERSION = 'v18.0'
+GRAPH_BASE_URL = os.getenv('GRAPH_BASE_URL', 'https://graph.facebook.com')
+GRAPH_API_URL = f'{GRAPH_BASE_URL.rstrip("/")}/{GRAPH_API_VERSION}'
+GRAPH_POOL_SIZE = int(os.getenv('GRAPH_POOL_SIZE', '20'))
+GRAPH_CONNECT_TIMEOUT = float(os.getenv('GRAPH_CONNECT_TIMEOUT', '5'))
+GRAPH_TIMEOUT = float(os.getenv('GRAPH_TIMEOUT', '15'))
+GRAPH_PROXY_TIMEOUT = float(os.getenv('GRAPH_PROXY_TIMEOUT', '20'))
+GRAPH_STREAM_CHUNK_SIZE = int(os.getenv('GRAPH_STREAM_CHUNK_SIZE', '65536'))
+GRAPH_FANOUT_WORKERS = int(os.getenv('GRAPH_FANOUT_WORKERS', '32'))
+GRAPH_COALESCE = os.getenv('GRAPH_COALESCE', '1') == '1'
+VALIDATE_DEADLINE = float(os.getenv('VALIDATE_DEADLINE', '20'))
+BULK_VALIDATE_MAX = int(os.getenv('BULK_VALIDATE_MAX', '100'))
+BULK_VALIDATE_CONCURRENCY = int(os.getenv('BULK_VALIDATE_CONCURRENCY', '4'))
+DEBUG_TOKEN_MAX = int(os.getenv('DEBUG_TOKEN_MAX', '1000'))
+GRAPH_PAGINATE_MAX_ITEMS = int(os.getenv('GRAPH_PAGINATE_MAX_ITEMS', '10000'))
+GRAPH_PAGINATE_MAX_PAGES = int(os.getenv('GRAPH_PAGINATE_MAX_PAGES', '100'))
+GRAPH_PAGINATE_MAX_BYTES = int(os.getenv('GRAPH_PAGINATE_MAX_BYTES', str(64 * 1024 * 1024)))
+GRAPH_BATCH_SIZE = int(os.getenv('GRAPH_BATCH_SIZE', '50'))
+GRAPH_BATCH_MAX_OPERATIONS = int(os.getenv('GRAPH_BATCH_MAX_OPERATIONS', '1000'))
+GRAPH_BATCH_CONCURRENCY = int(os.getenv('GRAPH_BATCH_CONCURRENCY', '4'))
+PAGES_PAGE_SIZE = int(os.getenv('PAGES_PAGE_SIZE', '100'))
+EXPORT_MAX_ACCOUNTS = int(os.getenv('EXPORT_MAX_ACCOUNTS', '5000'))
+EXPORT_CONCURRENCY = int(os.getenv('EXPORT_CONCURRENCY', '4'))
+EXPORT_MAX_FORM_BYTES = int(os.getenv('EXPORT_MAX_FORM_BYTES', str(64 * 1024 * 1024)))
+TOKEN_EVENTS_MAX_TOKENS = int(os.getenv('TOKEN_EVENTS_MAX_TOKENS', '500'))
+TOKEN_EVENTS_RECHECK = float(os.getenv('TOKEN_EVENTS_RECHECK', '300'))
+TOKEN_EVENTS_KEEPALIVE = float(os.getenv('TOKEN_EVENTS_KEEPALIVE', '15'))
+TOKEN_EVENTS_MAX_AGE = float(os.getenv('TOKEN_EVENTS_MAX_AGE', '3600'))
+# Stream token events menahan satu thread worker WSGI selama terbuka, jadi
+# di app.py hanya aktif kalau diminta; asgi.py selalu mengaktifkannya
+TOKEN_EVENTS_WSGI = os.getenv('TOKEN_EVENTS_WSGI', '0') == '1'
+PAGES_MAX_PAGES = int(os.getenv('PAGES_MAX_PAGES', '50'))
+
+# Webhook Facebook (deauthorize callback dan permissions webhook): event
+# diantrikan per proses dan diproses worker background per batch
+FB_WEBHOOK_VERIFY_TOKEN = os.getenv('FB_WEBHOOK_VERIFY_TOKEN')
+WEBHOOK_QUEUE_MAX = int(os.getenv('WEBHOOK_QUEUE_MAX', '10000'))
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '100'))
+WEBHOOK_BATCH_WAIT = float(os.getenv('WEBHOOK_BATCH_WAIT', '0.5'))
+
+# Cache hasil introspeksi token (TTL dalam detik, 0 = tidak di-cache)
+INTROSPECTION_CACHE_MAX_BYTES = int(os.getenv('INTROSPECTION_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+# Cache response GET Graph Explorer (opt-in): daftar pola=TTL dipisah koma,
+# pola glob dicocokkan ke path dengan ID numerik diganti {id}, misalnya
+# GRAPH_CACHE_TTLS="me=60,{id}=300,{id}/insights*=600"
+GRAPH_CACHE_TTLS = [
+  (pattern.strip(), float(ttl))
+  for pattern, _, ttl in (
+    item.rpartition('=') for item in os.getenv('GRAPH_CACHE_TTLS', '').split(',') if '=' in item
+  )
+]
+GRAPH_CACHE_MAX_BYTES = int(os.getenv('GRAPH_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+GRAPH_CACHE_MAX_OBJECTS = int(os.getenv('GRAPH_CACHE_MAX_OBJECTS', '100000'))
+INTROSPECTION_TTLS = {
+  'profile': float(os.getenv('CACHE_PROFILE_TTL', '300')),
+  'permissions': float(os.getenv('CACHE_PERMISSIONS_TTL', '60')),
+  'pages': float(os.getenv('CACHE_PAGES_TTL', '300')),
+  'exchange': float(os.getenv('CACHE_EXCHANGE_TTL', '3600')),
+  'debug': float(os.getenv('CACHE_DEBUG_TTL', '60'))
+}
+
+# Rate limit Graph API: persentase usage dari header X-App-Usage dan
+# X-Business-Use-Case-Usage. Di atas THROTTLE call diperlambat, di atas
+# BLOCK call ditolak lokal dengan 429 sampai cooldown selesai.
+GRAPH_USAGE_THROTTLE = float(os.getenv('GRAPH_USAGE_THROTTLE', '80'))
+GRAPH_USAGE_BLOCK = float(os.getenv('GRAPH_USAGE_BLOCK', '100'))
+GRAPH_THROTTLE_MAX_DELAY = float(os.getenv('GRAPH_THROTTLE_MAX_DELAY', '2'))
+GRAPH_USAGE_COOLDOWN = float(os.getenv('GRAPH_USAGE_COOLDOWN', '60'))
+GRAPH_USAGE_STALE = float(os.getenv('GRAPH_USAGE_STALE', '300'))
+
+# Resilience Graph call: GET di-retry dengan backoff + jitter dalam budget
+# timeout call, hedged request (opt-in) dikirim kalau call pertama lebih lambat
+# dari kuantil latency terakhir, circuit breaker menolak call lokal kalau
+# Graph API sedang bermasalah
+GRAPH_RETRY_MAX = int(os.getenv('GRAPH_RETRY_MAX', '2'))
+GRAPH_RETRY_BASE_DELAY = float(os.getenv('GRAPH_RETRY_BASE_DELAY', '0.1'))
+GRAPH_RETRY_MAX_DELAY = float(os.getenv('GRAPH_RETRY_MAX_DELAY', '2'))
+GRAPH_HEDGE = os.getenv('GRAPH_HEDGE', '0') == '1'
+GRAPH_HEDGE_QUANTILE = float(os.getenv('GRAPH_HEDGE_QUANTILE', '0.95'))
+GRAPH_HEDGE_MIN_DELAY = float(os.getenv('GRAPH_HEDGE_MIN_DELAY', '0.05'))
+GRAPH_HEDGE_MAX_RATIO = float(os.getenv('GRAPH_HEDGE_MAX_RATIO', '0.1'))
+GRAPH_HEDGE_WORKERS = int(os.getenv('GRAPH_HEDGE_WORKERS', '64'))
+GRAPH_BREAKER_WINDOW = int(os.getenv('GRAPH_BREAKER_WINDOW', '20'))
+GRAPH_BREAKER_FAILURE_RATIO = float(os.getenv('GRAPH_BREAKER_FAILURE_RATIO', '0.5'))
+GRAPH_BREAKER_COOLDOWN = float(os.getenv('GRAPH_BREAKER_COOLDOWN', '30'))
+
+# State backend: 'memory' (default, per proses), 'sqlite:///path/state.db'
+# (bersama untuk semua worker di satu mesin) atau 'redis://host:6379/0'
+# (bersama antar mesin, server apa pun yang bicara protokol Redis)
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+STATE_NAMESPACE = os.getenv('STATE_NAMESPACE', 'fb-oauth')
+STATE_SYNC_INTERVAL = float(os.getenv('STATE_SYNC_INTERVAL', '1'))
+
+# Metrics (/metrics, format teks Prometheus)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_MAX_PATHS = int(os.getenv('METRICS_MAX_PATHS', '200'))
+
+# Token registry server-side (opsional): token dan hasil validasi disimpan
+# terenkripsi di SQLite, worker background me-refresh token sebelum expired
+TOKEN_REGISTRY_PATH = os.getenv('TOKEN_REGISTRY_PATH')
+TOKEN_REGISTRY_KEY = os.getenv('TOKEN_REGISTRY_KEY') or os.getenv('SECRET_KEY')
+TOKEN_REFRESH_BEFORE = float(os.getenv('TOKEN_REFRESH_BEFORE', str(7 * 24 * 3600)))
+TOKEN_RECHECK_INTERVAL = float(os.getenv('TOKEN_RECHECK_INTERVAL', '3600'))
+TOKEN_REFRESH_INTERVAL = float(os.getenv('TOKEN_REFRESH_INTERVAL', '60'))
+TOKEN_REFRESH_BATCH = int(os.getenv('TOKEN_REFRESH_BATCH', '50'))
+
+# Static assets (build: minify + fingerprint + pre-compress ke static/dist)
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_DIST_DIR = os.path.join(STATIC_FOLDER, 'dist')
+STATIC_BUILD_ON_STARTUP = os.getenv('STATIC_BUILD_ON_STARTUP', '1') == '1'
+# Cache bytecode template Jinja di disk, jadi worker baru tidak compile ulang template
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR')
+PRECOMPRESS_EXTENSIONS = {'.css', '.js', '.json', '.webmanifest', '.svg', '.ico', '.txt'}
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+
+def default_config():
+  """Config Flask dari environment variables, di-override lewat create_app(config)"""
+  return {
+    'SECRET_KEY': SECRET_KEY,
+    # Session configuration for security
+    'SESSION_COOKIE_SECURE': True,
+    'SESSION_COOKIE_HTTPONLY': True,
+    'SESSION_COOKIE_SAMESITE': 'Lax',
+    'PERMANENT_SESSION_LIFETIME': timedelta(minutes=30),
+    # Compression
+    'COMPRESS_ALGORITHM': ['br', 'gzip'],
+    'COMPRESS_LEVEL': 9,
+    'COMPRESS_MIN_SIZE': 500,
+    'TOKEN_EVENTS': TOKEN_EVENTS_WSGI,
+    'TEMPLATE_CACHE_DIR': TEMPLATE_CACHE_DIR,
+    # Graph client
+    'GRAPH_API_URL': GRAPH_API_URL,
+    'GRAPH_POOL_SIZE': GRAPH_POOL_SIZE,
+    'GRAPH_CONNECT_TIMEOUT': GRAPH_CONNECT_TIMEOUT,
+    'GRAPH_TIMEOUT': GRAPH_TIMEOUT
+  }
+
+# ==================== SECURITY HELPERS ====================
+
+def generate_state_token():
+  """Generate random state token for CSRF protection"""
+  return secrets.token_urlsafe(32)
+
+def verify_state_token(provided_state):
+  """Verify state token matches session"""
+  session_state = session.get('oauth_state')
+  if not session_state or not provided_state:
+    return False
+  return secrets.compare_digest(session_state, provided_state)
+
+# ==================== METRICS ====================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def escape_label(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(label_names, labels, extra=None):
+  """Format label Prometheus: {a="x",b="y"}"""
+  pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(label_names, labels)]
+  if extra:
+    pairs.append(f'{extra[0]}="{extra[1]}"')
+  return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Histogram:
+  """Histogram Prometheus dengan label; observe() cukup satu bisect dan satu lock"""
+
+  def __init__(self, name, help_text, label_names, buckets):
+    self.name = name
+    self.help_text = help_text
+    self.label_names = tuple(label_names)
+    self.buckets = tuple(buckets)
+    self._series = {}
+    self._lock = threading.Lock()
+
+  def observe(self, value, *labels):
+    index = bisect.bisect_left(self.buckets, value)
+    with self._lock:
+      series = self._series.get(labels)
+      if series is None:
+        series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+      series[0][index] += 1
+      series[1] += value
+
+  def render(self):
+    with self._lock:
+      snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+    
+    lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+    for labels, counts, total in sorted(snapshot):
+      cumulative = 0
+      for bound, count in zip(self.buckets + (float('inf'),), counts):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(float(bound))
+        bucket_labels = format_labels(self.label_names, labels, ('le', le))
+        lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+      lines.append(f'{self.name}_sum{format_labels(self.label_names, labels)} {total}')
+      lines.append(f'{self.name}_count{format_labels(self.label_names, labels)} {cumulative}')
+    return lines
+
+class Counter:
+  """Counter Prometheus dengan label"""
+
+  def __init__(self, name, help_text, label_names):
+    self.name = name
+    self.help_text = help_text
+    self.label_names = tuple(label_names)
+    self._values = {}
+    self._lock = threading.Lock()
+
+  def inc(self, *labels, amount=1):
+    with self._lock:
+      self._values[labels] = self._values.get(labels, 0) + amount
+
+  def render(self):
+    with self._lock:
+      snapshot = sorted(self._values.items())
+    lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+    for labels, value in snapshot:
+      lines.append(f'{self.name}{format_labels(self.label_names, labels)} {value}')
+    return lines
+
+# Semua metric yang ditampilkan di /metrics; collector adalah fungsi tanpa
+# argumen yang mengembalikan baris teks Prometheus (untuk nilai yang dibaca
+# saat scrape, misalnya statistik cache)
+metrics_registry = []
+metrics_collectors = []
+
+def register_metric(metric):
+  metrics_registry.append(metric)
+  return metric
+
+def render_metrics():
+  """Semua metric dalam format teks Prometheus"""
+  lines = []
+  for metric in metrics_registry:
+    lines.extend(metric.render())
+  for collector in metrics_collectors:
+    lines.extend(collector())
+  return '\n'.join(lines) + '\n'
+
+graph_call_seconds = register_metric(Histogram(
+  'graph_call_duration_seconds',
+  'Durasi Graph API call keluar sampai header response diterima',
+  ('operation', 'path', 'status'),
+  LATENCY_BUCKETS
+))
+http_request_seconds = register_metric(Histogram(
+  'http_request_duration_seconds',
+  'Durasi request Flask per route sampai response siap dikirim',
+  ('route', 'method', 'status'),
+  LATENCY_BUCKETS
+))
+http_response_bytes = register_metric(Histogram(
+  'http_response_size_bytes',
+  'Ukuran body response sebelum dan sesudah kompresi',
+  ('route', 'stage'),
+  SIZE_BUCKETS
+))
+
+# Operasi logis untuk path Graph yang dipakai aplikasi; path lain (Graph
+# Explorer) dicatat sebagai template dengan ID diganti {id}
+GRAPH_OPERATIONS = {
+  '': 'batch',
+  'me': 'me',
+  'me/permissions': 'permissions',
+  'me/accounts': 'accounts',
+  'oauth/access_token': 'token_exchange'
+}
+GRAPH_ID_SEGMENT = re.compile(r'\d+(_\d+)?')
+GRAPH_VERSION_SEGMENT = re.compile(r'v\d+\.\d+')
+graph_path_templates = set()
+
+def normalize_graph_path(path):
+  """Path Graph tanpa versi dengan ID numerik diganti {id} (misalnya {id}/feed)"""
+  segments = path.strip('/').split('/')
+  if segments and GRAPH_VERSION_SEGMENT.fullmatch(segments[0]):
+    segments = segments[1:]
+  return '/'.join('{id}' if GRAPH_ID_SEGMENT.fullmatch(segment) else segment for segment in segments)
+
+def graph_path_template(path):
+  """Template path Graph untuk label metrics, dibatasi METRICS_MAX_PATHS variasi"""
+  template = normalize_graph_path(path)
+  if template not in graph_path_templates:
+    if len(graph_path_templates) >= METRICS_MAX_PATHS:
+      return 'other'
+    graph_path_templates.add(template)
+  return template
+
+def observe_graph_call(operation, path, status, seconds):
+  """Catat satu Graph call; operation None = ditentukan dari path"""
+  template = graph_path_template(path)
+  if operation is None:
+    operation = GRAPH_OPERATIONS.get(template, 'other')
+  graph_call_seconds.observe(seconds, operation, template, status)
+
+# ==================== STATE BACKEND ====================
+
+state_backend_errors = register_metric(Counter(
+  'state_backend_errors_total',
+  'Operasi state backend bersama yang gagal (dianggap cache miss)',
+  ('operation',)
+))
+
+def state_key(key):
+  """Key string untuk backend bersama dari key cache (tuple), token tidak pernah muncul apa adanya"""
+  return hashlib.sha256(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+
+class MemoryBackend:
+  """State in-process (default): setiap worker punya cache dan state sendiri"""
+
+  shared = False
+  errors = ()
+
+  def cache(self, namespace, max_bytes, private=None):
+    return TTLCache(max_bytes)
+
+class SQLiteBackend:
+  """State bersama di file SQLite untuk semua worker di satu mesin
+  
+  Satu tabel key-value dengan waktu expired absolut; entry expired tidak
+  pernah dikembalikan dan dibersihkan berkala setiap purge_every write.
+  """
+
+  shared = True
+  errors = (sqlite3.Error,)
+  SCHEMA = """
+    CREATE TABLE IF NOT EXISTS state (
+      namespace TEXT NOT NULL,
+      key TEXT NOT NULL,
+      value TEXT NOT NULL,
+      expires_at REAL NOT NULL,
+      PRIMARY KEY (namespace, key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS state_expiry ON state (expires_at);
+  """
+
+  def __init__(self, path, prefix, purge_every=1000):
+    self.path = path
+    self.prefix = prefix
+    self.purge_every = purge_every
+    self._writes = itertools.count(1)
+    self._local = threading.local()
+    with self.connection() as conn:
+      conn.executescript(self.SCHEMA)
+
+  def connection(self):
+    """Koneksi SQLite per thread (dibuat ulang setelah fork)"""
+    conn = getattr(self._local, 'conn', None)
+    if conn is None or self._local.pid != os.getpid():
+      conn = sqlite3.connect(self.path, timeout=10)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      self._local.conn = conn
+      self._local.pid = os.getpid()
+    return conn
+
+  def namespace(self, namespace):
+    return f'{self.prefix}:{namespace}'
+
+  def cache(self, namespace, max_bytes, private=None):
+    return shared_cache(self, namespace, max_bytes, private)
+
+  def get_many(self, namespace, keys):
+    """Value untuk semua key dalam satu query, None untuk key yang tidak ada/expired"""
+    rows = self.connection().execute(
+      f'SELECT key, value FROM state WHERE namespace = ? AND key IN ({",".join("?" * len(keys))}) AND expires_at > ?',
+      (self.namespace(namespace), *keys, time.time())
+    ).fetchall()
+    found = dict(rows)
+    return [json.loads(found[key]) if key in found else None for key in keys]
+
+  def set_many(self, namespace, items):
+    """Simpan list (key, value, ttl) dalam satu transaksi"""
+    now = time.time()
+    with self.connection() as conn:
+      conn.executemany(
+        'INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+        [(self.namespace(namespace), key, json.dumps(value), now + ttl) for key, value, ttl in items]
+      )
+      if next(self._writes) % self.purge_every == 0:
+        conn.execute('DELETE FROM state WHERE expires_at <= ?', (now,))
+
+  def delete_many(self, namespace, keys):
+    with self.connection() as conn:
+      conn.executemany(
+        'DELETE FROM state WHERE namespace = ? AND key = ?',
+        [(self.namespace(namespace), key) for key in keys]
+      )
+
+  def clear(self, namespace):
+    with self.connection() as conn:
+      conn.execute('DELETE FROM state WHERE namespace = ?', (self.namespace(namespace),))
+
+class RedisBackend:
+  """State bersama di server protokol Redis (Redis, Valkey, KeyDB, Dragonfly)
+  
+  Semua key diberi prefix '<prefix>:<namespace>:' dengan TTL native server;
+  multi-get memakai MGET dan multi-write memakai pipeline, jadi satu round trip.
+  """
+
+  shared = True
+
+  def __init__(self, url, prefix):
+    try:
+      import redis
+    except ImportError:
+      raise RuntimeError('STATE_BACKEND redis:// membutuhkan package redis (pip install -r requirements-redis.txt)')
+    self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+    self.prefix = prefix
+    self.errors = (redis.RedisError,)
+
+  def key(self, namespace, key):
+    return f'{self.prefix}:{namespace}:{key}'
+
+  def cache(self, namespace, max_bytes, private=None):
+    return shared_cache(self, namespace, max_bytes, private)
+
+  def get_many(self, namespace, keys):
+    values = self.client.mget([self.key(namespace, key) for key in keys])
+    return [json.loads(value) if value is not None else None for value in values]
+
+  def set_many(self, namespace, items):
+    pipe = self.client.pipeline(transaction=False)
+    for key, value, ttl in items:
+      pipe.set(self.key(namespace, key), json.dumps(value), px=max(1, int(ttl * 1000)))
+    pipe.execute()
+
+  def delete_many(self, namespace, keys):
+    self.client.delete(*[self.key(namespace, key) for key in keys])
+
+  def clear(self, namespace):
+    keys = []
+    for key in self.client.scan_iter(match=self.key(namespace, '*'), count=1000):
+      keys.append(key)
+      if len(keys) >= 1000:
+        self.client.delete(*keys)
+        keys = []
+    if keys:
+      self.client.delete(*keys)
+
+class SharedCache:
+  """Cache dengan interface TTLCache di atas state backend bersama
+  
+  Key di-hash dengan state_key() dan value disimpan sebagai JSON. Kalau
+  backend tidak bisa dihubungi, get dianggap miss dan write diabaikan
+  (dicatat di state_backend_errors_total), request tetap jalan.
+  """
+
+  def __init__(self, backend, namespace, max_bytes):
+    self.backend = backend
+    self.namespace = namespace
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    return self.get_many([key])[0]
+
+  def get_many(self, keys):
+    """Ambil banyak key dalam satu round trip ke backend"""
+    if not keys:
+      return []
+    try:
+      values = self.backend.get_many(self.namespace, [state_key(key) for key in keys])
+    except self.backend.errors:
+      state_backend_errors.inc('get')
+      values = [None] * len(keys)
+    hits = sum(value is not None for value in values)
+    with self._lock:
+      self.hits += hits
+      self.misses += len(values) - hits
+    return values
+
+  def set(self, key, value, ttl):
+    self.set_many([(key, value, ttl)])
+
+  def set_many(self, items):
+    """Simpan list (key, value, ttl); entry dengan TTL 0 atau melebihi max_bytes dilewati"""
+    items = [
+      (state_key(key), value, ttl) for key, value, ttl in items
+      if ttl > 0 and len(json.dumps(value, default=str)) <= self.max_bytes
+    ]
+    if not items:
+      return
+    try:
+      self.backend.set_many(self.namespace, items)
+    except self.backend.errors:
+      state_backend_errors.inc('set')
+
+  def delete(self, key):
+    self.delete_many([key])
+
+  def delete_many(self, keys):
+    try:
+      self.backend.delete_many(self.namespace, [state_key(key) for key in keys])
+    except self.backend.errors:
+      state_backend_errors.inc('delete')
+
+  def clear(self):
+    try:
+      self.backend.clear(self.namespace)
+    except self.backend.errors:
+      state_backend_errors.inc('clear')
+
+  def stats(self):
+    """Jumlah entry dan ukuran tidak dihitung untuk backend bersama (None)"""
+    with self._lock:
+      return {'entries': None, 'bytes': None, 'hits': self.hits, 'misses': self.misses, 'evictions': None}
+
+class SplitCache:
+  """Cache bersama yang menyimpan entry berisi token hanya di memori proses
+  
+  Entry yang memenuhi private(key, value) (long-lived token hasil exchange,
+  page token, response Graph dengan field access_token) ditulis ke TTLCache
+  lokal dan tidak pernah dikirim ke SQLite/Redis dalam bentuk plaintext;
+  sisanya ke backend bersama. get mencari di cache lokal dulu.
+  """
+
+  def __init__(self, shared, local, private):
+    self.shared = shared
+    self.local = local
+    self.private = private
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    return self.get_many([key])[0]
+
+  def get_many(self, keys):
+    values = self.local.get_many(keys)
+    missing = [index for index, value in enumerate(values) if value is None]
+    if missing:
+      for index, value in zip(missing, self.shared.get_many([keys[index] for index in missing])):
+        values[index] = value
+    hits = sum(value is not None for value in values)
+    with self._lock:
+      self.hits += hits
+      self.misses += len(values) - hits
+    return values
+
+  def set(self, key, value, ttl):
+    self.set_many([(key, value, ttl)])
+
+  def set_many(self, items):
+    local_items, shared_items = [], []
+    for key, value, ttl in items:
+      (local_items if self.private(key, value) else shared_items).append((key, value, ttl))
+    self.local.set_many(local_items)
+    self.shared.set_many(shared_items)
+
+  def delete(self, key):
+    self.delete_many([key])
+
+  def delete_many(self, keys):
+    self.local.delete_many(keys)
+    self.shared.delete_many(keys)
+
+  def clear(self):
+    self.local.clear()
+    self.shared.clear()
+
+  def stats(self):
+    with self._lock:
+      return {'entries': None, 'bytes': None, 'hits': self.hits, 'misses': self.misses, 'evictions': None}
+
+def shared_cache(backend, namespace, max_bytes, private=None):
+  """SharedCache untuk backend bersama, dibungkus SplitCache kalau ada entry private"""
+  cache = SharedCache(backend, namespace, max_bytes)
+  if private is None:
+    return cache
+  return SplitCache(cache, TTLCache(max_bytes), private)
+
+def has_access_token(value):
+  """True kalau value (hasil JSON) mengandung field access_token di level mana pun"""
+  if isinstance(value, dict):
+    return 'access_token' in value or any(has_access_token(item) for item in value.values())
+  if isinstance(value, list):
+    return any(has_access_token(item) for item in value)
+  return False
+
+def make_state_backend(url):
+  """State backend dari STATE_BACKEND"""
+  if url in ('', 'memory'):
+    return MemoryBackend()
+  if url.startswith('sqlite:///'):
+    return SQLiteBackend(url[len('sqlite:///'):], STATE_NAMESPACE)
+  if url.startswith(('redis://', 'rediss://', 'unix://')):
+    return RedisBackend(url, STATE_NAMESPACE)
+  raise ValueError(f'STATE_BACKEND tidak dikenal: {url}')
+
+state_backend = make_state_backend(STATE_BACKEND)
+
+# ==================== RATE LIMIT ====================
+
+# Kode error Graph untuk rate limit: 4 = level app, 17 = user, 32 = page,
+# 613 = custom, 80001-80014 = business use case
+APP_LIMIT_CODES = {4}
+TOKEN_LIMIT_CODES = {17, 32, 613} | set(range(80001, 80015))
+
+def parse_usage_header(value):
+  try:
+    return json.loads(value)
+  except ValueError:
+    return None
+
+def usage_percent(usage):
+  """Persentase tertinggi dari call_count, total_cputime dan total_time"""
+  if not isinstance(usage, dict):
+    return None
+  values = [usage.get(key) for key in ('call_count', 'total_cputime', 'total_time')]
+  values = [float(value) for value in values if isinstance(value, (int, float))]
+  return max(values) if values else None
+
+class GraphUsageTracker:
+  """State usage rate limit Graph API per app, per business use case dan per token
+  
+  Diperbarui dari header setiap response Graph. Sebelum call dikirim, admit()
+  menentukan apakah call boleh langsung jalan, perlu diperlambat, atau pasti
+  gagal sehingga lebih baik ditolak lokal.
+  
+  Dengan backend bersama, usage di atas throttle_at dan blokir dipublish ke
+  namespace 'usage' (waktu absolut) dan dibaca worker lain lewat admit(),
+  di-cache lokal selama sync_interval supaya tidak setiap call ke backend.
+  """
+
+  def __init__(self, throttle_at, block_at, max_delay, cooldown, stale_after, max_tokens=10000, backend=None, sync_interval=1.0):
+    self.throttle_at = throttle_at
+    self.block_at = block_at
+    self.max_delay = max_delay
+    self.cooldown = cooldown
+    self.stale_after = stale_after
+    self.max_tokens = max_tokens
+    self.throttled = 0
+    self.rejected = 0
+    self._app_usage = (0.0, 0.0)
+    self._app_blocked_until = 0.0
+    self._businesses = {}
+    self._tokens = OrderedDict()
+    self._lock = threading.Lock()
+    self.backend = backend
+    self.sync_interval = sync_interval
+    self._shared = OrderedDict()
+    self._published = {}
+
+  def _token(self, fingerprint):
+    """State per token: business yang terkait dan waktu blokir (LRU)"""
+    state = self._tokens.get(fingerprint)
+    if state is None:
+      state = self._tokens[fingerprint] = {'businesses': set(), 'blocked_until': 0.0}
+      while len(self._tokens) > self.max_tokens:
+        self._tokens.popitem(last=False)
+    else:
+      self._tokens.move_to_end(fingerprint)
+    return state
+
+  def update(self, headers, fingerprint=None, error_code=None):
+    """Perbarui state dari header response dan kode error Graph (kalau ada)"""
+    app_header = headers.get('X-App-Usage')
+    business_header = headers.get('X-Business-Use-Case-Usage')
+    if not app_header and not business_header and error_code is None:
+      return
+    
+    now = time.monotonic()
+    publish = []
+    with self._lock:
+      usage = usage_percent(parse_usage_header(app_header)) if app_header else None
+      if usage is not None:
+        self._app_usage = (usage, now)
+        if usage >= self.block_at:
+          self._app_blocked_until = max(self._app_blocked_until, now + self.cooldown)
+        publish.append(('app', usage, self._app_blocked_until))
+      
+      businesses = parse_usage_header(business_header) if business_header else None
+      for business_id, entries in (businesses if isinstance(businesses, dict) else {}).items():
+        usage, blocked_until = 0.0, 0.0
+        for entry in entries if isinstance(entries, list) else []:
+          usage = max(usage, usage_percent(entry) or 0.0)
+          # estimated_time_to_regain_access dalam menit
+          regain = entry.get('estimated_time_to_regain_access') if isinstance(entry, dict) else None
+          if regain:
+            blocked_until = max(blocked_until, now + regain * 60)
+        if usage >= self.block_at:
+          blocked_until = max(blocked_until, now + self.cooldown)
+        self._businesses[business_id] = (usage, blocked_until, now)
+        publish.append((f'business:{business_id}', usage, blocked_until))
+        if fingerprint:
+          self._token(fingerprint)['businesses'].add(business_id)
+      
+      if error_code in APP_LIMIT_CODES:
+        self._app_blocked_until = max(self._app_blocked_until, now + self.cooldown)
+        publish.append(('app', self._app_usage[0], self._app_blocked_until))
+      elif error_code in TOKEN_LIMIT_CODES and fingerprint:
+        state = self._token(fingerprint)
+        state['blocked_until'] = max(state['blocked_until'], now + self.cooldown)
+      
+      if self.backend and fingerprint and fingerprint in self._tokens:
+        state = self._tokens[fingerprint]
+        publish.append((f'token:{fingerprint}', 0.0, state['blocked_until'], sorted(state['businesses'])))
+    
+    if self.backend:
+      self._publish(publish, now)
+
+  def _publish(self, entries, now):
+    """Publish state ke backend bersama
+    
+    Hanya entry yang sedang di atas throttle_at / diblokir, atau yang
+    sebelumnya dipublish dalam kondisi itu (supaya worker lain melihat usage
+    sudah turun), jadi dalam kondisi normal tidak ada write ke backend.
+    """
+    wall = time.time()
+    items = []
+    with self._lock:
+      for key, usage, blocked_until, *businesses in entries:
+        hot = usage > self.throttle_at or blocked_until > now
+        # Token perlu dipublish juga kalau business-nya sedang dipublish,
+        # supaya worker lain tahu business mana yang berlaku untuk token ini
+        if businesses and any(self._published.get(f'business:{business_id}') for business_id in businesses[0]):
+          hot = True
+        if not hot and not self._published.get(key):
+          continue
+        self._published[key] = hot
+        value = {'usage': usage, 'updated_at': wall, 'blocked_until': wall + max(0.0, blocked_until - now)}
+        if businesses:
+          value['businesses'] = businesses[0]
+        items.append((key, value, max(self.stale_after, blocked_until - now)))
+      while len(self._published) > self.max_tokens:
+        self._published.pop(next(iter(self._published)))
+    if not items:
+      return
+    try:
+      self.backend.set_many('usage', items)
+    except self.backend.errors:
+      state_backend_errors.inc('set')
+
+  def _fetch_shared(self, keys):
+    """Value namespace 'usage' dari backend, di-cache lokal selama sync_interval"""
+    now = time.monotonic()
+    values, missing = {}, []
+    with self._lock:
+      for key in keys:
+        cached = self._shared.get(key)
+        if cached and now - cached[0] < self.sync_interval:
+          values[key] = cached[1]
+        else:
+          missing.append(key)
+    if missing:
+      try:
+        fetched = self.backend.get_many('usage', missing)
+      except self.backend.errors:
+        state_backend_errors.inc('get')
+        fetched = [None] * len(missing)
+      with self._lock:
+        for key, value in zip(missing, fetched):
+          values[key] = value
+          self._shared[key] = (now, value)
+          self._shared.move_to_end(key)
+        while len(self._shared) > self.max_tokens:
+          self._shared.popitem(last=False)
+    return [values[key] for key in keys]
+
+  def _shared_state(self, fingerprint):
+    """(usage, detik sampai blokir selesai) gabungan dari worker lain untuk token ini"""
+    keys = ['app'] + ([f'token:{fingerprint}'] if fingerprint else [])
+    values = self._fetch_shared(keys)
+    token = values[-1] if fingerprint else None
+    if token and token.get('businesses'):
+      values += self._fetch_shared([f'business:{business_id}' for business_id in token['businesses']])
+    
+    wall = time.time()
+    usage, blocked_for = 0.0, 0.0
+    for value in values:
+      if not value:
+        continue
+      if wall - value['updated_at'] <= self.stale_after:
+        usage = max(usage, value['usage'])
+      blocked_for = max(blocked_for, value['blocked_until'] - wall)
+    return usage, blocked_for
+
+  def admit(self, fingerprint=None):
+    """Return (delay, retry_after) untuk call berikutnya dengan token ini
+    
+    retry_after (detik) diisi kalau call pasti kena limit; delay (detik) > 0
+    kalau usage sudah mendekati limit dan call perlu diperlambat.
+    """
+    shared_usage, shared_blocked_for = self._shared_state(fingerprint) if self.backend else (0.0, 0.0)
+    now = time.monotonic()
+    with self._lock:
+      blocked_until = max(self._app_blocked_until, now + shared_blocked_for)
+      usage, updated_at = self._app_usage
+      if now - updated_at > self.stale_after:
+        usage = 0.0
+      usage = max(usage, shared_usage)
+      
+      state = self._tokens.get(fingerprint) if fingerprint else None
+      if state:
+        blocked_until = max(blocked_until, state['blocked_until'])
+        for business_id in state['businesses']:
+          business = self._businesses.get(business_id)
+          if business:
+            blocked_until = max(blocked_until, business[1])
+            if now - business[2] <= self.stale_after:
+              usage = max(usage, business[0])
+      
+      if blocked_until > now:
+        self.rejected += 1
+        return 0.0, math.ceil(blocked_until - now)
+      if usage <= self.throttle_at:
+        return 0.0, None
+      self.throttled += 1
+    
+    ratio = min(1.0, (usage - self.throttle_at) / max(self.block_at - self.throttle_at, 1e-9))
+    return self.max_delay * ratio, None
+
+  def collect_metrics(self):
+    """Baris /metrics untuk usage dan jumlah call yang diperlambat/ditolak"""
+    now = time.monotonic()
+    with self._lock:
+      app_usage = self._app_usage[0] if now - self._app_usage[1] <= self.stale_after else 0.0
+      businesses = sorted(
+        (business_id, usage) for business_id, (usage, _, updated_at) in self._businesses.items()
+        if now - updated_at <= self.stale_after
+      )
+      lines = [
+        '# TYPE graph_app_usage_percent gauge', f'graph_app_usage_percent {app_usage}',
+        '# TYPE graph_business_usage_percent gauge'
+      ]
+      lines.extend(f'graph_business_usage_percent{format_labels(("business_id",), (business_id,))} {usage}' for business_id, usage in businesses)
+      lines.extend([
+        '# TYPE graph_throttled_calls_total counter', f'graph_throttled_calls_total {self.throttled}',
+        '# TYPE graph_rejected_calls_total counter', f'graph_rejected_calls_total {self.rejected}'
+      ])
+    return lines
+
+graph_usage = GraphUsageTracker(
+  GRAPH_USAGE_THROTTLE,
+  GRAPH_USAGE_BLOCK,
+  GRAPH_THROTTLE_MAX_DELAY,
+  GRAPH_USAGE_COOLDOWN,
+  GRAPH_USAGE_STALE,
+  backend=state_backend if state_backend.shared else None,
+  sync_interval=STATE_SYNC_INTERVAL
+)
+metrics_collectors.append(graph_usage.collect_metrics)
+
+# ==================== RESILIENCE ====================
+
+class CircuitBreaker:
+  """Circuit breaker untuk Graph API
+  
+  Closed selama rasio kegagalan (error koneksi, timeout, status 5xx) di
+  window call terakhir di bawah failure_ratio. Kalau terlampaui breaker open
+  dan semua call ditolak lokal selama cooldown, lalu half-open: satu call
+  percobaan dikirim, sukses menutup breaker, gagal membukanya lagi.
+  """
+
+  def __init__(self, window, failure_ratio, cooldown):
+    self.window = window
+    self.failure_ratio = failure_ratio
+    self.cooldown = cooldown
+    self.state = 'closed'
+    self.opened = 0
+    self.rejected = 0
+    self._outcomes = deque()
+    self._failures = 0
+    self._open_until = 0.0
+    self._probing = False
+    self._lock = threading.Lock()
+
+  def admit(self):
+    """Return None kalau call boleh dikirim, atau retry_after (detik) kalau breaker open"""
+    now = time.monotonic()
+    with self._lock:
+      if self.state == 'closed':
+        return None
+      if self.state == 'open' and now >= self._open_until:
+        self.state = 'half_open'
+      if self.state == 'half_open' and not self._probing:
+        self._probing = True
+        return None
+      self.rejected += 1
+      return max(1, math.ceil(self._open_until - now))
+
+  def _open(self, now):
+    self.state = 'open'
+    self.opened += 1
+    self._open_until = now + self.cooldown
+    self._outcomes.clear()
+    self._failures = 0
+
+  def record(self, success):
+    """Catat hasil call; success None = hasil tidak diketahui (hanya melepas slot percobaan)"""
+    now = time.monotonic()
+    with self._lock:
+      if self.state == 'half_open':
+        self._probing = False
+        if success:
+          self.state = 'closed'
+        elif success is not None:
+          self._open(now)
+        return
+      if self.state == 'open' or success is None:
+        return
+      
+      self._outcomes.append(success)
+      self._failures += not success
+      if len(self._outcomes) > self.window:
+        self._failures -= not self._outcomes.popleft()
+      if len(self._outcomes) >= self.window and self._failures >= self.failure_ratio * self.window:
+        self._open(now)
+
+  def collect_metrics(self):
+    """Baris /metrics untuk state breaker dan jumlah call yang ditolak"""
+    with self._lock:
+      state, opened, rejected = self.state, self.opened, self.rejected
+    lines = ['# TYPE graph_circuit_state gauge']
+    lines.extend(
+      f'graph_circuit_state{format_labels(("state",), (name,))} {int(name == state)}'
+      for name in ('closed', 'half_open', 'open')
+    )
+    lines.extend([
+      '# TYPE graph_circuit_opened_total counter', f'graph_circuit_opened_total {opened}',
+      '# TYPE graph_circuit_rejected_calls_total counter', f'graph_circuit_rejected_calls_total {rejected}'
+    ])
+    return lines
+
+class HedgePolicy:
+  """Delay hedged request per template path Graph dari kuantil latency terakhir
+  
+  Hedge hanya dikirim kalau sampel latency cukup dan budget masih ada: tiap
+  call menambah max_ratio token (maksimal burst), tiap hedge memakai satu
+  token, jadi hedge tidak pernah lebih dari max_ratio dari total call.
+  """
+
+  def __init__(self, quantile, min_delay, max_ratio, window=200, min_samples=20, burst=10):
+    self.quantile = quantile
+    self.min_delay = min_delay
+    self.max_ratio = max_ratio
+    self.window = window
+    self.min_samples = min_samples
+    self.burst = burst
+    self.sent = 0
+    self.won = 0
+    self._budget = 0.0
+    self._paths = {}
+    self._lock = threading.Lock()
+
+  def observe(self, template, seconds):
+    """Catat latency call yang berhasil untuk template path ini"""
+    with self._lock:
+      state = self._paths.get(template)
+      if state is None:
+        state = self._paths[template] = {'samples': deque(maxlen=self.window), 'fresh': 0, 'delay': None}
+      state['samples'].append(seconds)
+      state['fresh'] += 1
+
+  def delay(self, template):
+    """Delay (detik) sebelum hedge dikirim, None kalau sampel belum cukup"""
+    with self._lock:
+      self._budget = min(self.burst, self._budget + self.max_ratio)
+      state = self._paths.get(template)
+      if state is None or len(state['samples']) < self.min_samples:
+        return None
+      # Kuantil dihitung ulang tiap 10 sampel baru, bukan tiap call
+      if state['delay'] is None or state['fresh'] >= 10:
+        samples = sorted(state['samples'])
+        state['delay'] = max(self.min_delay, samples[min(len(samples) - 1, int(len(samples) * self.quantile))])
+        state['fresh'] = 0
+      return state['delay']
+
+  def acquire(self):
+    """Pakai satu token budget untuk mengirim hedge, False kalau budget habis"""
+    with self._lock:
+      if self._budget < 1:
+        return False
+      self._budget -= 1
+      self.sent += 1
+      return True
+
+  def record_win(self):
+    with self._lock:
+      self.won += 1
+
+  def collect_metrics(self):
+    with self._lock:
+      sent, won = self.sent, self.won
+    return [
+      '# TYPE graph_hedged_requests_total counter', f'graph_hedged_requests_total {sent}',
+      '# TYPE graph_hedge_wins_total counter', f'graph_hedge_wins_total {won}'
+    ]
+
+def retry_backoff(attempt):
+  """Delay sebelum retry ke-(attempt + 1): exponential backoff dengan full jitter"""
+  return random.uniform(0, min(GRAPH_RETRY_MAX_DELAY, GRAPH_RETRY_BASE_DELAY * 2 ** attempt))
+
+graph_breaker = CircuitBreaker(GRAPH_BREAKER_WINDOW, GRAPH_BREAKER_FAILURE_RATIO, GRAPH_BREAKER_COOLDOWN)
+metrics_collectors.append(graph_breaker.collect_metrics)
+graph_hedging = HedgePolicy(GRAPH_HEDGE_QUANTILE, GRAPH_HEDGE_MIN_DELAY, GRAPH_HEDGE_MAX_RATIO)
+metrics_collectors.append(graph_hedging.collect_metrics)
+graph_retries = register_metric(Counter(
+  'graph_retries_total',
+  'Graph GET yang dikirim ulang setelah error koneksi, timeout atau status 5xx',
+  ('reason',)
+))
+# Thread pool terpisah untuk hedged request, supaya tidak berebut worker
+# dengan graph_executor (call di dalam graph_executor juga bisa di-hedge)
+graph_hedge_executor = ThreadPoolExecutor(max_workers=GRAPH_HEDGE_WORKERS, thread_name_prefix='graph-hedge')
+
+def graph_error_code(response):
+  """Kode error Graph dari body response (None kalau body bukan error JSON)"""
+  try:
+    error = response.json().get('error')
+  except (ValueError, AttributeError):
+    return None
+  return error.get('code') if isinstance(error, dict) else None
+
+def request_access_token(params=None, data=None, url=None):
+  """access_token yang dipakai sebuah Graph call (query, form body atau URL paging)"""
+  if url is not None:
+    params = dict(parse_qsl(urlsplit(url).query))
+  for source in (params, data):
+    if isinstance(source, dict) and source.get('access_token'):
+      return source['access_token']
+  return None
+
+# ==================== GRAPH API CLIENT ====================
+
+class GraphAPIError(requests.exceptions.RequestException):
+  """Graph API mengembalikan object error"""
+
+  def __init__(self, error):
+    self.error = error
+    super().__init__(error.get('message', 'Unknown error'))
+
+class GraphBatchError(GraphAPIError):
+  """Graph batch request ditolak secara keseluruhan"""
+
+class GraphRateLimited(GraphAPIError):
+  """Graph call ditolak lokal karena rate limit Graph API sudah tercapai"""
+
+  def __init__(self, retry_after):
+    self.retry_after = retry_after
+    super().__init__({
+      'message': f'Graph API rate limit reached, retry after {retry_after} seconds',
+      'type': 'RateLimitError',
+      'retry_after': retry_after
+    })
+
+class GraphCircuitOpen(GraphAPIError):
+  """Graph call ditolak lokal karena circuit breaker Graph API sedang open"""
+
+  def __init__(self, retry_after):
+    self.retry_after = retry_after
+    super().__init__({
+      'message': f'Graph API is unavailable, retry after {retry_after} seconds',
+      'type': 'CircuitOpenError',
+      'retry_after': retry_after
+    })
+
+class GraphClient:
+  """HTTP client untuk Graph API dengan keep-alive connection pool per worker"""
+
+  def __init__(self, base_url, pool_size=10, connect_timeout=5, timeout=15):
+    self.base_url = base_url.rstrip('/')
+    self.pool_size = pool_size
+    self.connect_timeout = connect_timeout
+    self.timeout = timeout
+    self._session = None
+    self._pid = None
+    self._lock = threading.Lock()
+
+  @property
+  def session(self):
+    """Session dibuat saat pertama dipakai dan dibuat ulang setelah fork"""
+    pid = os.getpid()
+    if self._session is None or self._pid != pid:
+      with self._lock:
+        if self._session is None or self._pid != pid:
+          adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+          session = requests.Session()
+          session.mount('https://', adapter)
+          session.mount('http://', adapter)
+          self._session = session
+          self._pid = pid
+    return self._session
+
+  def url(self, path):
+    """Build full Graph API URL dari path relatif"""
+    return f'{self.base_url}/{path.lstrip("/")}'
+
+  def follow(self, next_url, timeout=None):
+    """GET URL paging.next dari response Graph API, return body JSON"""
+    check_paging_url(self.base_url, next_url)
+    
+    def fetch():
+      response = self._send(
+        'GET',
+        next_url,
+        'paging',
+        urlsplit(next_url).path,
+        request_access_token(url=next_url),
+        timeout=(self.connect_timeout, timeout or self.timeout)
+      )
+      return response_payload(response)
+    
+    return graph_flight.do(paging_coalesce_key(next_url), fetch)[1]
+
+  def request(self, method, path, params=None, json=None, data=None, timeout=None, stream=False, operation=None, idempotent=True):
+    """Kirim request ke Graph API, timeout bisa di-override per call
+    
+    idempotent=False untuk GET yang tidak boleh dikirim lebih dari sekali
+    (misalnya exchange OAuth code): tanpa retry maupun hedge.
+    """
+    return self._send(
+      method,
+      self.url(path),
+      operation,
+      path,
+      request_access_token(params, data),
+      idempotent=idempotent,
+      params=params,
+      json=json,
+      data=data,
+      timeout=(self.connect_timeout, timeout or self.timeout),
+      stream=stream
+    )
+
+  def _send(self, method, url, operation, path, access_token, idempotent=True, **kwargs):
+    """Kirim request dengan retry, hedging dan circuit breaker
+    
+    Request selain GET (dan GET dengan idempotent=False) dikirim sekali. GET
+    di-retry setelah error koneksi, timeout atau status 5xx selama masih ada
+    sisa budget (read timeout call), dan kalau GRAPH_HEDGE aktif GET
+    non-stream yang lambat dikirim dua kali.
+    """
+    if method != 'GET' or not idempotent:
+      return self._attempt(method, url, operation, path, access_token, **kwargs)
+    
+    connect_timeout, read_timeout = kwargs.pop('timeout')
+    deadline = time.monotonic() + read_timeout
+    hedge = GRAPH_HEDGE and not kwargs.get('stream')
+    for attempt in itertools.count():
+      remaining = time_left(deadline)
+      send = lambda: self._attempt(method, url, operation, path, access_token, timeout=(min(connect_timeout, remaining), remaining), **kwargs)
+      error = response = None
+      try:
+        response = self._hedged(path, send) if hedge else send()
+        if response.status_code < 500:
+          return response
+        reason = 'server_error'
+      except requests.exceptions.Timeout as e:
+        error, reason = e, 'timeout'
+      except requests.exceptions.ConnectionError as e:
+        error, reason = e, 'connection'
+      
+      delay = retry_backoff(attempt)
+      if attempt >= GRAPH_RETRY_MAX or time_left(deadline) <= delay:
+        if error is not None:
+          raise error
+        return response
+      if response is not None:
+        response.close()
+      graph_retries.inc(reason)
+      time.sleep(delay)
+
+  def _hedged(self, path, send):
+    """Jalankan send(); kalau belum selesai setelah delay hedge, kirim sekali lagi
+    
+    Response sukses pertama (status < 500) yang dipakai. Kalau keduanya
+    gagal, hasil yang terakhir selesai yang dikembalikan/di-raise.
+    """
+    delay = graph_hedging.delay(graph_path_template(path))
+    if delay is None:
+      return send()
+    
+    primary = graph_hedge_executor.submit(send)
+    try:
+      return primary.result(timeout=delay)
+    except FutureTimeoutError:
+      pass
+    if graph_breaker.state != 'closed' or not graph_hedging.acquire():
+      return primary.result()
+    
+    hedge = graph_hedge_executor.submit(send)
+    for future in as_completed((primary, hedge)):
+      if future.exception() is None and future.result().status_code < 500:
+        if future is hedge:
+          graph_hedging.record_win()
+        return future.result()
+    return future.result()
+
+  def _attempt(self, method, url, operation, path, access_token, **kwargs):
+    """Kirim satu request lewat session dengan throttling rate limit dan metrics
+    
+    Raise GraphRateLimited atau GraphCircuitOpen tanpa menghubungi Graph API
+    kalau call pasti ditolak karena rate limit atau Graph API sedang bermasalah.
+    """
+    fingerprint = token_fingerprint(access_token) if access_token else None
+    delay, retry_after = graph_usage.admit(fingerprint)
+    if retry_after:
+      observe_graph_call(operation, path, 'rate_limited', 0.0)
+      raise GraphRateLimited(retry_after)
+    if delay:
+      time.sleep(delay)
+    retry_after = graph_breaker.admit()
+    if retry_after:
+      observe_graph_call(operation, path, 'circuit_open', 0.0)
+      raise GraphCircuitOpen(retry_after)
+    
+    status = 'error'
+    healthy = None
+    started = time.perf_counter()
+    try:
+      response = self.session.request(method, url, **kwargs)
+      status = str(response.status_code)
+      healthy = response.status_code < 500
+      error_code = None
+      if response.status_code >= 400 and not kwargs.get('stream'):
+        error_code = graph_error_code(response)
+      graph_usage.update(response.headers, fingerprint, error_code)
+      return response
+    except requests.exceptions.Timeout:
+      status = 'timeout'
+      healthy = False
+      raise
+    except requests.exceptions.ConnectionError:
+      healthy = False
+      raise
+    finally:
+      seconds = time.perf_counter() - started
+      graph_breaker.record(healthy)
+      if healthy and method == 'GET':
+        graph_hedging.observe(graph_path_template(path), seconds)
+      observe_graph_call(operation, path, status, seconds)
+
+  def get(self, path, params=None, timeout=None, idempotent=True):
+    return self.request('GET', path, params=params, timeout=timeout, idempotent=idempotent)
+
+  def get_shared(self, path, params=None, timeout=None, operation=None):
+    """GET dan parse JSON, return (status_code, body)
+    
+    GET identik (token, path, params sama) yang sedang berjalan di thread
+    lain tidak dikirim ulang; hasilnya dipakai bersama, jadi body yang
+    dikembalikan tidak boleh diubah oleh caller.
+    """
+    def fetch():
+      return response_payload(self.request('GET', path, params=params, timeout=timeout, operation=operation))
+    return graph_flight.do(coalesce_key('GET', path, params), fetch)
+
+  def get_json(self, path, params=None, timeout=None):
+    """Body JSON dari get_shared()"""
+    return self.get_shared(path, params=params, timeout=timeout)[1]
+
+  def post(self, path, params=None, json=None, data=None, timeout=None):
+    return self.request('POST', path, params=params, json=json, data=data, timeout=timeout)
+
+  def delete(self, path, params=None, timeout=None):
+    return self.request('DELETE', path, params=params, timeout=timeout)
+
+  def batch(self, items, access_token, timeout=None):
+    """Kirim beberapa request sekaligus lewat Graph batch API (POST /?batch=[...])"""
+    response = self.post('', data=batch_payload(items, access_token), timeout=timeout)
+    return parse_batch_results(response.json())
+
+class SingleFlight:
+  """Gabungkan call identik yang berjalan bersamaan menjadi satu call
+  
+  Thread pertama untuk sebuah key menjalankan fn(), thread lain dengan key
+  yang sama menunggu dan menerima hasil (atau exception) yang sama. Key
+  dilepas begitu call selesai, jadi tidak ada hasil yang di-cache.
+  """
+
+  def __init__(self, enabled=True):
+    self.enabled = enabled
+    self._calls = {}
+    self._lock = threading.Lock()
+
+  def do(self, key, fn):
+    if not self.enabled:
+      return fn()
+    
+    with self._lock:
+      future = self._calls.get(key)
+      leader = future is None
+      if leader:
+        future = self._calls[key] = Future()
+    
+    if not leader:
+      graph_coalesced.inc()
+      return future.result()
+    
+    try:
+      result = fn()
+    except BaseException as e:
+      future.set_exception(e)
+      raise
+    else:
+      future.set_result(result)
+      return result
+    finally:
+      with self._lock:
+        del self._calls[key]
+
+def coalesce_key(method, path, params=None):
+  """Key single-flight: hash token, method, path dan params yang dinormalisasi
+  
+  params boleh dict atau list pasangan (key, value) seperti hasil parse_qsl.
+  Token tidak pernah disimpan apa adanya di key, hanya fingerprint-nya.
+  """
+  pairs = list(params.items()) if isinstance(params, dict) else list(params or ())
+  access_token = next((value for key, value in pairs if key == 'access_token'), None)
+  return (
+    method,
+    path.strip('/'),
+    token_fingerprint(access_token) if access_token else None,
+    tuple(sorted((str(key), str(value)) for key, value in pairs if key != 'access_token'))
+  )
+
+def paging_coalesce_key(next_url):
+  """Key single-flight untuk URL paging.next (token di query ikut di-hash)"""
+  target = urlsplit(next_url)
+  return coalesce_key('GET', target.path, parse_qsl(target.query, keep_blank_values=True))
+
+def response_payload(response):
+  """(status_code, body) dari response Graph, body teks dibungkus {'message': ...}"""
+  try:
+    body = response.json()
+  except ValueError:
+    body = {'message': response.text}
+  return response.status_code, body
+
+def check_paging_url(base_url, next_url):
+  """Pastikan URL paging.next mengarah ke origin Graph API yang sama"""
+  origin = urlsplit(base_url)
+  target = urlsplit(next_url)
+  if (target.scheme, target.netloc) != (origin.scheme, origin.netloc):
+    raise GraphAPIError({'message': 'Unexpected paging URL'})
+
+def batch_payload(items, access_token):
+  """Form body untuk Graph batch request"""
+  return {
+    'access_token': access_token,
+    'batch': json.dumps(items),
+    'include_headers': 'false'
+  }
+
+def parse_batch_results(results):
+  """Parse response Graph batch request
+  
+  Hasilnya list sesuai urutan items, tiap item berupa {'code', 'body'} dengan
+  body sudah di-parse, atau None kalau Facebook tidak memproses item tersebut.
+  """
+  if not isinstance(results, list):
+    raise GraphBatchError(results.get('error') or {'message': 'Invalid batch response'})
+  
+  parsed = []
+  for item in results:
+    if not item:
+      parsed.append(None)
+      continue
+    try:
+      body = json.loads(item.get('body') or 'null')
+    except ValueError:
+      body = {'message': item.get('body')}
+    parsed.append({'code': item.get('code'), 'body': body})
+  return parsed
+
+def iter_paging_bodies(body, max_pages=PAGES_MAX_PAGES, timeout=None):
+  """Yield body Graph dan body halaman-halaman berikutnya
+  
+  Cursor paging.next diikuti sampai habis atau max_pages tercapai. Halaman
+  berikutnya sudah di-request di background selagi caller memproses halaman
+  yang sedang di-yield, jadi round trip Graph tumpang tindih dengan serialisasi.
+  
+  Prefetch memakai graph_prefetch_executor, bukan graph_executor: generator
+  ini sering berjalan di dalam graph_executor (fetch_pages), dan menunggu
+  task di pool yang sama bisa deadlock kalau semua worker sedang menunggu.
+  """
+  pages_fetched = 1
+  next_future = None
+  # Budget satu GET termasuk retry dibatasi read timeout-nya (lihat
+  # GraphClient._send), jadi result() tidak perlu menunggu lebih lama
+  wait_timeout = GRAPH_CONNECT_TIMEOUT + (timeout or GRAPH_TIMEOUT) + 1
+  try:
+    while True:
+      if 'error' in body:
+        raise GraphAPIError(body['error'])
+      
+      next_url = body.get('paging', {}).get('next')
+      next_future = None
+      if next_url and pages_fetched < max_pages:
+        next_future = graph_prefetch_executor.submit(graph.follow, next_url, timeout)
+      
+      yield body
+      
+      if next_future is None:
+        return
+      try:
+        body = next_future.result(timeout=wait_timeout)
+      except FutureTimeoutError:
+        raise requests.exceptions.Timeout('Graph API tidak merespons (paging)')
+      next_future = None
+      pages_fetched += 1
+  finally:
+    # Caller berhenti lebih awal: prefetch yang belum berjalan dibatalkan
+    if next_future is not None:
+      next_future.cancel()
+
+def follow_paging(body, max_pages=PAGES_MAX_PAGES, timeout=None):
+  """Yield list 'data' dari body Graph dan halaman-halaman berikutnya"""
+  for page in iter_paging_bodies(body, max_pages=max_pages, timeout=timeout):
+    yield page.get('data', [])
+
+def iter_graph_edge(path, params, page_size=PAGES_PAGE_SIZE, max_pages=PAGES_MAX_PAGES, timeout=None):
+  """Yield list 'data' per halaman dari sebuah Graph edge (misalnya me/accounts)"""
+  params = dict(params)
+  params.setdefault('limit', page_size)
+  body = graph.get_json(path, params=params, timeout=timeout)
+  yield from follow_paging(body, max_pages=max_pages, timeout=timeout)
+
+def stream_upstream(response, chunk_size=GRAPH_STREAM_CHUNK_SIZE):
+  """Teruskan body response Graph per chunk tanpa parse/buffer penuh"""
+  try:
+    for chunk in response.iter_content(chunk_size=chunk_size):
+      if chunk:
+        yield chunk
+  finally:
+    response.close()
+
+def batch_item(method, path, params=None, body=None):
+  """Build satu item untuk Graph batch request"""
+  relative_url = path
+  if params:
+    relative_url = f'{path}?{urlencode(params)}'
+  item = {'method': method, 'relative_url': relative_url}
+  if body:
+    # Body item batch berupa form-encoded string; nilai object/list dikirim sebagai JSON
+    item['body'] = urlencode({
+      key: json.dumps(value) if isinstance(value, (dict, list)) else value
+      for key, value in body.items()
+    })
+  return item
+
+# GraphClient proses ini, dibangun create_app() dari config app
+graph = None
+
+# GET identik yang berjalan bersamaan (banyak tab, refresh dashboard) cukup
+# dikirim sekali ke Graph API
+graph_flight = SingleFlight(enabled=GRAPH_COALESCE)
+graph_coalesced = register_metric(Counter(
+  'graph_coalesced_calls_total',
+  'Graph GET yang memakai hasil call identik yang sedang berjalan',
+  ()
+))
+
+# Thread pool untuk menjalankan beberapa Graph call secara paralel
+graph_executor = ThreadPoolExecutor(max_workers=GRAPH_FANOUT_WORKERS, thread_name_prefix='graph')
+# Pool terpisah untuk prefetch halaman paging; task di sini tidak pernah
+# menunggu task lain, jadi tidak bisa deadlock walaupun pool penuh
+graph_prefetch_executor = ThreadPoolExecutor(max_workers=GRAPH_FANOUT_WORKERS, thread_name_prefix='graph-prefetch')
+
+def time_left(deadline):
+  """Sisa waktu (detik) sebelum deadline"""
+  return max(0.0, deadline - time.monotonic())
+
+def result_before(future, deadline, default):
+  """Ambil hasil future sebelum deadline, atau default kalau timeout"""
+  try:
+    return future.result(timeout=time_left(deadline))
+  except FutureTimeoutError:
+    future.cancel()
+    return default
+
+# ==================== CACHE ====================
+
+class TTLCache:
+  """Cache in-process dengan TTL per entry, LRU eviction dan batas memori"""
+
+  def __init__(self, max_bytes):
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self._entries = OrderedDict()
+    self._bytes = 0
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    """Ambil value yang belum expired, None kalau tidak ada"""
+    now = time.monotonic()
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None or entry[0] <= now:
+        if entry is not None:
+          self._remove(key)
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[2]
+
+  def get_many(self, keys):
+    return [self.get(key) for key in keys]
+
+  def set(self, key, value, ttl):
+    """Simpan value; entry paling lama tidak dipakai dibuang kalau melebihi batas memori"""
+    if ttl <= 0:
+      return
+    size = len(json.dumps(value, default=str))
+    if size > self.max_bytes:
+      return
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+      self._entries[key] = (time.monotonic() + ttl, size, value)
+      self._bytes += size
+      while self._bytes > self.max_bytes:
+        self._remove(next(iter(self._entries)))
+        self.evictions += 1
+
+  def set_many(self, items):
+    for key, value, ttl in items:
+      self.set(key, value, ttl)
+
+  def delete(self, key):
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+
+  def delete_many(self, keys):
+    for key in keys:
+      self.delete(key)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+
+  def _remove(self, key):
+    _, size, _ = self._entries.pop(key)
+    self._bytes -= size
+
+  def stats(self):
+    with self._lock:
+      return {
+        'entries': len(self._entries),
+        'bytes': self._bytes,
+        'hits': self.hits,
+        'misses': self.misses,
+        'evictions': self.evictions
+      }
+
+def token_fingerprint(access_token):
+  """Hash token untuk key cache, token asli tidak pernah disimpan sebagai key"""
+  return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+# Kind introspeksi yang berisi token (long-lived token, page token) tidak
+# pernah disimpan di backend bersama
+INTROSPECTION_PRIVATE_KINDS = {'exchange', 'pages'}
+introspection_cache = state_backend.cache(
+  'introspection',
+  INTROSPECTION_CACHE_MAX_BYTES,
+  private=lambda key, value: key[1] in INTROSPECTION_PRIVATE_KINDS
+)
+
+def cache_metrics(name, cache):
+  """Collector /metrics untuk statistik sebuah TTLCache"""
+  def collect():
+    stats = cache.stats()
+    lines = []
+    for key, kind, suffix in (
+      ('entries', 'gauge', 'entries'),
+      ('bytes', 'gauge', 'bytes'),
+      ('hits', 'counter', 'hits_total'),
+      ('misses', 'counter', 'misses_total'),
+      ('evictions', 'counter', 'evictions_total')
+    ):
+      # Statistik yang tidak tersedia (backend bersama) tidak ditampilkan
+      if stats[key] is not None:
+        lines.extend([f'# TYPE {name}_{suffix} {kind}', f'{name}_{suffix} {stats[key]}'])
+    return lines
+  return collect
+
+metrics_collectors.append(cache_metrics('introspection_cache', introspection_cache))
+
+# Index user_id -> fingerprint token yang punya entry introspeksi. Webhook
+# Facebook hanya membawa user_id, jadi index ini yang dipakai untuk membuang
+# cache semua token milik user tersebut.
+TOKEN_USER_INDEX_MAX = 20
+TOKEN_USER_INDEX_TTL = max(INTROSPECTION_TTLS.values(), default=0)
+token_user_index = state_backend.cache('token-users', INTROSPECTION_CACHE_MAX_BYTES // 16)
+
+def index_token_user(user_id, fingerprint):
+  """Catat bahwa token dengan fingerprint ini milik user_id"""
+  if not user_id:
+    return
+  fingerprints = [value for value in token_user_index.get(str(user_id)) or [] if value != fingerprint]
+  fingerprints.append(fingerprint)
+  token_user_index.set(str(user_id), fingerprints[-TOKEN_USER_INDEX_MAX:], TOKEN_USER_INDEX_TTL)
+
+def cache_introspection(fingerprint, kind, value):
+  introspection_cache.set((fingerprint, kind), value, INTROSPECTION_TTLS[kind])
+  # Entry 'debug' (TTL pendek, ditulis per ribuan token) tidak di-index
+  if kind == 'profile':
+    index_token_user(value.get('id'), fingerprint)
+
+def invalidate_token_cache(access_token):
+  """Hapus semua hasil introspeksi yang di-cache untuk token ini"""
+  fingerprint = token_fingerprint(access_token)
+  introspection_cache.delete_many([(fingerprint, kind) for kind in INTROSPECTION_TTLS])
+
+graph_response_cache = state_backend.cache(
+  'graph-response',
+  GRAPH_CACHE_MAX_BYTES,
+  private=lambda key, value: has_access_token(value)
+)
+metrics_collectors.append(cache_metrics('graph_response_cache', graph_response_cache))
+
+# Generasi per object Graph: POST/DELETE ke sebuah object menaikkan
+# generasinya, jadi semua entry lama untuk object itu tidak terpakai lagi
+# (dan hilang sendiri lewat TTL/LRU) tanpa perlu index per key. Dengan
+# backend bersama generasi berupa nilai acak yang ditulis ke backend dengan
+# TTL sepanjang TTL cache terlama, jadi invalidasi di satu worker berlaku
+# untuk semua worker. Nilai acak (bukan counter) tidak pernah terulang
+# setelah key generasi expired, jadi entry lama tidak bisa terpakai lagi;
+# entry yang ditulis sebelum invalidasi pertama (generasi 0) sudah expired
+# sebelum key generasinya expired.
+GRAPH_CACHE_GENERATION_TTL = max((ttl for _, ttl in GRAPH_CACHE_TTLS), default=0)
+graph_cache_generations = {}
+graph_cache_generation_counter = itertools.count(1)
+graph_cache_lock = threading.Lock()
+
+def graph_cache_ttl(path):
+  """TTL cache untuk path Graph Explorer, 0 kalau path tidak di-cache"""
+  if not GRAPH_CACHE_TTLS:
+    return 0
+  normalized = normalize_graph_path(path)
+  for pattern, ttl in GRAPH_CACHE_TTLS:
+    if fnmatch.fnmatchcase(normalized, pattern):
+      return ttl
+  return 0
+
+def graph_cache_object(path, params):
+  """Object Graph yang dituju path (segmen pertama; 'me' dibedakan per token)"""
+  object_id = path.strip('/').split('/')[0]
+  if object_id == 'me':
+    return (object_id, token_fingerprint(params.get('access_token', '')))
+  return (object_id, None)
+
+def graph_cache_key(path, params):
+  """Key cache response: generasi object + key single-flight (sudah per token)
+  
+  None kalau generasi tidak bisa dibaca dari backend bersama (cache dilewati).
+  """
+  cache_object = graph_cache_object(path, params)
+  if state_backend.shared:
+    try:
+      generation = state_backend.get_many('graph-generation', [state_key(cache_object)])[0] or 0
+    except state_backend.errors:
+      state_backend_errors.inc('get')
+      return None
+  else:
+    generation = graph_cache_generations.get(cache_object, 0)
+  return (generation, coalesce_key('GET', path, params))
+
+def invalidate_graph_objects(cache_objects):
+  """Naikkan generasi object Graph, semua response cache-nya tidak terpakai lagi"""
+  if not GRAPH_CACHE_TTLS:
+    return
+  if state_backend.shared:
+    try:
+      state_backend.set_many('graph-generation', [
+        (state_key(cache_object), secrets.token_hex(8), GRAPH_CACHE_GENERATION_TTL)
+        for cache_object in cache_objects
+      ])
+    except state_backend.errors:
+      state_backend_errors.inc('set')
+      logger.warning(f'Graph cache invalidation failed for {", ".join(str(cache_object[0]) for cache_object in cache_objects)}')
+    return
+  with graph_cache_lock:
+    if len(graph_cache_generations) + len(cache_objects) > GRAPH_CACHE_MAX_OBJECTS:
+      graph_cache_generations.clear()
+      graph_response_cache.clear()
+    for cache_object in cache_objects:
+      graph_cache_generations[cache_object] = next(graph_cache_generation_counter)
+
+def invalidate_graph_object(path, params):
+  """Buang semua response cache untuk object yang baru diubah lewat POST/DELETE"""
+  invalidate_graph_objects([graph_cache_object(path, params)])
+
+def store_graph_response(cache_key, status_code, response_data, ttl):
+  """Simpan response GET yang sukses ke cache"""
+  if status_code == 200 and isinstance(response_data, dict) and 'error' not in response_data:
+    graph_response_cache.set(cache_key, response_data, ttl)
+
+# ==================== GRAPH HELPERS ====================
+
+PAGES_PERMISSIONS = ['pages_show_list', 'pages_read_engagement', 'pages_manage_posts']
+
+def has_pages_permission(all_permissions):
+  """Cek apakah salah satu permission pages sudah granted"""
+  granted_perms = [p['permission'] for p in all_permissions if p['status'] == 'granted']
+  return any(perm in granted_perms for perm in PAGES_PERMISSIONS)
+
+def exchange_long_lived_token(access_token):
+  """Exchange token ke long-lived token, None kalau gagal"""
+  token_params = {
+    'grant_type': 'fb_exchange_token',
+    'client_id': FB_APP_ID,
+    'client_secret': FB_APP_SECRET,
+    'fb_exchange_token': access_token
+  }
+  try:
+    new_token_data = graph.get_json('oauth/access_token', params=token_params)
+    
+    if 'error' in new_token_data:
+      logger.warning(f'Token exchange failed: {new_token_data["error"]}')
+      return None
+    return new_token_data
+  except Exception as e:
+    logger.warning(f'Token exchange error: {str(e)}')
+    return None
+
+def fetch_permissions(access_token):
+  """Ambil daftar permissions token, None kalau gagal"""
+  try:
+    permissions_data = graph.get_json('me/permissions', params={'access_token': access_token})
+    if 'error' in permissions_data:
+      return None
+    return permissions_data.get('data', [])
+  except Exception:
+    return None
+
+def fetch_login_data(access_token):
+  """Ambil profil, permissions dan pages untuk halaman callback
+  
+  Ketiganya dikirim dalam satu Graph batch request. Sub-request pages selalu
+  ikut dikirim, tapi hasilnya hanya dipakai kalau permission pages granted.
+  Kalau batch gagal, fallback ke request berurutan.
+  """
+  try:
+    results = graph.batch([
+      batch_item('GET', 'me', {'fields': 'id,name,email,picture.type(large)'}),
+      batch_item('GET', 'me/permissions'),
+      batch_item('GET', 'me/accounts', {'fields': 'id,name,access_token,category', 'limit': PAGES_PAGE_SIZE})
+    ], access_token)
+  except (GraphRateLimited, GraphCircuitOpen):
+    raise
+  except Exception as e:
+    logger.warning(f'Batch request failed, falling back to sequential: {str(e)}')
+    results = None
+  
+  if results and results[0] and results[1]:
+    user_info = results[0]['body'] or {}
+    all_permissions = (results[1]['body'] or {}).get('data', [])
+    pages = []
+    if has_pages_permission(all_permissions) and results[2]:
+      try:
+        for batch in follow_paging(results[2]['body'] or {}):
+          pages.extend(batch)
+      except Exception as e:
+        logger.warning(f'Pages listing truncated: {str(e)}')
+    return user_info, all_permissions, pages
+  
+  # Fallback: request berurutan
+  user_response = graph.get('me', params={
+    'fields': 'id,name,email,picture.type(large)',
+    'access_token': access_token
+  })
+  user_info = user_response.json()
+  if 'error' in user_info:
+    return user_info, [], []
+  
+  permissions_response = graph.get('me/permissions', params={'access_token': access_token})
+  all_permissions = permissions_response.json().get('data', [])
+  
+  pages = []
+  if has_pages_permission(all_permissions):
+    try:
+      for batch in iter_graph_edge('me/accounts', {
+        'fields': 'id,name,access_token,category',
+        'access_token': access_token
+      }):
+        pages.extend(batch)
+    except Exception as e:
+      logger.warning(f'Pages listing truncated: {str(e)}')
+  return user_info, all_permissions, pages
+
+def with_page_permissions(page):
+  """Copy page dengan field 'permissions' (format sama dengan /me/permissions)
+  
+  Page tidak diubah in-place: body dari get_shared/follow bisa dipakai
+  bersama oleh beberapa caller single-flight dan harus dianggap read-only.
+  """
+  perms_list = page.get('perms', [])
+  return {**page, 'permissions': [{'permission': perm, 'status': 'granted'} for perm in perms_list]}
+
+def iter_pages(access_token, page_size=PAGES_PAGE_SIZE):
+  """Yield list pages per halaman cursor dari /me/accounts"""
+  for batch in iter_graph_edge('me/accounts', {
+    'fields': 'id,name,access_token,category,perms',
+    'access_token': access_token
+  }, page_size=page_size):
+    yield [with_page_permissions(page) for page in batch]
+
+def fetch_pages(access_token):
+  """Ambil semua pages beserta permissions-nya, None kalau gagal"""
+  pages = []
+  try:
+    for batch in iter_pages(access_token):
+      pages.extend(batch)
+  except Exception as e:
+    if not pages:
+      return None
+    logger.warning(f'Pages listing truncated: {str(e)}')
+  return pages
+
+def token_error_payload(user_data):
+  """Payload error /api/validate-token dari error response /me"""
+  error_message = user_data['error'].get('message', 'Unknown error')
+  
+  # Simplify common error messages
+  if 'Malformed access token' in error_message:
+    error_message = 'Invalid OAuth access token - Cannot parse access token'
+  elif 'expired' in error_message.lower():
+    error_message = 'Access token has expired'
+  elif 'invalid' in error_message.lower():
+    error_message = 'Invalid access token'
+  
+  return {
+    'success': False,
+    'error': error_message,
+    'error_code': user_data['error'].get('code'),
+    'error_type': user_data['error'].get('type')
+  }
+
+def rate_limited_payload(error):
+  """Payload error /api/validate-token untuk call yang ditolak GraphRateLimited"""
+  return {
+    'success': False,
+    'error': 'Rate limit Facebook API tercapai, coba lagi nanti',
+    'error_type': 'RateLimitError',
+    'retry_after': error.retry_after
+  }
+
+def circuit_open_payload(error):
+  """Payload error /api/validate-token untuk call yang ditolak GraphCircuitOpen"""
+  return {
+    'success': False,
+    'error': 'Facebook API sedang bermasalah, coba lagi nanti',
+    'error_type': 'CircuitOpenError',
+    'retry_after': error.retry_after
+  }
+
+def exchange_cache_entry(new_token_data):
+  """Konversi hasil exchange ke entry cache (expiry absolut)"""
+  return {
+    'access_token': new_token_data['access_token'],
+    'token_type': new_token_data.get('token_type', 'bearer'),
+    'expires_at': time.time() + new_token_data.get('expires_in', 0)
+  }
+
+def exchange_from_cache(cached_exchange):
+  """Konversi entry cache exchange kembali ke format response Graph"""
+  if not cached_exchange:
+    return None
+  return {
+    'access_token': cached_exchange['access_token'],
+    'token_type': cached_exchange['token_type'],
+    'expires_in': max(0, int(cached_exchange['expires_at'] - time.time()))
+  }
+
+def seed_introspection_cache(new_access_token, known):
+  """Cache hasil yang sama untuk token baru hasil exchange
+  
+  Client memakai token baru tersebut di kunjungan berikutnya. known berisi
+  {kind: value} yang benar-benar didapat dari Graph atau cache; fallback
+  kosong dari branch yang gagal tidak boleh ikut di-cache.
+  """
+  new_fingerprint = token_fingerprint(new_access_token)
+  introspection_cache.set_many([
+    ((new_fingerprint, kind), value, INTROSPECTION_TTLS[kind])
+    for kind, value in known.items()
+  ])
+  index_token_user(known['profile'].get('id'), new_fingerprint)
+
+def build_introspection_payload(user_data, new_token_data, all_permissions, pages):
+  """Build response sukses /api/validate-token"""
+  response_data = {
+    'success': True,
+    'data': {
+      'id': user_data.get('id'),
+      'name': user_data.get('name'),
+      'email': user_data.get('email', ''),
+      'profile_picture': user_data.get('picture', {}).get('data', {}).get('url', ''),
+      'permissions': all_permissions
+    }
+  }
+  # pages None: tidak dikumpulkan, client mengambilnya dari /api/pages
+  if pages is not None:
+    response_data['data']['pages'] = pages
+  
+  # Add new token data if exchange was successful
+  if new_token_data and 'access_token' in new_token_data:
+    response_data['data']['new_token'] = new_token_info(new_token_data)
+  
+  return response_data
+
+def new_token_info(new_token_data):
+  """Field 'new_token' response /api/validate-token dari hasil exchange"""
+  new_expires_in = new_token_data.get('expires_in', 0)
+  
+  expiry_datetime = datetime.now() + timedelta(seconds=new_expires_in)
+  expiry_date = expiry_datetime.strftime("%d %B %Y, %H:%M:%S WIB")
+  expiry_timestamp = int(expiry_datetime.timestamp())
+  
+  return {
+    'access_token': new_token_data.get('access_token'),
+    'token_type': new_token_data.get('token_type', 'bearer'),
+    'expires_in': new_expires_in,
+    'expiry_date': expiry_date,
+    'expiry_timestamp': expiry_timestamp
+  }
+
+def introspect_token(access_token, refresh=False, include_pages=True):
+  """Validasi token ke Graph API dan exchange ke long-lived token
+  
+  Return (payload, status_code) dengan shape yang sama seperti response
+  /api/validate-token. Hasil tiap bagian (profile, exchange, permissions,
+  pages) di-cache per hash token; refresh=True mengabaikan cache.
+  include_pages=False melewati pengambilan pages (field 'pages' tidak ada).
+  """
+  fingerprint = token_fingerprint(access_token)
+  if refresh:
+    invalidate_token_cache(access_token)
+  
+  user_data, cached_exchange, all_permissions, pages = introspection_cache.get_many([
+    (fingerprint, kind) for kind in ('profile', 'exchange', 'permissions', 'pages')
+  ])
+  # Pages di-cache per worker (berisi page token) sehingga tidak ikut dibuang
+  # invalidate_user_state di worker lain; profile yang hilang (expired atau
+  # dibuang webhook lewat backend bersama) berarti pages juga diambil ulang
+  if user_data is None:
+    pages = None
+  
+  # 1-3. /me, token exchange dan permissions dijalankan paralel (yang belum
+  # ada di cache saja). Exchange & permissions tidak saling bergantung dan
+  # hasilnya hanya dipakai kalau /me berhasil, jadi cukup satu round trip.
+  deadline = time.monotonic() + VALIDATE_DEADLINE
+  me_future = None
+  if user_data is None:
+    me_future = graph_executor.submit(graph.get_json, 'me', params={
+      'fields': 'id,name,email,picture.type(large)',
+      'access_token': access_token
+    })
+  exchange_future = None
+  if cached_exchange is None:
+    exchange_future = graph_executor.submit(exchange_long_lived_token, access_token)
+  permissions_future = None
+  if all_permissions is None:
+    permissions_future = graph_executor.submit(fetch_permissions, access_token)
+  
+  def cancel_branches():
+    for future in (exchange_future, permissions_future):
+      if future:
+        future.cancel()
+  
+  if me_future:
+    try:
+      user_data = me_future.result(timeout=time_left(deadline))
+    except (requests.exceptions.Timeout, FutureTimeoutError):
+      cancel_branches()
+      return {
+        'success': False,
+        'error': 'Request timeout - Facebook API tidak merespons'
+      }, 408
+    except GraphRateLimited as e:
+      cancel_branches()
+      return rate_limited_payload(e), 429
+    except GraphCircuitOpen as e:
+      cancel_branches()
+      return circuit_open_payload(e), 503
+    except requests.exceptions.RequestException as e:
+      cancel_branches()
+      return {
+        'success': False,
+        'error': f'Gagal menghubungi Facebook API: {str(e)}'
+      }, 500
+    
+    if 'error' in user_data:
+      cancel_branches()
+      return token_error_payload(user_data), 200
+    
+    cache_introspection(fingerprint, 'profile', user_data)
+  
+  # Branch yang gagal atau melewati deadline menghasilkan data kosong.
+  # known hanya berisi bagian yang valid (dari cache atau fetch berhasil).
+  known = {'profile': user_data}
+  if exchange_future:
+    new_token_data = result_before(exchange_future, deadline, None)
+    if new_token_data and 'access_token' in new_token_data:
+      cached_exchange = exchange_cache_entry(new_token_data)
+      cache_introspection(fingerprint, 'exchange', cached_exchange)
+  if cached_exchange is not None:
+    known['exchange'] = cached_exchange
+  new_token_data = exchange_from_cache(cached_exchange)
+  
+  if permissions_future:
+    all_permissions = result_before(permissions_future, deadline, None)
+    if all_permissions is None:
+      all_permissions = []
+    else:
+      cache_introspection(fingerprint, 'permissions', all_permissions)
+      known['permissions'] = all_permissions
+  else:
+    known['permissions'] = all_permissions
+  
+  # 4. Get pages if has permission (butuh token hasil exchange)
+  if not include_pages:
+    pages = None
+  elif not has_pages_permission(all_permissions):
+    pages = []
+    if 'permissions' in known:
+      known['pages'] = pages
+  elif pages is None:
+    token_to_use = new_token_data.get('access_token') if new_token_data else access_token
+    pages_future = graph_executor.submit(fetch_pages, token_to_use)
+    pages = result_before(pages_future, deadline, None)
+    if pages is None:
+      pages = []
+    else:
+      cache_introspection(fingerprint, 'pages', pages)
+      known['pages'] = pages
+  else:
+    known['pages'] = pages
+  
+  if new_token_data and new_token_data['access_token'] != access_token:
+    seed_introspection_cache(new_token_data['access_token'], known)
+  
+  return build_introspection_payload(user_data, new_token_data, all_permissions, pages), 200
+
+# ==================== DEBUG TOKEN ====================
+
+# App access token untuk /debug_token, diambil sekali per proses
+app_token_cache = {}
+app_token_lock = threading.Lock()
+
+def app_access_token():
+  """App access token dari FB_APP_ID/FB_APP_SECRET (client_credentials, di-cache)
+  
+  Kalau client_credentials gagal, format app_id|app_secret (juga diterima
+  Graph API) dipakai untuk call ini saja tanpa di-cache, jadi call
+  berikutnya mencoba client_credentials lagi.
+  """
+  token = app_token_cache.get('token')
+  if token:
+    return token
+  
+  with app_token_lock:
+    if 'token' not in app_token_cache:
+      try:
+        token_data = graph.get_json('oauth/access_token', params={
+          'client_id': FB_APP_ID,
+          'client_secret': FB_APP_SECRET,
+          'grant_type': 'client_credentials'
+        })
+        token = token_data.get('access_token')
+      except requests.exceptions.RequestException as e:
+        logger.warning(f'App token request failed: {str(e)}')
+        token = None
+      if not token:
+        return f'{FB_APP_ID}|{FB_APP_SECRET}'
+      app_token_cache['token'] = token
+  return app_token_cache['token']
+
+def reset_app_access_token(token):
+  """Buang app token dari cache (kalau masih token yang sama) setelah ditolak Graph"""
+  with app_token_lock:
+    if app_token_cache.get('token') == token:
+      del app_token_cache['token']
+
+def debug_token_payload(result):
+  """Payload validasi ringan dari hasil satu item batch /debug_token"""
+  if result is None:
+    return {'success': False, 'error': 'Facebook API tidak memproses token ini'}, 500
+  
+  body = result['body'] if isinstance(result['body'], dict) else {}
+  if 'error' in body:
+    return {
+      'success': False,
+      'error': body['error'].get('message', 'Unknown error'),
+      'error_code': body['error'].get('code'),
+      'error_type': body['error'].get('type')
+    }, result['code'] or 500
+  
+  data = body.get('data', {})
+  payload = {
+    'success': True,
+    'data': {
+      'is_valid': bool(data.get('is_valid')),
+      'user_id': data.get('user_id'),
+      'app_id': data.get('app_id'),
+      'type': data.get('type'),
+      'expires_at': data.get('expires_at'),
+      'data_access_expires_at': data.get('data_access_expires_at'),
+      'scopes': data.get('scopes', [])
+    }
+  }
+  if data.get('error'):
+    payload['data']['error'] = data['error'].get('message')
+  return payload, 200
+
+def iter_debug_tokens(access_tokens):
+  """Yield (index, payload, status_code) validasi ringan untuk banyak token
+  
+  Token dicek lewat /debug_token dengan app access token, GRAPH_BATCH_SIZE
+  token per Graph batch request. Hasil yang masih di-cache tidak dikirim
+  ulang; hasil lain dikirim per batch yang selesai.
+  """
+  # Token yang sama di input cukup dicek sekali: fingerprint -> index input
+  pending = OrderedDict()
+  fingerprints = {
+    index: token_fingerprint(access_token) for index, access_token in enumerate(access_tokens)
+    if isinstance(access_token, str) and len(access_token) >= 50
+  }
+  # Hasil cache semua token diambil sekaligus (satu round trip di backend bersama)
+  cached_results = dict(zip(fingerprints, introspection_cache.get_many([
+    (fingerprint, 'debug') for fingerprint in fingerprints.values()
+  ])))
+  for index, access_token in enumerate(access_tokens):
+    if index not in fingerprints:
+      yield index, {'success': False, 'error': 'Invalid access token format'}, 400
+      continue
+    fingerprint = fingerprints[index]
+    cached = cached_results[index]
+    if cached is not None:
+      yield index, cached, 200
+      continue
+    pending.setdefault(fingerprint, (access_token, []))[1].append(index)
+  
+  if not pending:
+    return
+  
+  fingerprints = list(pending)
+  items = [batch_item('GET', 'debug_token', {'input_token': pending[fingerprint][0]}) for fingerprint in fingerprints]
+  chunks = [list(range(start, min(start + GRAPH_BATCH_SIZE, len(items)))) for start in range(0, len(items), GRAPH_BATCH_SIZE)]
+  app_token = app_access_token()
+  for position, result in iter_graph_batches(app_token, items, chunks):
+    payload, status_code = debug_token_payload(result)
+    fingerprint = fingerprints[position]
+    # Error 190/102 di level response berarti app token yang ditolak (token
+    # input yang tidak valid dilaporkan lewat data.is_valid)
+    if payload.get('error_code') in (190, 102):
+      reset_app_access_token(app_token)
+    if payload['success']:
+      cache_introspection(fingerprint, 'debug', payload)
+    for index in pending[fingerprint][1]:
+      yield index, payload, status_code
+
+# ==================== TOKEN REGISTRY ====================
+
+class TokenRegistry:
+  """Registry token server-side di SQLite, token dan state terenkripsi (Fernet)
+  
+  Satu baris per user Facebook berisi token terbaru, waktu expired dan hasil
+  validasi terakhir (profil, permissions, pages). Hash semua token yang
+  pernah dipakai user tersebut disimpan di tabel alias supaya error 190
+  pada token lama bisa menandai baris user-nya invalid. State hanya
+  diberikan ke pemegang token terbaru; token lama selalu divalidasi ulang
+  ke Facebook dan tidak pernah ditukar dengan token baru dari registry
+  (hash token tidak membuktikan kepemilikan akun). Worker background me-refresh
+  token yang mendekati expired atau sudah lama tidak dicek; baris di-claim
+  lewat lease supaya beberapa proses tidak me-refresh token yang sama.
+  """
+
+  SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tokens (
+      user_id TEXT PRIMARY KEY,
+      token BLOB NOT NULL,
+      state BLOB NOT NULL,
+      status TEXT NOT NULL,
+      expires_at INTEGER NOT NULL,
+      checked_at INTEGER NOT NULL,
+      lease_until INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS tokens_expiry ON tokens (status, expires_at);
+    CREATE INDEX IF NOT EXISTS tokens_checked ON tokens (status, checked_at);
+    CREATE TABLE IF NOT EXISTS token_aliases (
+      token_hash TEXT PRIMARY KEY,
+      user_id TEXT NOT NULL,
+      created_at INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS token_aliases_user ON token_aliases (user_id);
+  """
+
+  def __init__(self, path, fernet, refresh_before, recheck_interval, refresh_interval, batch_size):
+    self.path = path
+    self.fernet = fernet
+    self.refresh_before = refresh_before
+    self.recheck_interval = recheck_interval
+    self.refresh_interval = refresh_interval
+    self.batch_size = batch_size
+    self._local = threading.local()
+    self._worker_pid = None
+    self._worker_lock = threading.Lock()
+    with self.connection() as conn:
+      conn.executescript(self.SCHEMA)
+
+  def connection(self):
+    """Koneksi SQLite per thread (dibuat ulang setelah fork)"""
+    conn = getattr(self._local, 'conn', None)
+    if conn is None or self._local.pid != os.getpid():
+      conn = sqlite3.connect(self.path, timeout=10)
+      conn.execute('PRAGMA journal_mode=WAL')
+      self._local.conn = conn
+      self._local.pid = os.getpid()
+    return conn
+
+  def encrypt(self, value):
+    return self.fernet.encrypt(json.dumps(value).encode('utf-8'))
+
+  def decrypt(self, blob):
+    return json.loads(self.fernet.decrypt(blob))
+
+  def lookup(self, access_token):
+    """Payload /api/validate-token dari state tersimpan
+    
+    None kalau tidak ada, sudah basi, atau access_token bukan token terbaru
+    user tersebut (alias token lama harus lewat introspect_token).
+    """
+    now = int(time.time())
+    row = self.connection().execute(
+      'SELECT t.token, t.state, t.expires_at FROM token_aliases a JOIN tokens t ON t.user_id = a.user_id '
+      'WHERE a.token_hash = ? AND t.status = ? AND t.checked_at >= ?',
+      (token_fingerprint(access_token), 'active', now - self.recheck_interval)
+    ).fetchone()
+    if row is None:
+      return None
+    
+    token, state, expires_at = row
+    current_token = self.decrypt(token)
+    if not hmac.compare_digest(token_fingerprint(current_token), token_fingerprint(access_token)):
+      return None
+    if expires_at and expires_at <= now + 60:
+      return None
+    data = self.decrypt(state)
+    data['new_token'] = new_token_info({
+      'access_token': current_token,
+      'expires_in': max(0, expires_at - now) if expires_at else 0
+    })
+    return {'success': True, 'data': data}
+
+  def record(self, access_token, payload):
+    """Simpan hasil introspect_token untuk token ini"""
+    now = int(time.time())
+    conn = self.connection()
+    
+    if not payload.get('success'):
+      # Token dicabut/expired (OAuthException 190): tandai invalid
+      if payload.get('error_code') == 190:
+        with conn:
+          conn.execute(
+            'UPDATE tokens SET status = ?, checked_at = ?, lease_until = 0 '
+            'WHERE user_id = (SELECT user_id FROM token_aliases WHERE token_hash = ?)',
+            ('invalid', now, token_fingerprint(access_token))
+          )
+      return
+    
+    data = dict(payload['data'])
+    new_token = data.pop('new_token', None)
+    token = new_token['access_token'] if new_token else access_token
+    expires_at = now + new_token['expires_in'] if new_token and new_token['expires_in'] else 0
+    user_id = str(data.get('id'))
+    
+    with conn:
+      conn.execute(
+        'INSERT INTO tokens (user_id, token, state, status, expires_at, checked_at, lease_until) '
+        'VALUES (?, ?, ?, ?, ?, ?, 0) ON CONFLICT (user_id) DO UPDATE SET '
+        'token = excluded.token, state = excluded.state, status = excluded.status, '
+        'expires_at = excluded.expires_at, checked_at = excluded.checked_at, lease_until = 0',
+        (user_id, self.encrypt(token), self.encrypt(data), 'active', expires_at, now)
+      )
+      conn.executemany(
+        'INSERT OR REPLACE INTO token_aliases (token_hash, user_id, created_at) VALUES (?, ?, ?)',
+        [(token_fingerprint(value), user_id, now) for value in {access_token, token}]
+      )
+
+  def invalidate_user(self, user_id, revoked):
+    """Tandai state user basi (atau dicabut), return hash semua token user tersebut
+    
+    State yang basi tidak dipakai lookup dan segera dicek ulang worker;
+    user yang mencabut app ditandai 'revoked' dan tidak di-refresh lagi.
+    """
+    conn = self.connection()
+    with conn:
+      if revoked:
+        conn.execute('UPDATE tokens SET status = ?, lease_until = 0 WHERE user_id = ?', ('revoked', user_id))
+      else:
+        conn.execute('UPDATE tokens SET checked_at = 0 WHERE user_id = ?', (user_id,))
+      rows = conn.execute('SELECT token_hash FROM token_aliases WHERE user_id = ?', (user_id,)).fetchall()
+    return [token_hash for (token_hash,) in rows]
+
+  def claim_due(self):
+    """Claim baris yang perlu di-refresh, urut dari yang paling cepat expired"""
+    now = int(time.time())
+    conn = self.connection()
+    with conn:
+      due = conn.execute(
+        'SELECT user_id FROM ('
+        '  SELECT user_id, expires_at FROM tokens WHERE status = ? AND expires_at > 0 AND expires_at < ? AND lease_until < ?'
+        '  UNION'
+        '  SELECT user_id, expires_at FROM tokens WHERE status = ? AND checked_at < ? AND lease_until < ?'
+        ') ORDER BY expires_at LIMIT ?',
+        ('active', now + self.refresh_before, now, 'active', now - self.recheck_interval, now, self.batch_size)
+      ).fetchall()
+      claimed = []
+      for (user_id,) in due:
+        cursor = conn.execute(
+          'UPDATE tokens SET lease_until = ? WHERE user_id = ? AND lease_until < ?',
+          (now + int(self.refresh_interval * 5), user_id, now)
+        )
+        if cursor.rowcount:
+          claimed.append(user_id)
+      if not claimed:
+        return []
+      rows = conn.execute(
+        f'SELECT token FROM tokens WHERE user_id IN ({",".join("?" * len(claimed))})',
+        claimed
+      ).fetchall()
+    return [self.decrypt(token) for (token,) in rows]
+
+  def refresh_due(self):
+    """Refresh satu batch token: exchange long-lived, permissions dan pages"""
+    tokens = self.claim_due()
+    if not tokens:
+      return 0
+    
+    def refresh_one(token):
+      try:
+        payload, _ = introspect_token(token, refresh=True)
+        self.record(token, payload)
+        token_refreshes.inc('ok' if payload.get('success') else 'invalid' if payload.get('error_code') == 190 else 'failed')
+      except Exception as e:
+        token_refreshes.inc('failed')
+        logger.warning(f'Token refresh failed: {str(e)}')
+    
+    workers = min(BULK_VALIDATE_CONCURRENCY, len(tokens))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='token-refresh') as executor:
+      list(executor.map(refresh_one, tokens))
+    return len(tokens)
+
+  def prune_aliases(self):
+    """Hapus alias token yang sudah pasti expired (long-lived token berlaku 60 hari)"""
+    conn = self.connection()
+    with conn:
+      conn.execute('DELETE FROM token_aliases WHERE created_at < ?', (int(time.time()) - 60 * 24 * 3600,))
+
+  def run_worker(self):
+    while True:
+      try:
+        self.prune_aliases()
+        # Batch penuh: kemungkinan masih ada token lain yang due
+        if self.refresh_due() >= self.batch_size:
+          continue
+      except Exception as e:
+        logger.error(f'Token refresh worker error: {str(e)}')
+      time.sleep(self.refresh_interval)
+
+  def ensure_worker(self):
+    """Jalankan worker refresh sekali per proses (juga setelah fork)"""
+    pid = os.getpid()
+    if self._worker_pid == pid:
+      return
+    with self._worker_lock:
+      if self._worker_pid != pid:
+        threading.Thread(target=self.run_worker, name='token-refresh', daemon=True).start()
+        self._worker_pid = pid
+
+  def collect_metrics(self):
+    rows = self.connection().execute('SELECT status, COUNT(*) FROM tokens GROUP BY status').fetchall()
+    lines = ['# TYPE token_registry_tokens gauge']
+    lines.extend(f'token_registry_tokens{format_labels(("status",), (status,))} {count}' for status, count in rows)
+    return lines
+
+token_refreshes = register_metric(Counter(
+  'token_registry_refreshes_total',
+  'Refresh token oleh worker token registry',
+  ('result',)
+))
+
+def create_token_registry():
+  """TokenRegistry kalau TOKEN_REGISTRY_PATH diset, None kalau nonaktif"""
+  if not TOKEN_REGISTRY_PATH:
+    return None
+  if not TOKEN_REGISTRY_KEY:
+    logger.warning('TOKEN_REGISTRY_PATH diset tanpa TOKEN_REGISTRY_KEY/SECRET_KEY, token registry nonaktif')
+    return None
+  try:
+    from cryptography.fernet import Fernet
+  except ImportError:
+    logger.warning('Package cryptography tidak terpasang, token registry nonaktif')
+    return None
+  
+  key = base64.urlsafe_b64encode(hashlib.sha256(TOKEN_REGISTRY_KEY.encode('utf-8')).digest())
+  registry = TokenRegistry(
+    TOKEN_REGISTRY_PATH,
+    Fernet(key),
+    refresh_before=TOKEN_REFRESH_BEFORE,
+    recheck_interval=TOKEN_RECHECK_INTERVAL,
+    refresh_interval=TOKEN_REFRESH_INTERVAL,
+    batch_size=TOKEN_REFRESH_BATCH
+  )
+  metrics_collectors.append(registry.collect_metrics)
+  return registry
+
+token_registry = create_token_registry()
+
+def validate_with_registry(access_token, refresh=False, include_pages=True):
+  """introspect_token yang memakai state precomputed dari token registry
+  
+  Kalau registry aktif dan punya state yang masih segar untuk token ini,
+  state itu dipakai tanpa Graph call; hasil introspeksi baru selalu disimpan.
+  """
+  if token_registry is None:
+    return introspect_token(access_token, refresh=refresh, include_pages=include_pages)
+  
+  if not refresh:
+    payload = token_registry.lookup(access_token)
+    if payload is not None:
+      return payload, 200
+  
+  payload, status_code = introspect_token(access_token, refresh=refresh, include_pages=include_pages)
+  try:
+    token_registry.record(access_token, payload)
+  except Exception as e:
+    logger.warning(f'Token registry write failed: {str(e)}')
+  return payload, status_code
+
+# ==================== TOKEN EVENTS ====================
+
+def sse_event(event, data):
+  """Satu event server-sent events"""
+  return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+class TokenWatch:
+  """State satu stream /api/token-events
+  
+  Semua token dicek lewat /debug_token (batch, di-cache) saat stream dibuka
+  dan setiap recheck_interval. Di antaranya stream hanya menunggu waktu
+  expired token berikutnya, jadi tidak ada Graph call selama status token
+  tidak berubah. Event: 'status' (valid, expires_at berubah), 'expired'
+  dan 'revoked'. Token baru dari token registry tidak pernah dikirim:
+  stream hanya membuktikan client memegang token lama, bukan token baru.
+  """
+
+  def __init__(self, tokens, recheck_interval, keepalive, max_age):
+    self.tokens = dict(tokens)
+    self.recheck_interval = recheck_interval
+    self.keepalive = keepalive
+    self.expires_at = {}
+    self.inactive = set()
+    self.next_check = time.time()
+    self.closes_at = self.next_check + max_age
+
+  @property
+  def done(self):
+    return time.time() >= self.closes_at or len(self.inactive) == len(self.tokens)
+
+  def check(self):
+    """Cek ulang semua token yang masih aktif, return list (event, data)"""
+    events = []
+    token_ids = [token_id for token_id in self.tokens if token_id not in self.inactive]
+    now = time.time()
+    for index, payload, status_code in iter_debug_tokens([self.tokens[token_id] for token_id in token_ids]):
+      token_id = token_ids[index]
+      if status_code == 400:
+        self.inactive.add(token_id)
+        events.append(('revoked', {'id': token_id, 'error': payload['error']}))
+        continue
+      if not payload['success']:
+        # Error Graph sementara: status lama dipertahankan sampai recheck berikutnya
+        continue
+      
+      data = payload['data']
+      expires_at = data.get('expires_at') or 0
+      if not data['is_valid']:
+        self.inactive.add(token_id)
+        event = 'expired' if expires_at and expires_at <= now else 'revoked'
+        events.append((event, {'id': token_id, 'expires_at': expires_at, 'error': data.get('error')}))
+      elif self.expires_at.get(token_id) != expires_at:
+        events.append(('status', {'id': token_id, 'is_valid': True, 'expires_at': expires_at, 'scopes': data.get('scopes', [])}))
+      self.expires_at[token_id] = expires_at
+    
+    self.next_check = time.time() + self.recheck_interval
+    return events
+
+  def poll(self):
+    """Event yang jatuh tempo sekarang: token yang baru expired dan hasil recheck"""
+    now = time.time()
+    events = []
+    for token_id, expires_at in self.expires_at.items():
+      if token_id not in self.inactive and expires_at and expires_at <= now:
+        self.inactive.add(token_id)
+        events.append(('expired', {'id': token_id, 'expires_at': expires_at}))
+    if now >= self.next_check:
+      events.extend(self.check())
+    return events
+
+  def wait_time(self):
+    """Detik sampai ada yang perlu dikerjakan (expired, recheck, keepalive atau stream ditutup)"""
+    now = time.time()
+    if self.done:
+      return 0.0
+    wake_at = [self.next_check, self.closes_at, now + self.keepalive]
+    wake_at.extend(
+      expires_at for token_id, expires_at in self.expires_at.items()
+      if expires_at and token_id not in self.inactive
+    )
+    return max(0.0, min(wake_at) - now)
+
+  def render(self, events):
+    """Body chunk untuk hasil poll(); komentar keepalive kalau tidak ada event"""
+    return ''.join(sse_event(event, data) for event, data in events) or ': keepalive\n\n'
+
+def parse_token_events(data):
+  """Validasi body /api/token-events, return (error_response, tokens)
+  
+  tokens berupa list (id, access_token); id dipilih client (misalnya user_id)
+  dan dikirim balik di setiap event.
+  """
+  if not FB_APP_ID or not FB_APP_SECRET:
+    return (jsonify({
+      'success': False,
+      'error': 'FB_APP_ID dan FB_APP_SECRET harus diset untuk token events'
+    }), 500), None
+  
+  tokens = data.get('tokens') if isinstance(data, dict) else None
+  if not isinstance(tokens, list) or not tokens or not all(
+    isinstance(token, dict) and isinstance(token.get('id'), str) and isinstance(token.get('access_token'), str)
+    for token in tokens
+  ):
+    return (jsonify({
+      'success': False,
+      'error': "tokens harus berupa list {'id', 'access_token'} yang tidak kosong"
+    }), 400), None
+  
+  if len(tokens) > TOKEN_EVENTS_MAX_TOKENS:
+    return (jsonify({
+      'success': False,
+      'error': f'Maksimal {TOKEN_EVENTS_MAX_TOKENS} token per stream'
+    }), 400), None
+  return None, [(token['id'], token['access_token']) for token in tokens]
+
+def token_events_response(body):
+  """Response text/event-stream tanpa buffering proxy"""
+  response = Response(body, mimetype='text/event-stream')
+  response.headers['Cache-Control'] = 'no-cache'
+  response.headers['X-Accel-Buffering'] = 'no'
+  return response
+
+# ==================== WEBHOOKS ====================
+
+webhook_events = register_metric(Counter(
+  'webhook_events_total',
+  'Event webhook Facebook per jenis dan hasil',
+  ('kind', 'result')
+))
+
+def base64url_decode(value):
+  """Decode base64url tanpa padding (format signed_request Facebook)"""
+  return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def parse_signed_request(signed_request):
+  """Payload signed_request yang signature-nya valid, None kalau tidak valid
+  
+  Format '<signature>.<payload>', keduanya base64url; signature adalah
+  HMAC-SHA256 dari bagian payload dengan FB_APP_SECRET.
+  """
+  if not FB_APP_SECRET or not isinstance(signed_request, str) or signed_request.count('.') != 1:
+    return None
+  encoded_signature, encoded_payload = signed_request.split('.')
+  try:
+    signature = base64url_decode(encoded_signature)
+    payload = json.loads(base64url_decode(encoded_payload))
+  except ValueError:
+    return None
+  
+  expected = hmac.new(FB_APP_SECRET.encode('utf-8'), encoded_payload.encode('utf-8'), hashlib.sha256).digest()
+  if not secrets.compare_digest(signature, expected):
+    return None
+  if not isinstance(payload, dict) or str(payload.get('algorithm', '')).upper() != 'HMAC-SHA256':
+    return None
+  return payload
+
+def verify_webhook_signature(body, header):
+  """Cek header X-Hub-Signature-256 ('sha256=<hex>') terhadap body mentah"""
+  if not FB_APP_SECRET or not header.startswith('sha256='):
+    return False
+  expected = hmac.new(FB_APP_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+  return secrets.compare_digest(header[len('sha256='):].encode('utf-8'), expected.encode('utf-8'))
+
+def invalidate_user_state(user_id, revoked):
+  """Buang cache introspeksi, response Graph dan state registry satu user Facebook
+  
+  Hanya berlaku untuk semua worker kalau STATE_BACKEND bersama; dengan
+  backend memory worker lain tetap memakai cache-nya sampai TTL habis.
+  """
+  fingerprints = set(token_user_index.get(user_id) or [])
+  if token_registry is not None:
+    fingerprints.update(token_registry.invalidate_user(user_id, revoked))
+  introspection_cache.delete_many([(fingerprint, kind) for fingerprint in fingerprints for kind in INTROSPECTION_TTLS])
+  token_user_index.delete(user_id)
+  invalidate_graph_objects([(user_id, None)] + [('me', fingerprint) for fingerprint in fingerprints])
+
+class UserInvalidationQueue:
+  """Antrian invalidasi per user dari webhook Facebook
+  
+  Request webhook hanya memverifikasi signature lalu memasukkan user_id ke
+  antrian dan langsung dijawab. Worker background mengambil event per batch
+  (sampai batch_size event atau batch_wait detik), menggabungkan event untuk
+  user yang sama lalu menjalankan invalidate_user_state.
+  """
+
+  def __init__(self, maxsize, batch_size, batch_wait):
+    self.queue = queue.Queue(maxsize)
+    self.batch_size = batch_size
+    self.batch_wait = batch_wait
+    self._worker_pid = None
+    self._worker_lock = threading.Lock()
+
+  def submit(self, user_id, revoked):
+    """Masukkan event ke antrian, False kalau antrian penuh"""
+    self.ensure_worker()
+    try:
+      self.queue.put_nowait((str(user_id), revoked))
+    except queue.Full:
+      return False
+    return True
+
+  def next_batch(self):
+    """Tunggu event berikutnya, return {user_id: revoked} satu batch"""
+    events = [self.queue.get()]
+    deadline = time.monotonic() + self.batch_wait
+    while len(events) < self.batch_size:
+      try:
+        events.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+      except queue.Empty:
+        break
+    # Deauthorize untuk user yang sama menang atas perubahan permissions
+    users = {}
+    for user_id, revoked in events:
+      users[user_id] = users.get(user_id, False) or revoked
+    return users
+
+  def run_worker(self):
+    while True:
+      for user_id, revoked in self.next_batch().items():
+        kind = 'deauthorize' if revoked else 'permissions'
+        try:
+          invalidate_user_state(user_id, revoked)
+          webhook_events.inc(kind, 'processed')
+        except Exception as e:
+          webhook_events.inc(kind, 'failed')
+          logger.warning(f'Webhook invalidation failed for user {user_id}: {str(e)}')
+
+  def ensure_worker(self):
+    """Jalankan worker sekali per proses (juga setelah fork)"""
+    pid = os.getpid()
+    if self._worker_pid == pid:
+      return
+    with self._worker_lock:
+      if self._worker_pid != pid:
+        if not state_backend.shared:
+          logger.warning('STATE_BACKEND=memory: invalidasi dari webhook hanya berlaku di worker yang menerimanya')
+        threading.Thread(target=self.run_worker, name='webhook-invalidation', daemon=True).start()
+        self._worker_pid = pid
+
+user_invalidations = UserInvalidationQueue(WEBHOOK_QUEUE_MAX, WEBHOOK_BATCH_SIZE, WEBHOOK_BATCH_WAIT)
+
+def permissions_webhook_users(data):
+  """user_id dari body webhook object 'permissions', None kalau format tidak valid"""
+  if not isinstance(data, dict) or data.get('object') != 'permissions' or not isinstance(data.get('entry'), list):
+    return None
+  users = []
+  for entry in data['entry']:
+    user_id = (entry.get('uid') or entry.get('id')) if isinstance(entry, dict) else None
+    if not user_id:
+      return None
+    users.append(str(user_id))
+  return users
+
+def queue_user_invalidations(kind, user_ids, revoked):
+  """Antrikan invalidasi untuk user_ids; response 503 kalau antrian penuh"""
+  for user_id in user_ids:
+    if not user_invalidations.submit(user_id, revoked):
+      webhook_events.inc(kind, 'dropped')
+      # Facebook mengirim ulang event yang tidak dijawab 200
+      return jsonify({
+        'success': False,
+        'error': 'Antrian webhook penuh, coba lagi nanti'
+      }), 503
+    webhook_events.inc(kind, 'queued')
+  return jsonify({'success': True})
+
+# ==================== OAUTH CALLBACK HELPERS ====================
 
-# Session configuration for security
-app.config['SESSION_COOKIE_SECURE'] = True
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
+OAUTH_SCOPES = [
+  # Basic User Info
+  'public_profile',
+  'email',
+  'user_birthday',
+  'user_hometown',
+  'user_location',
+  'user_friends',
+  'user_age_range',
+  'user_gender',
+  'user_link',
+  
+  # User Posts & Feed
+  'user_posts',                    # Baca posts yang dibuat user
+  'user_photos',                   # Akses foto user
+  'user_videos',                   # Akses video user
+  
+  # Publishing to User Timeline
+  'publish_to_groups',             # Post ke grup (jika member)
+  'publish_video',                 # Upload video ke timeline
+  
+  # Pages Management (PENTING untuk manage pages)
+  'pages_show_list',               # Lihat daftar pages yang di-manage
+  'pages_read_engagement',         # Baca engagement metrics (likes, comments, etc)
+  'pages_manage_posts',            # Buat, edit, hapus posts di page
+  'pages_manage_engagement',       # Balas komentar, moderate
+  'pages_read_user_content',       # Baca konten yang di-tag/mention page
+  'pages_manage_metadata',         # Edit info page
+  'pages_manage_ads',              # Manage ads (optional)
+  'pages_manage_cta',              # Manage call-to-action buttons
+  'pages_messaging',               # Send messages dari page (Messenger)
+  
+  # Instagram (jika page terhubung dengan Instagram)
+  'instagram_basic',               # Basic Instagram access
+  'instagram_content_publish',     # Post ke Instagram
+  'instagram_manage_comments',     # Manage Instagram comments
+  'instagram_manage_insights',     # Lihat Instagram insights
+  
+  # Business/Advanced
+  'business_management',           # Manage business assets
+  'catalog_management',            # Manage product catalogs
+  'leads_retrieval',               # Ambil leads dari ads
+  'read_insights',                 # Baca insights/analytics
+  'ads_management',                # Manage ads (optional)
+]
 
-# Compression
-app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
-app.config['COMPRESS_LEVEL'] = 9
-app.config['COMPRESS_MIN_SIZE'] = 500
-Compress(app)
+# Scope string dan URL dialog OAuth tidak berubah selama proses berjalan,
+# jadi disusun sekali; per request hanya state token yang ditambahkan
+OAUTH_SCOPE_STRING = ','.join(OAUTH_SCOPES)
+OAUTH_DIALOG_URL_PREFIX = (
+  f"https://www.facebook.com/{GRAPH_API_VERSION}/dialog/oauth?"
+  f"client_id={FB_APP_ID}&"
+  f"redirect_uri={REDIRECT_URI}&"
+  f"scope={OAUTH_SCOPE_STRING}&"
+  f"response_type=code&"
+  f"state="
+)
 
-# ==================== SECURITY HELPERS ====================
+def render_callback_error(error, error_description, error_reason, error_message=None):
+  """Render halaman hasil OAuth untuk kondisi error"""
+  return render_template('result_display.html',
+                         error=error,
+                         error_description=error_description,
+                         error_reason=error_reason,
+                         error_message=error_message or error_description,
+                         is_active=False,
+                         user_info=None,
+                         access_token=None,
+                         token_type=None,
+                         expires_in=None,
+                         expiry_date=None,
+                         expiry_timestamp=None,
+                         all_permissions=None,
+                         pages=None,
+                         profile_picture=None)
 
-def generate_state_token():
-  """Generate random state token for CSRF protection"""
-  return secrets.token_urlsafe(32)
+def check_callback_request():
+  """Cek error, state token dan code di query callback
+  
+  Return (error_response, code); error_response None kalau request valid.
+  """
+  # Check for errors first
+  error = request.args.get('error')
+  if error:
+    error_description = request.args.get('error_description', 'Unknown error')
+    error_reason = request.args.get('error_reason', '')
+    
+    # Clear session
+    session.pop('oauth_state', None)
+    return render_callback_error(error, error_description, error_reason), None
+  
+  # Verify state token (CSRF protection)
+  state = request.args.get('state')
+  if not verify_state_token(state):
+    logger.warning(f'Invalid state token: {state}')
+    session.pop('oauth_state', None)
+    return render_callback_error(
+      "Security Error",
+      "Invalid state parameter. Possible CSRF attack detected.",
+      "invalid_state",
+      "Invalid state parameter. Please try again."
+    ), None
+  
+  # Clear state from session after verification
+  session.pop('oauth_state', None)
+  
+  # Get authorization code
+  code = request.args.get('code')
+  if not code:
+    return render_callback_error(
+      "Missing Code",
+      "Authorization code tidak ditemukan di URL",
+      "missing_code"
+    ), None
+  return None, code
 
-def verify_state_token(provided_state):
-  """Verify state token matches session"""
-  session_state = session.get('oauth_state')
-  if not session_state or not provided_state:
-    return False
-  return secrets.compare_digest(session_state, provided_state)
+def code_exchange_params(code):
+  """Params untuk menukar authorization code dengan access token"""
+  return {
+    'client_id': FB_APP_ID,
+    'client_secret': FB_APP_SECRET,
+    'redirect_uri': REDIRECT_URI,
+    'code': code
+  }
+
+def render_token_error(token_data):
+  """Render error dari response exchange authorization code"""
+  return render_callback_error(
+    token_data['error'].get('type', 'Error'),
+    token_data['error'].get('message', 'Unknown error'),
+    'token_error'
+  )
+
+def render_callback_result(token_data, user_info, all_permissions, pages):
+  """Render halaman hasil OAuth dari token dan data login"""
+  if 'error' in user_info:
+    return render_callback_error(
+      "API Error",
+      user_info['error'].get('message', 'Failed to get user info'),
+      'api_error'
+    )
+  
+  access_token = token_data.get('access_token')
+  token_type = token_data.get('token_type', 'bearer')
+  expires_in = token_data.get('expires_in', 0)
+  
+  # Hitung timestamp kadaluarsa
+  expiry_datetime = datetime.now() + timedelta(seconds=expires_in)
+  expiry_date = expiry_datetime.strftime("%d %B %Y, %H:%M:%S WIB")
+  expiry_timestamp = int(expiry_datetime.timestamp())
+  
+  # Ambil URL foto profil
+  profile_picture = user_info.get('picture', {}).get('data', {}).get('url', '')
+  
+  return render_template('result_display.html',
+                         access_token=access_token,
+                         token_type=token_type,
+                         expires_in=expires_in,
+                         expiry_date=expiry_date,
+                         expiry_timestamp=expiry_timestamp,
+                         user_info=user_info,
+                         all_permissions=all_permissions,
+                         pages=pages,
+                         is_active=True,
+                         profile_picture=profile_picture,
+                         error=None,
+                         error_description=None,
+                         error_reason=None,
+                         error_message=None)
+
+# ==================== GRAPH PROXY HELPERS ====================
+
+def parse_graph_request(data):
+  """Validasi body /api/graph-request
+  
+  Return (error_response, spec); spec berisi method, path, params, body,
+  stream, refresh dan paginate yang siap dikirim ke Graph API.
+  """
+  if not isinstance(data, dict):
+    return (jsonify({
+      'error': 'Invalid request body',
+      'message': 'Body must be a JSON object'
+    }), 400), None
+  
+  method = data.get('method', 'GET')
+  path = data.get('path', '/me')
+  access_token = data.get('access_token')
+  params = data.get('params', {})
+  body = data.get('body', {})
+  
+  # Validate inputs
+  if not access_token:
+    return (jsonify({
+      'error': 'Missing access token',
+      'message': 'Access token is required'
+    }), 400), None
+  
+  # Validate token format
+  if not isinstance(access_token, str) or len(access_token) < 50:
+    return (jsonify({
+      'error': 'Invalid access token',
+      'message': 'Access token format is invalid'
+    }), 400), None
+  
+  # Validate method
+  allowed_methods = ['GET', 'POST', 'DELETE']
+  if method not in allowed_methods:
+    return (jsonify({
+      'error': 'Invalid method',
+      'message': f'Method must be one of: {", ".join(allowed_methods)}'
+    }), 400), None
+  
+  # Validate path
+  if not path or not isinstance(path, str):
+    return (jsonify({
+      'error': 'Invalid path',
+      'message': 'Path must be a non-empty string'
+    }), 400), None
+  
+  # Validate params & body (null dianggap object kosong)
+  params = {} if params is None else params
+  body = {} if body is None else body
+  if not isinstance(params, dict) or not isinstance(body, dict):
+    return (jsonify({
+      'error': 'Invalid params',
+      'message': 'params and body must be JSON objects'
+    }), 400), None
+  
+  # Clean path
+  if path.startswith('/'):
+    path = path[1:]
+  
+  # Prevent path traversal
+  if '..' in path or path.startswith('/'):
+    return (jsonify({
+      'error': 'Invalid path',
+      'message': 'Path traversal not allowed'
+    }), 400), None
+  
+  # Validate paginate: {max_items, max_pages}, dibatasi batas server
+  paginate = data.get('paginate')
+  if paginate:
+    if paginate is True:
+      paginate = {}
+    max_items = paginate.get('max_items', GRAPH_PAGINATE_MAX_ITEMS) if isinstance(paginate, dict) else None
+    max_pages = paginate.get('max_pages', GRAPH_PAGINATE_MAX_PAGES) if isinstance(paginate, dict) else None
+    if method != 'GET' or data.get('stream'):
+      message = 'paginate is only supported for GET requests without stream'
+    elif isinstance(max_items, bool) or not isinstance(max_items, int) or not 1 <= max_items <= GRAPH_PAGINATE_MAX_ITEMS:
+      message = f'paginate.max_items must be between 1 and {GRAPH_PAGINATE_MAX_ITEMS}'
+    elif isinstance(max_pages, bool) or not isinstance(max_pages, int) or not 1 <= max_pages <= GRAPH_PAGINATE_MAX_PAGES:
+      message = f'paginate.max_pages must be between 1 and {GRAPH_PAGINATE_MAX_PAGES}'
+    else:
+      message = None
+    if message:
+      return (jsonify({
+        'error': 'Invalid paginate',
+        'message': message
+      }), 400), None
+    paginate = {'max_items': max_items, 'max_pages': max_pages}
+  
+  # Add access token to params
+  params['access_token'] = access_token
+  
+  return None, {
+    'method': method,
+    'path': path,
+    'params': params,
+    'body': body if method == 'POST' else None,
+    'stream': bool(data.get('stream')),
+    'refresh': bool(data.get('refresh')),
+    'paginate': paginate or None
+  }
+
+def paginate_graph_items(body, max_items, max_pages, max_bytes=GRAPH_PAGINATE_MAX_BYTES, timeout=None):
+  """Yield item 'data' semua halaman sebagai baris NDJSON
+  
+  Baris terakhir berupa ringkasan {"paging": {...}} berisi jumlah item dan
+  halaman, serta alasan kalau daftar dipotong (max_items, max_pages atau
+  max_bytes). Kalau dipotong di batas halaman, ringkasan juga berisi cursors
+  halaman terakhir. Memori yang dipakai hanya halaman saat ini dan satu
+  halaman prefetch.
+  """
+  items = pages = sent_bytes = 0
+  truncated = None
+  # True kalau dipotong tepat di batas halaman (semua item halaman terakhir
+  # sudah dikirim), hanya di situ cursor 'after' bisa dipakai untuk lanjut
+  at_boundary = False
+  page = body
+  try:
+    for page in iter_paging_bodies(body, max_pages=max_pages, timeout=timeout):
+      pages += 1
+      for item in page.get('data', []):
+        if items >= max_items:
+          truncated = 'max_items'
+          break
+        line = json.dumps(item) + '\n'
+        sent_bytes += len(line)
+        if sent_bytes > max_bytes:
+          truncated = 'max_bytes'
+          break
+        items += 1
+        yield line
+      
+      has_next = bool(page.get('paging', {}).get('next'))
+      if not truncated and has_next and items >= max_items:
+        truncated = 'max_items'
+        at_boundary = True
+      if truncated:
+        break
+    else:
+      if page.get('paging', {}).get('next'):
+        truncated = 'max_pages'
+        at_boundary = True
+  except GraphAPIError as e:
+    yield json.dumps({'error': e.error}) + '\n'
+    return
+  except requests.exceptions.RequestException as e:
+    yield json.dumps({'error': {'message': str(e)}}) + '\n'
+    return
+  
+  summary = {'items': items, 'pages': pages, 'truncated': truncated is not None, 'reason': truncated}
+  if at_boundary:
+    # Cursor halaman berikutnya supaya client bisa melanjutkan
+    summary['cursors'] = page.get('paging', {}).get('cursors')
+  yield json.dumps({'paging': summary}) + '\n'
+
+# Referensi JSONPath ke hasil operasi lain: {result=nama:$.data.*.id}
+BATCH_RESULT_REFERENCE = re.compile(r'\{result=([^:}]+):')
+
+def parse_graph_batch(data):
+  """Validasi body /api/graph-batch
+  
+  Return (error_response, spec); spec berisi access_token, items batch Graph
+  (urutan sama dengan input) dan chunks (list index item per batch request).
+  """
+  if not isinstance(data, dict):
+    return (jsonify({
+      'error': 'Invalid request body',
+      'message': 'Body must be a JSON object'
+    }), 400), None
+  
+  access_token = data.get('access_token')
+  operations = data.get('operations')
+  
+  if not isinstance(access_token, str) or len(access_token) < 50:
+    return (jsonify({
+      'error': 'Invalid access token',
+      'message': 'Access token format is invalid'
+    }), 400), None
+  
+  if not isinstance(operations, list) or not operations:
+    return (jsonify({
+      'error': 'Invalid operations',
+      'message': 'operations must be a non-empty list'
+    }), 400), None
+  
+  if len(operations) > GRAPH_BATCH_MAX_OPERATIONS:
+    return (jsonify({
+      'error': 'Too many operations',
+      'message': f'Maximum {GRAPH_BATCH_MAX_OPERATIONS} operations per request'
+    }), 400), None
+  
+  items = []
+  names = set()
+  for index, operation in enumerate(operations):
+    if not isinstance(operation, dict):
+      operation = {}
+    method = operation.get('method', 'GET')
+    path = operation.get('path')
+    params = operation.get('params') or {}
+    body = operation.get('body') or {}
+    name = operation.get('name')
+    depends_on = operation.get('depends_on')
+    
+    if method not in ('GET', 'POST', 'DELETE'):
+      message = 'Method must be one of: GET, POST, DELETE'
+    elif not path or not isinstance(path, str) or '..' in path:
+      message = 'Path must be a non-empty string without path traversal'
+    elif not isinstance(params, dict) or not isinstance(body, dict):
+      message = 'params and body must be objects'
+    elif name is not None and (not isinstance(name, str) or not name):
+      message = 'name must be a non-empty string'
+    elif name in names:
+      message = f'Duplicate operation name: {name}'
+    elif depends_on is not None and not isinstance(depends_on, str):
+      message = 'depends_on must be a string'
+    elif depends_on is not None and depends_on not in names:
+      # Graph hanya bisa menunggu operasi yang ada sebelumnya di batch
+      message = f'depends_on must name an earlier operation: {depends_on}'
+    elif not isinstance(operation.get('omit_response_on_success', False), bool):
+      message = 'omit_response_on_success must be a boolean'
+    else:
+      message = None
+    if message:
+      return (jsonify({
+        'error': 'Invalid operation',
+        'message': f'operations[{index}]: {message}'
+      }), 400), None
+    
+    if name is not None:
+      names.add(name)
+    item = batch_item(method, path.lstrip('/'), params, body if method == 'POST' else None)
+    for key in ('name', 'depends_on', 'omit_response_on_success'):
+      if key in operation:
+        item[key] = operation[key]
+    items.append(item)
+  
+  chunks, error = chunk_batch_items(items, GRAPH_BATCH_SIZE)
+  if error:
+    return (jsonify({
+      'error': 'Invalid dependencies',
+      'message': error
+    }), 400), None
+  
+  return None, {'access_token': access_token, 'items': items, 'chunks': chunks}
+
+def chunk_batch_items(items, chunk_size):
+  """Bagi items ke beberapa batch maksimal chunk_size item
+  
+  Item yang saling bergantung (depends_on atau referensi {result=nama:...})
+  selalu masuk batch yang sama, urutan input dipertahankan di dalam batch.
+  Referensi harus ke operasi sebelumnya. Return (chunks, error); chunks
+  berupa list index item.
+  """
+  names = {item['name']: index for index, item in enumerate(items) if item.get('name')}
+  parent = list(range(len(items)))
+  
+  def find(index):
+    while parent[index] != index:
+      parent[index] = parent[parent[index]]
+      index = parent[index]
+    return index
+  
+  for index, item in enumerate(items):
+    # Referensi di params/body ikut ter-urlencode oleh batch_item
+    encoded = item['relative_url'] + '&' + item.get('body', '')
+    references = set(BATCH_RESULT_REFERENCE.findall(unquote_plus(encoded)))
+    if item.get('depends_on'):
+      references.add(item['depends_on'])
+    for name in references:
+      if name not in names:
+        return None, f'Unknown operation name: {name}'
+      if names[name] >= index:
+        # Graph hanya bisa memakai hasil operasi yang ada sebelumnya di batch
+        return None, f'operations[{index}]: {name} must name an earlier operation'
+      parent[find(index)] = find(names[name])
+  
+  groups = OrderedDict()
+  for index in range(len(items)):
+    groups.setdefault(find(index), []).append(index)
+  
+  chunks = []
+  for group in groups.values():
+    if len(group) > chunk_size:
+      return None, f'A dependency chain has more than {chunk_size} operations'
+    # First fit: masukkan ke batch pertama yang masih cukup
+    for chunk in chunks:
+      if len(chunk) + len(group) <= chunk_size:
+        chunk.extend(group)
+        break
+    else:
+      chunks.append(list(group))
+  return [sorted(chunk) for chunk in chunks], None
+
+def iter_graph_batches(access_token, items, chunks):
+  """Kirim semua batch secara paralel, yield (index item, hasil) per batch yang selesai"""
+  def send(chunk):
+    return graph.batch([items[index] for index in chunk], access_token, timeout=GRAPH_PROXY_TIMEOUT)
+  
+  workers = min(GRAPH_BATCH_CONCURRENCY, len(chunks))
+  with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='graph-batch') as executor:
+    futures = {executor.submit(send, chunk): chunk for chunk in chunks}
+    for future in as_completed(futures):
+      chunk = futures[future]
+      try:
+        chunk_results = future.result()
+      except GraphRateLimited as e:
+        chunk_results = [{'code': 429, 'body': {'error': e.error}}] * len(chunk)
+      except GraphBatchError as e:
+        chunk_results = [{'code': None, 'body': {'error': e.error}}] * len(chunk)
+      except requests.exceptions.RequestException as e:
+        chunk_results = [{'code': None, 'body': {'error': {'message': str(e)}}}] * len(chunk)
+      yield from zip(chunk, chunk_results)
+
+def run_graph_batch(access_token, items, chunks):
+  """Kirim semua batch secara paralel, return hasil per item sesuai urutan input"""
+  results = [None] * len(items)
+  for index, result in iter_graph_batches(access_token, items, chunks):
+    results[index] = result
+  
+  for item in items:
+    if item['method'] != 'GET':
+      path, _, query = item['relative_url'].partition('?')
+      params = dict(parse_qsl(query))
+      params.setdefault('access_token', access_token)
+      invalidate_graph_object(path, params)
+  return results
+
+def proxy_response(response_data, status_code, cache_status):
+  """Response JSON /api/graph-request dengan header X-Cache (HIT/MISS)"""
+  response = jsonify(response_data)
+  response.status_code = status_code
+  response.headers['X-Cache'] = cache_status
+  return response
+
+def rate_limited_response(error):
+  """Response 429 /api/graph-request dengan header Retry-After"""
+  response = jsonify({
+    'error': 'Rate Limited',
+    'message': str(error),
+    'retry_after': error.retry_after
+  })
+  response.status_code = 429
+  response.headers['Retry-After'] = str(error.retry_after)
+  return response
+
+def circuit_open_response(error):
+  """Response 503 /api/graph-request dengan header Retry-After"""
+  response = jsonify({
+    'error': 'Service Unavailable',
+    'message': str(error),
+    'retry_after': error.retry_after
+  })
+  response.status_code = 503
+  response.headers['Retry-After'] = str(error.retry_after)
+  return response
+
+# ==================== EXPORT ====================
+
+# Format export: mimetype dan ekstensi file
+EXPORT_FORMATS = {
+  'json': ('application/json', 'json'),
+  'ndjson': ('application/x-ndjson', 'ndjson'),
+  'csv': ('text/csv', 'csv'),
+  'txt': ('text/plain', 'txt')
+}
+EXPORT_CSV_HEADERS = ['Nama', 'User ID', 'Email', 'Access Token', 'Token Type', 'Expires In', 'Expiry Date', 'Status', 'Permissions Count', 'Pages Count']
+EXPORT_TXT_SEPARATOR = '=' * 43
+# Token dari export.js, dikembalikan lewat cookie saat download dimulai
+EXPORT_DOWNLOAD_TOKEN = re.compile(r'[A-Za-z0-9]{1,64}')
+
+def export_value(value):
+  return '' if value is None else str(value)
+
+def csv_line(cells):
+  buffer = io.StringIO()
+  csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator='\n').writerow(cells)
+  return buffer.getvalue()
+
+def export_csv_row(account):
+  """Baris CSV satu akun (kolom sama dengan export di browser)"""
+  return csv_line([
+    export_value(account.get('name')),
+    export_value(account.get('user_id')),
+    account.get('email') or 'N/A',
+    export_value(account.get('access_token')),
+    export_value(account.get('token_type')),
+    export_value(account.get('expires_in')),
+    export_value(account.get('expiry_date')),
+    'Aktif' if account.get('is_active') else 'Tidak Aktif',
+    len(account.get('permissions') or []),
+    len(account.get('pages') or [])
+  ])
+
+def export_txt_block(account):
+  """Blok teks satu akun (format sama dengan export di browser)"""
+  permissions = account.get('permissions') or []
+  pages = account.get('pages') or []
+  lines = [
+    EXPORT_TXT_SEPARATOR,
+    f"Nama: {export_value(account.get('name'))}",
+    f"User ID: {export_value(account.get('user_id'))}",
+    f"Email: {account.get('email') or 'N/A'}",
+    f"Access Token: {export_value(account.get('access_token'))}",
+    f"Token Type: {export_value(account.get('token_type'))}",
+    f"Expires In: {export_value(account.get('expires_in'))} detik",
+    f"Expiry Date: {export_value(account.get('expiry_date'))}",
+    f"Status: {'Aktif' if account.get('is_active') else 'Tidak Aktif'}",
+    f"Last Updated: {export_value(account.get('last_updated'))}",
+    '',
+    f'Permissions ({len(permissions)}):'
+  ]
+  lines.extend(f"  - {permission.get('permission')}: {permission.get('status')}" for permission in permissions)
+  lines.append('')
+  if pages:
+    lines.append(f'Pages ({len(pages)}):')
+    lines.append('\n\n'.join(
+      f"  - {page.get('name')} ({page.get('id')})\n    Token: {export_value(page.get('access_token'))}" for page in pages
+    ))
+  else:
+    lines.append('No Pages')
+  if account.get('refresh_error'):
+    lines.append(f"Refresh Error: {account['refresh_error']}")
+  lines.append(EXPORT_TXT_SEPARATOR)
+  return '\n'.join(lines)
+
+def iter_export(accounts, export_format):
+  """Serialisasi akun satu per satu, yield potongan teks file export"""
+  if export_format == 'csv':
+    yield csv_line(EXPORT_CSV_HEADERS)
+  if export_format == 'json':
+    yield '['
+  index = -1
+  for index, account in enumerate(accounts):
+    if export_format == 'json':
+      yield (',\n' if index else '\n') + textwrap.indent(json.dumps(account, ensure_ascii=False, indent=2), '  ')
+    elif export_format == 'ndjson':
+      yield json.dumps(account, ensure_ascii=False) + '\n'
+    elif export_format == 'csv':
+      yield export_csv_row(account)
+    else:
+      yield ('\n\n' if index else '') + export_txt_block(account)
+  if export_format == 'json':
+    yield '\n]' if index >= 0 else ']'
+
+def refresh_export_account(account):
+  """Salinan akun dengan permissions dan pages terbaru dari Graph API
+  
+  Kalau token sudah tidak bisa dipakai, data lama tetap diexport dengan
+  field 'refresh_error'.
+  """
+  account = dict(account)
+  access_token = account.get('access_token')
+  if not isinstance(access_token, str) or len(access_token) < 50:
+    account['refresh_error'] = 'Invalid access token format'
+    return account
+  
+  # Graph dipanggil langsung (bukan fetch_permissions) supaya rate limit dan
+  # gangguan Facebook API tidak dilaporkan sebagai token tidak valid
+  try:
+    permissions_data = graph.get_json('me/permissions', params={'access_token': access_token})
+  except GraphRateLimited as e:
+    account['refresh_error'] = rate_limited_payload(e)['error']
+    return account
+  except GraphCircuitOpen as e:
+    account['refresh_error'] = circuit_open_payload(e)['error']
+    return account
+  except requests.exceptions.RequestException as e:
+    account['refresh_error'] = f'Gagal menghubungi Facebook API: {str(e)}'
+    return account
+  if 'error' in permissions_data:
+    account['refresh_error'] = f"Token tidak valid: {permissions_data['error'].get('message', 'Unknown error')}"
+    return account
+  all_permissions = permissions_data.get('data', [])
+  account['permissions'] = all_permissions
+  
+  if has_pages_permission(all_permissions):
+    pages = fetch_pages(access_token)
+    if pages is None:
+      account['refresh_error'] = 'Gagal mengambil pages'
+    else:
+      account['pages'] = pages
+  else:
+    account['pages'] = []
+  return account
+
+def iter_bounded(fn, items, concurrency, thread_name_prefix):
+  """Jalankan fn untuk setiap item, maksimal concurrency berjalan bersamaan
+  
+  Hasil di-yield sesuai urutan input dan item berikutnya baru dikirim
+  setelah hasil paling depan diambil, jadi yang tertahan di memori tidak
+  pernah lebih dari concurrency hasil.
+  """
+  with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=thread_name_prefix) as executor:
+    pending = deque()
+    for item in items:
+      pending.append(executor.submit(fn, item))
+      if len(pending) >= concurrency:
+        yield pending.popleft().result()
+    while pending:
+      yield pending.popleft().result()
+
+# ==================== STATIC PAGES ====================
+
+# Halaman yang isinya tidak pernah berubah dirender sekali per worker lalu
+# disimpan bersama varian br/gzip, jadi tidak ada render Jinja maupun
+# kompresi ulang di setiap request
+static_pages = {}
+static_pages_lock = threading.Lock()
+
+def prerender_page(template):
+  """Render template dan siapkan varian terkompresi beserta ETag-nya"""
+  page = static_pages.get(template)
+  if page is not None:
+    return page
+  
+  with static_pages_lock:
+    page = static_pages.get(template)
+    if page is None:
+      body = render_template(template).encode('utf-8')
+      digest = hashlib.sha256(body).hexdigest()[:32]
+      page = {
+        'br': brotli.compress(body, quality=11),
+        'gzip': gzip.compress(body, compresslevel=9),
+        'identity': body,
+        'digest': digest
+      }
+      static_pages[template] = page
+  return page
+
+def serve_static_page(template):
+  """Serve halaman statis dari cache dengan dukungan 304 Not Modified"""
+  page = prerender_page(template)
+  
+  encoding = 'identity'
+  for algorithm in ('br', 'gzip'):
+    if request.accept_encodings[algorithm]:
+      encoding = algorithm
+      break
+  
+  etag = f"{page['digest']}-{encoding}"
+  if request.if_none_match.contains(etag):
+    response = Response(status=304)
+  else:
+    response = Response(page[encoding], mimetype='text/html')
+    if encoding != 'identity':
+      # Header ini juga membuat Flask-Compress melewati response ini
+      response.headers['Content-Encoding'] = encoding
+  
+  response.set_etag(etag)
+  response.headers['Vary'] = 'Accept-Encoding'
+  return response
+
+# ==================== STATIC ASSETS ====================
+
+asset_manifest = {}
+
+def minify_css(source):
+  """Minify CSS sederhana: hapus komentar dan whitespace yang tidak perlu"""
+  source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+  source = re.sub(r'\s+', ' ', source)
+  source = re.sub(r'\s*([{};,])\s*', r'\1', source)
+  return source.replace(';}', '}').strip()
+
+def minify_js(source):
+  """Minify JS kalau rjsmin terpasang, selain itu source dipakai apa adanya"""
+  try:
+    import rjsmin
+  except ImportError:
+    return source
+  return rjsmin.jsmin(source)
+
+def write_atomic(path, data):
+  """Tulis file lewat file sementara supaya worker lain tidak membaca file setengah jadi"""
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  tmp_path = f'{path}.{os.getpid()}.tmp'
+  with open(tmp_path, 'wb') as f:
+    f.write(data)
+  os.replace(tmp_path, path)
+
+def build_static_assets():
+  """Minify, fingerprint dan pre-compress semua file di static/ ke static/dist/
+  
+  Nama file hasil build berisi hash konten source, jadi file yang sudah
+  pernah dibuild tidak diproses ulang. Return manifest {source: hasil}.
+  """
+  manifest = {}
+  for root, dirs, files in os.walk(STATIC_FOLDER):
+    if root == STATIC_FOLDER:
+      dirs[:] = [d for d in dirs if d != 'dist']
+    
+    for name in sorted(files):
+      source_path = os.path.join(root, name)
+      filename = os.path.relpath(source_path, STATIC_FOLDER).replace(os.sep, '/')
+      with open(source_path, 'rb') as f:
+        data = f.read()
+      
+      stem, ext = os.path.splitext(filename)
+      built = f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+      manifest[filename] = f'dist/{built}'
+      
+      target = os.path.join(STATIC_DIST_DIR, built)
+      if os.path.exists(target):
+        continue
+      
+      if ext == '.css':
+        data = minify_css(data.decode('utf-8')).encode('utf-8')
+      elif ext == '.js':
+        data = minify_js(data.decode('utf-8')).encode('utf-8')
+      
+      if ext in PRECOMPRESS_EXTENSIONS:
+        write_atomic(target + '.br', brotli.compress(data, quality=11))
+        write_atomic(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+      # File utama ditulis terakhir, jadi keberadaannya menandakan build lengkap
+      write_atomic(target, data)
+  
+  manifest_data = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+  write_atomic(os.path.join(STATIC_DIST_DIR, 'manifest.json'), manifest_data)
+  return manifest
+
+def load_static_assets():
+  """Build (atau baca) manifest asset; kalau gagal, URL asli tetap dipakai"""
+  try:
+    if STATIC_BUILD_ON_STARTUP:
+      manifest = build_static_assets()
+    else:
+      with open(os.path.join(STATIC_DIST_DIR, 'manifest.json')) as f:
+        manifest = json.load(f)
+  except (OSError, ValueError) as e:
+    logger.warning(f'Static assets not built, serving original files: {str(e)}')
+    manifest = {}
+  # Manifest bisa berubah saat request berjalan (build di background), jadi
+  # diupdate per key tanpa dikosongkan dulu
+  for filename in set(asset_manifest) - set(manifest):
+    asset_manifest.pop(filename, None)
+  asset_manifest.update(manifest)
+  # Halaman statis yang dirender sebelum build selesai memakai URL asset asli
+  with static_pages_lock:
+    static_pages.clear()
+
+static_assets_pid = None
+static_assets_lock = threading.Lock()
+
+def ensure_static_assets():
+  """Load manifest asset sekali per proses (juga setelah fork)
+  
+  Build pertama di host baru (minify + brotli level 11) butuh ratusan ms,
+  jadi dijalankan di thread background; selama build berjalan asset_url
+  memakai file asli dan request tidak perlu menunggu.
+  """
+  global static_assets_pid
+  pid = os.getpid()
+  if static_assets_pid == pid:
+    return
+  with static_assets_lock:
+    if static_assets_pid != pid:
+      static_assets_pid = pid
+      if STATIC_BUILD_ON_STARTUP:
+        threading.Thread(target=load_static_assets, name='static-build', daemon=True).start()
+      else:
+        load_static_assets()
+
+@routes.app_template_global()
+def asset_url(filename):
+  """url_for('static') untuk versi fingerprinted sebuah asset"""
+  return url_for('static', filename=asset_manifest.get(filename, filename))
+
+@routes.cli.command('build-static')
+def build_static_command():
+  """Build fingerprinted dan pre-compressed static assets"""
+  manifest = build_static_assets()
+  print(f'{len(manifest)} assets written to {STATIC_DIST_DIR}')
 
 # ==================== ERROR HANDLERS ====================
 
-@app.errorhandler(400)
+@routes.app_errorhandler(400)
 def bad_request_error(error):
   """Handle 400 Bad Request"""
   return render_template('errors/400.html'), 400
 
-@app.errorhandler(403)
+@routes.app_errorhandler(403)
 def forbidden_error(error):
   """Handle 403 Forbidden"""
   return render_template('errors/403.html'), 403
 
-@app.errorhandler(404)
+@routes.app_errorhandler(404)
 def not_found_error(error):
   """Handle 404 Not Found"""
   return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@routes.app_errorhandler(500)
 def internal_error(error):
   """Handle 500 Internal Server Error"""
   return render_template('errors/500.html'), 500
 
-@app.errorhandler(Exception)
+@routes.app_errorhandler(Exception)
 def handle_exception(error):
   """Handle all unhandled exceptions"""
-  app.logger.error(f'Unhandled exception: {error}')
+  logger.error(f'Unhandled exception: {error}')
   return render_template('errors/500.html'), 500
 
 # ==================== ROUTES ====================
 
-@app.after_request
+def metrics_route():
+  """Label route untuk metrics (rule URL, bukan path asli)"""
+  return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def observe_response_size(response, stage):
+  # Response stream (termasuk stream async dari asgi.py) tidak punya ukuran
+  # yang diketahui di sini
+  if response.is_streamed or getattr(response, 'async_body', None) is not None:
+    return
+  size = response.calculate_content_length()
+  if size is not None:
+    http_response_bytes.observe(size, metrics_route(), stage)
+
+@routes.before_app_request
+def start_request_timer():
+  g.request_started = time.perf_counter()
+
+@routes.before_app_request
+def start_static_assets():
+  """Manifest asset di-load di proses yang benar-benar melayani request"""
+  ensure_static_assets()
+
+@routes.before_app_request
+def start_token_refresh_worker():
+  """Worker token registry dijalankan di proses yang benar-benar melayani request"""
+  if token_registry is not None:
+    token_registry.ensure_worker()
+
+@routes.after_app_request
+def observe_request(response):
+  """Catat durasi route dan ukuran response sebelum kompresi"""
+  started = g.pop('request_started', None)
+  if started is not None:
+    http_request_seconds.observe(time.perf_counter() - started, metrics_route(), request.method, str(response.status_code))
+  observe_response_size(response, 'before_compression')
+  return response
+
+def observe_compressed_response(response):
+  observe_response_size(response, 'after_compression')
+  return response
+
+@routes.route('/metrics')
+def metrics():
+  """Metrics format teks Prometheus (butuh Bearer METRICS_TOKEN kalau diset)"""
+  if METRICS_TOKEN:
+    provided = request.headers.get('Authorization', '')
+    if not secrets.compare_digest(provided, f'Bearer {METRICS_TOKEN}'):
+      return Response('Unauthorized\n', status=401, mimetype='text/plain')
+  return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@routes.after_app_request
 def set_security_headers(response):
   """Add security headers to all responses"""
   response.headers['X-Content-Type-Options'] = 'nosniff'
   response.headers['X-Frame-Options'] = 'DENY'
   response.headers['X-XSS-Protection'] = '1; mode=block'
   response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-  if request.path.startswith("/static/"): response.headers["Cache-Control"] = "public, max-age=2592000, immutable"
+  if request.path.startswith("/static/dist/"): response.headers["Cache-Control"] = "public, max-age=2592000, immutable"
+  elif request.path.startswith("/static/"): response.headers["Cache-Control"] = "public, max-age=3600"
+  return response
+
+@routes.route('/static/dist/<path:filename>')
+def static_dist(filename):
+  """Serve asset hasil build, pilih varian pre-compressed sesuai Accept-Encoding"""
+  mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+  
+  served, encoding = filename, None
+  for algorithm, suffix in (('br', '.br'), ('gzip', '.gz')):
+    variant = safe_join(STATIC_DIST_DIR, filename + suffix)
+    if request.accept_encodings[algorithm] and variant and os.path.isfile(variant):
+      served, encoding = filename + suffix, algorithm
+      break
+  
+  response = send_from_directory(STATIC_DIST_DIR, served, mimetype=mimetype)
+  if encoding:
+    # Header ini juga membuat Flask-Compress melewati response ini
+    response.headers['Content-Encoding'] = encoding
+  response.headers['Vary'] = 'Accept-Encoding'
   return response
 
-@app.route('/')
+@routes.route('/')
 def home():
   """Halaman utama - menampilkan daftar akun atau form login"""
-
-  extended_scopes = [
-    # Basic User Info
-    'public_profile',
-    'email',
-    'user_birthday',
-    'user_hometown',
-    'user_location',
-    'user_friends',
-    'user_age_range',
-    'user_gender',
-    'user_link',
-    
-    # User Posts & Feed
-    'user_posts',                    # Baca posts yang dibuat user
-    'user_photos',                   # Akses foto user
-    'user_videos',                   # Akses video user
-    
-    # Publishing to User Timeline
-    'publish_to_groups',             # Post ke grup (jika member)
-    'publish_video',                 # Upload video ke timeline
-    
-    # Pages Management (PENTING untuk manage pages)
-    'pages_show_list',               # Lihat daftar pages yang di-manage
-    'pages_read_engagement',         # Baca engagement metrics (likes, comments, etc)
-    'pages_manage_posts',            # Buat, edit, hapus posts di page
-    'pages_manage_engagement',       # Balas komentar, moderate
-    'pages_read_user_content',       # Baca konten yang di-tag/mention page
-    'pages_manage_metadata',         # Edit info page
-    'pages_manage_ads',              # Manage ads (optional)
-    'pages_manage_cta',              # Manage call-to-action buttons
-    'pages_messaging',               # Send messages dari page (Messenger)
-    
-    # Instagram (jika page terhubung dengan Instagram)
-    'instagram_basic',               # Basic Instagram access
-    'instagram_content_publish',     # Post ke Instagram
-    'instagram_manage_comments',     # Manage Instagram comments
-    'instagram_manage_insights',     # Lihat Instagram insights
-    
-    # Business/Advanced
-    'business_management',           # Manage business assets
-    'catalog_management',            # Manage product catalogs
-    'leads_retrieval',               # Ambil leads dari ads
-    'read_insights',                 # Baca insights/analytics
-    'ads_management',                # Manage ads (optional)
-  ]
-  scope_string = ','.join(extended_scopes)
-  
   # Generate and store state token
   state_token = generate_state_token()
   session['oauth_state'] = state_token
   session.permanent = True
   
-  auth_url = (
-    f"https://www.facebook.com/v18.0/dialog/oauth?"
-    f"client_id={FB_APP_ID}&"
-    f"redirect_uri={REDIRECT_URI}&"
-    f"scope={scope_string}&"
-    f"response_type=code&"
-    f"state={state_token}&"
-    f"auth_type=rerequest"
-  )
-  
-  return render_template('home.html', auth_url=auth_url)
-
-@app.route('/data-deletion')
-def data_deletion():
-  """Data Deletion Instructions Page"""
-  return render_template('data-deletion.html')
-
-@app.route('/privacy')
-def privacy():
-  """Privacy Policy Page"""
-  return render_template('privacy.html')
-
-@app.route('/terms')
-def terms():
-  """Terms of Service Page"""
-  return render_template('terms.html')
-
-@app.route('/contact')
-def contact():
-  """Contact Page"""
-  return render_template('contact.html')
-
-@app.route('/view/<user_id>')
-def view_account(user_id):
-  """View account details dan validasi dengan Facebook API"""
-  # Sanitize user_id - only allow digits
-  if not user_id.isdigit():
-    return render_template('errors/400.html'), 400
-  
-  return render_template('view_account.html', user_id=user_id)
-
-@app.route('/callback')
-def callback():
-  """Handle OAuth callback dari Facebook"""
-  
-  # Check for errors first
-  error = request.args.get('error')
-  if error:
-    error_description = request.args.get('error_description', 'Unknown error')
-    error_reason = request.args.get('error_reason', '')
-    
-    # Clear session
-    session.pop('oauth_state', None)
-    
-    return render_template('result_display.html',
-                         error=error,
-                         error_description=error_description,
-                         error_reason=error_reason,
-                         error_message=error_description,
-                         is_active=False,
-                         user_info=None,
-                         access_token=None,
-                         token_type=None,
-                         expires_in=None,
-                         expiry_date=None,
-                         expiry_timestamp=None,
-                         all_permissions=None,
-                         pages=None,
-                         profile_picture=None)
-  
-  # Verify state token (CSRF protection)
-  state = request.args.get('state')
-  if not verify_state_token(state):
-    app.logger.warning(f'Invalid state token: {state}')
-    session.pop('oauth_state', None)
-    return render_template('result_display.html',
-                         error="Security Error",
-                         error_description="Invalid state parameter. Possible CSRF attack detected.",
-                         error_reason="invalid_state",
-                         error_message="Invalid state parameter. Please try again.",
-                         is_active=False,
-                         user_info=None,
-                         access_token=None,
-                         token_type=None,
-                         expires_in=None,
-                         expiry_date=None,
-                         expiry_timestamp=None,
-                         all_permissions=None,
-                         pages=None,
-                         profile_picture=None)
-  
-  # Clear state from session after verification
-  session.pop('oauth_state', None)
-  
-  # Get authorization code
-  code = request.args.get('code')
-  if not code:
-    return render_template('result_display.html',
-                         error="Missing Code",
-                         error_description="Authorization code tidak ditemukan di URL",
-                         error_reason="missing_code",
-                         error_message="Authorization code tidak ditemukan di URL",
-                         is_active=False,
-                         user_info=None,
-                         access_token=None,
-                         token_type=None,
-                         expires_in=None,
-                         expiry_date=None,
-                         expiry_timestamp=None,
-                         all_permissions=None,
-                         pages=None,
-                         profile_picture=None)
+  auth_url = f'{OAUTH_DIALOG_URL_PREFIX}{state_token}&auth_type=rerequest'
   
-  token_url = 'https://graph.facebook.com/v18.0/oauth/access_token'
-  token_params = {
-    'client_id': FB_APP_ID,
-    'client_secret': FB_APP_SECRET,
-    'redirect_uri': REDIRECT_URI,
-    'code': code
-  }
+  return render_template('home.html', auth_url=auth_url)
+
+@routes.route('/data-deletion')
+def data_deletion():
+  """Data Deletion Instructions Page"""
+  return serve_static_page('data-deletion.html')
+
+@routes.route('/privacy')
+def privacy():
+  """Privacy Policy Page"""
+  return serve_static_page('privacy.html')
+
+@routes.route('/terms')
+def terms():
+  """Terms of Service Page"""
+  return serve_static_page('terms.html')
+
+@routes.route('/contact')
+def contact():
+  """Contact Page"""
+  return serve_static_page('contact.html')
+
+@routes.route('/view/<user_id>')
+def view_account(user_id):
+  """View account details dan validasi dengan Facebook API"""
+  # Sanitize user_id - only allow digits
+  if not user_id.isdigit():
+    return render_template('errors/400.html'), 400
+  
+  return render_template('view_account.html', user_id=user_id)
+
+@routes.route('/callback')
+def callback():
+  """Handle OAuth callback dari Facebook"""
+  error_response, code = check_callback_request()
+  if error_response:
+    return error_response
   
   try:
-    token_response = requests.get(token_url, params=token_params, timeout=15)
+    # OAuth code hanya bisa dipakai sekali: tanpa retry, hedge maupun single-flight
+    token_response = graph.get('oauth/access_token', params=code_exchange_params(code), idempotent=False)
     token_data = token_response.json()
     
     if 'error' in token_data:
-      return render_template('result_display.html',
-                           error=token_data['error'].get('type', 'Error'),
-                           error_description=token_data['error'].get('message', 'Unknown error'),
-                           error_reason='token_error',
-                           error_message=token_data['error'].get('message', 'Unknown error'),
-                           is_active=False,
-                           user_info=None,
-                           access_token=None,
-                           token_type=None,
-                           expires_in=None,
-                           expiry_date=None,
-                           expiry_timestamp=None,
-                           all_permissions=None,
-                           pages=None,
-                           profile_picture=None)
-    
-    access_token = token_data.get('access_token')
-    token_type = token_data.get('token_type', 'bearer')
-    expires_in = token_data.get('expires_in', 0)
-    
-    # Hitung timestamp kadaluarsa
-    expiry_datetime = datetime.now() + timedelta(seconds=expires_in)
-    expiry_date = expiry_datetime.strftime("%d %B %Y, %H:%M:%S WIB")
-    expiry_timestamp = int(expiry_datetime.timestamp())
-    
-    # Get user info dengan foto profil
-    user_info_url = f'https://graph.facebook.com/v18.0/me?fields=id,name,email,picture.type(large)&access_token={access_token}'
-    user_response = requests.get(user_info_url, timeout=15)
-    user_info = user_response.json()
-    
-    if 'error' in user_info:
-      return render_template('result_display.html',
-                           error="API Error",
-                           error_description=user_info['error'].get('message', 'Failed to get user info'),
-                           error_reason='api_error',
-                           error_message=user_info['error'].get('message', 'Failed to get user info'),
-                           is_active=False,
-                           user_info=None,
-                           access_token=None,
-                           token_type=None,
-                           expires_in=None,
-                           expiry_date=None,
-                           expiry_timestamp=None,
-                           all_permissions=None,
-                           pages=None,
-                           profile_picture=None)
-    
-    # Ambil URL foto profil
-    profile_picture = user_info.get('picture', {}).get('data', {}).get('url', '')
-    
-    permissions_url = f'https://graph.facebook.com/v18.0/me/permissions?access_token={access_token}'
-    permissions_response = requests.get(permissions_url, timeout=15)
-    permissions_data = permissions_response.json()
-    
-    all_permissions = permissions_data.get('data', [])
+      return render_token_error(token_data)
     
-    pages = []
-    granted_perms = [p['permission'] for p in all_permissions if p['status'] == 'granted']
-    if any(perm in granted_perms for perm in ['pages_show_list', 'pages_read_engagement', 'pages_manage_posts']):
-      try:
-        pages_url = f'https://graph.facebook.com/v18.0/me/accounts?fields=id,name,access_token,category&access_token={access_token}'
-        pages_response = requests.get(pages_url, timeout=15)
-        pages_data = pages_response.json()
-        pages = pages_data.get('data', [])
-      except:
-        pages = []
-    
-    return render_template('result_display.html',
-                         access_token=access_token,
-                         token_type=token_type,
-                         expires_in=expires_in,
-                         expiry_date=expiry_date,
-                         expiry_timestamp=expiry_timestamp,
-                         user_info=user_info,
-                         all_permissions=all_permissions,
-                         pages=pages,
-                         is_active=True,
-                         profile_picture=profile_picture,
-                         error=None,
-                         error_description=None,
-                         error_reason=None,
-                         error_message=None)
+    # Get user info dengan foto profil, permissions dan pages (satu batch request)
+    user_info, all_permissions, pages = fetch_login_data(token_data.get('access_token'))
+    return render_callback_result(token_data, user_info, all_permissions, pages)
   
+  except GraphRateLimited as e:
+    return render_callback_error(
+      "Rate Limited",
+      f"Rate limit Facebook API tercapai, coba lagi dalam {e.retry_after} detik",
+      'rate_limited'
+    )
+  except GraphCircuitOpen as e:
+    return render_callback_error(
+      "Service Unavailable",
+      f"Facebook API sedang bermasalah, coba lagi dalam {e.retry_after} detik",
+      'circuit_open'
+    )
   except requests.exceptions.Timeout:
-    app.logger.error('Request timeout in callback')
-    return render_template('result_display.html',
-                         error="Timeout",
-                         error_description="Request timeout - Facebook API tidak merespons",
-                         error_reason='timeout',
-                         error_message="Request timeout",
-                         is_active=False,
-                         user_info=None,
-                         access_token=None,
-                         token_type=None,
-                         expires_in=None,
-                         expiry_date=None,
-                         expiry_timestamp=None,
-                         all_permissions=None,
-                         pages=None,
-                         profile_picture=None)
+    logger.error('Request timeout in callback')
+    return render_callback_error(
+      "Timeout",
+      "Request timeout - Facebook API tidak merespons",
+      'timeout',
+      "Request timeout"
+    )
   except Exception as e:
-    app.logger.error(f'Exception in callback: {str(e)}')
-    return render_template('result_display.html',
-                         error="Exception",
-                         error_description=str(e),
-                         error_reason='exception',
-                         error_message=str(e),
-                         is_active=False,
-                         user_info=None,
-                         access_token=None,
-                         token_type=None,
-                         expires_in=None,
-                         expiry_date=None,
-                         expiry_timestamp=None,
-                         all_permissions=None,
-                         pages=None,
-                         profile_picture=None)
+    logger.error(f'Exception in callback: {str(e)}')
+    return render_callback_error("Exception", str(e), 'exception')
 
-@app.route('/api/validate-token', methods=['POST'])
+@routes.route('/api/validate-token', methods=['POST'])
 def validate_token():
   """API endpoint untuk validasi token dan exchange ke long-lived token"""
   try:
@@ -400,6 +3812,11 @@ def validate_token():
       }), 400
     
     data = request.get_json()
+    if not isinstance(data, dict):
+      return jsonify({
+        'success': False,
+        'error': 'Body harus berupa JSON object'
+      }), 400
     access_token = data.get('access_token')
     
     if not access_token:
@@ -415,131 +3832,158 @@ def validate_token():
         'error': 'Invalid access token format'
       }), 400
     
-    # 1. Validate token with Facebook API
-    user_info_url = f'https://graph.facebook.com/v18.0/me?fields=id,name,email,picture.type(large)&access_token={access_token}'
+    # pages=false: pages diambil client sendiri secara bertahap dari /api/pages
+    response_data, status_code = validate_with_registry(
+      access_token,
+      refresh=bool(data.get('refresh')),
+      include_pages=data.get('pages', True) is not False
+    )
+    response = jsonify(response_data)
+    if 'retry_after' in response_data:
+      response.headers['Retry-After'] = str(response_data['retry_after'])
+    return response, status_code
     
-    try:
-      user_response = requests.get(user_info_url, timeout=15)
-      user_data = user_response.json()
-    except requests.exceptions.Timeout:
-      return jsonify({
-        'success': False,
-        'error': 'Request timeout - Facebook API tidak merespons'
-      }), 408
-    except requests.exceptions.RequestException as e:
+  except Exception as e:
+    logger.error(f'Exception in validate_token: {str(e)}')
+    return jsonify({
+      'success': False,
+      'error': f'Server error: {str(e)}'
+    }), 500
+
+@routes.route('/api/validate-tokens', methods=['POST'])
+def validate_tokens():
+  """API endpoint untuk validasi banyak token sekaligus
+  
+  Hasil per token dikirim sebagai NDJSON segera setelah token tersebut selesai
+  divalidasi (urutan selesai, bukan urutan input). Tiap baris berisi 'index'
+  token di input, 'status' dan payload yang sama seperti /api/validate-token.
+  Dengan mode 'debug', token hanya dicek lewat /debug_token (valid, expired,
+  scopes, user id) dalam Graph batch request, jauh lebih ringan untuk akun
+  dalam jumlah besar.
+  """
+  if not request.is_json:
+    return jsonify({
+      'success': False,
+      'error': 'Content-Type must be application/json'
+    }), 400
+  
+  data = request.get_json()
+  if not isinstance(data, dict):
+    return jsonify({
+      'success': False,
+      'error': 'Body harus berupa JSON object'
+    }), 400
+  access_tokens = data.get('access_tokens')
+  mode = data.get('mode', 'full')
+  
+  if not isinstance(access_tokens, list) or not access_tokens:
+    return jsonify({
+      'success': False,
+      'error': 'access_tokens harus berupa list yang tidak kosong'
+    }), 400
+  
+  if mode not in ('full', 'debug'):
+    return jsonify({
+      'success': False,
+      'error': "mode harus 'full' atau 'debug'"
+    }), 400
+  
+  max_tokens = DEBUG_TOKEN_MAX if mode == 'debug' else BULK_VALIDATE_MAX
+  if len(access_tokens) > max_tokens:
+    return jsonify({
+      'success': False,
+      'error': f'Maksimal {max_tokens} token per request'
+    }), 400
+  
+  if mode == 'debug':
+    if not FB_APP_ID or not FB_APP_SECRET:
       return jsonify({
         'success': False,
-        'error': f'Gagal menghubungi Facebook API: {str(e)}'
+        'error': 'FB_APP_ID dan FB_APP_SECRET harus diset untuk mode debug'
       }), 500
     
-    if 'error' in user_data:
-      error_message = user_data['error'].get('message', 'Unknown error')
-      
-      # Simplify common error messages
-      if 'Malformed access token' in error_message:
-        error_message = 'Invalid OAuth access token - Cannot parse access token'
-      elif 'expired' in error_message.lower():
-        error_message = 'Access token has expired'
-      elif 'invalid' in error_message.lower():
-        error_message = 'Invalid access token'
-      
-      return jsonify({
-        'success': False,
-        'error': error_message,
-        'error_code': user_data['error'].get('code'),
-        'error_type': user_data['error'].get('type')
-      })
-    
-    # 2. Exchange for long-lived token
-    token_exchange_url = 'https://graph.facebook.com/v18.0/oauth/access_token'
-    token_params = {
-      'grant_type': 'fb_exchange_token',
-      'client_id': FB_APP_ID,
-      'client_secret': FB_APP_SECRET,
-      'fb_exchange_token': access_token
-    }
+    def generate_debug():
+      for index, payload, status_code in iter_debug_tokens(access_tokens):
+        line = {'index': index, 'status': status_code}
+        line.update(payload)
+        yield json.dumps(line) + '\n'
     
-    new_token_data = None
+    return Response(generate_debug(), mimetype='application/x-ndjson')
+  
+  def validate_one(access_token):
+    if not isinstance(access_token, str) or len(access_token) < 50:
+      return {'success': False, 'error': 'Invalid access token format'}, 400
     try:
-      token_response = requests.get(token_exchange_url, params=token_params, timeout=15)
-      new_token_data = token_response.json()
-      
-      if 'error' in new_token_data:
-        app.logger.warning(f'Token exchange failed: {new_token_data["error"]}')
-        new_token_data = None
+      return validate_with_registry(access_token)
     except Exception as e:
-      app.logger.warning(f'Token exchange error: {str(e)}')
-      new_token_data = None
-    
-    # 3. Get permissions
-    permissions_url = f'https://graph.facebook.com/v18.0/me/permissions?access_token={access_token}'
-    try:
-      permissions_response = requests.get(permissions_url, timeout=15)
-      permissions_data = permissions_response.json()
-      all_permissions = permissions_data.get('data', [])
-    except:
-      all_permissions = []
-    
-    # 4. Get pages if has permission
-    pages = []
-    granted_perms = [p['permission'] for p in all_permissions if p['status'] == 'granted']
-    if any(perm in granted_perms for perm in ['pages_show_list', 'pages_read_engagement', 'pages_manage_posts']):
-      try:
-        token_to_use = new_token_data.get('access_token') if new_token_data else access_token
-        pages_url = f'https://graph.facebook.com/v18.0/me/accounts?fields=id,name,access_token,category,perms&access_token={token_to_use}'
-        pages_response = requests.get(pages_url, timeout=15)
-        pages_data = pages_response.json()
-        
-        raw_pages = pages_data.get('data', [])
-        for page in raw_pages:
-          perms_list = page.get('perms', [])
-          page['permissions'] = [{'permission': perm, 'status': 'granted'} for perm in perms_list]
-        
-        pages = raw_pages
-      except:
-        pages = []
-    
-    # Build response
-    response_data = {
-      'success': True,
-      'data': {
-        'id': user_data.get('id'),
-        'name': user_data.get('name'),
-        'email': user_data.get('email', ''),
-        'profile_picture': user_data.get('picture', {}).get('data', {}).get('url', ''),
-        'permissions': all_permissions,
-        'pages': pages
-      }
-    }
-    
-    # Add new token data if exchange was successful
-    if new_token_data and 'access_token' in new_token_data:
-      new_access_token = new_token_data.get('access_token')
-      new_token_type = new_token_data.get('token_type', 'bearer')
-      new_expires_in = new_token_data.get('expires_in', 0)
-      
-      expiry_datetime = datetime.now() + timedelta(seconds=new_expires_in)
-      expiry_date = expiry_datetime.strftime("%d %B %Y, %H:%M:%S WIB")
-      expiry_timestamp = int(expiry_datetime.timestamp())
-      
-      response_data['data']['new_token'] = {
-        'access_token': new_access_token,
-        'token_type': new_token_type,
-        'expires_in': new_expires_in,
-        'expiry_date': expiry_date,
-        'expiry_timestamp': expiry_timestamp
+      logger.error(f'Exception in validate_tokens: {str(e)}')
+      return {'success': False, 'error': f'Server error: {str(e)}'}, 500
+  
+  def generate():
+    # Pool terpisah dari graph_executor supaya tidak deadlock saat
+    # introspect_token mengirim Graph call ke graph_executor
+    workers = min(BULK_VALIDATE_CONCURRENCY, len(access_tokens))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-validate') as executor:
+      futures = {
+        executor.submit(validate_one, access_token): index
+        for index, access_token in enumerate(access_tokens)
       }
-    
-    return jsonify(response_data)
-    
-  except Exception as e:
-    app.logger.error(f'Exception in validate_token: {str(e)}')
+      for future in as_completed(futures):
+        payload, status_code = future.result()
+        line = {'index': futures[future], 'status': status_code}
+        line.update(payload)
+        yield json.dumps(line) + '\n'
+  
+  return Response(generate(), mimetype='application/x-ndjson')
+
+@routes.route('/api/pages', methods=['POST'])
+def list_pages():
+  """API endpoint untuk daftar lengkap pages sebagai stream NDJSON
+  
+  Cursor /me/accounts diikuti di server dan setiap page dikirim segera
+  (satu page per baris), jadi akun yang mengelola ratusan pages tidak
+  perlu menunggu seluruh daftar selesai diambil.
+  """
+  if not request.is_json:
     return jsonify({
       'success': False,
-      'error': f'Server error: {str(e)}'
-    }), 500
+      'error': 'Content-Type must be application/json'
+    }), 400
+  
+  data = request.get_json()
+  if not isinstance(data, dict):
+    return jsonify({
+      'success': False,
+      'error': 'Body harus berupa JSON object'
+    }), 400
+  access_token = data.get('access_token')
+  
+  if not isinstance(access_token, str) or len(access_token) < 50:
+    return jsonify({
+      'success': False,
+      'error': 'Invalid access token format'
+    }), 400
+  
+  page_size = data.get('page_size', PAGES_PAGE_SIZE)
+  if isinstance(page_size, bool) or not isinstance(page_size, int) or not 1 <= page_size <= 100:
+    return jsonify({
+      'success': False,
+      'error': 'page_size harus antara 1 dan 100'
+    }), 400
+  
+  def generate():
+    try:
+      for batch in iter_pages(access_token, page_size=page_size):
+        for page in batch:
+          yield json.dumps(page) + '\n'
+    except GraphAPIError as e:
+      yield json.dumps({'error': e.error}) + '\n'
+    except requests.exceptions.RequestException as e:
+      yield json.dumps({'error': {'message': str(e)}}) + '\n'
+  
+  return Response(generate(), mimetype='application/x-ndjson')
 
-@app.route('/api/graph-request', methods=['POST'])
+@routes.route('/api/graph-request', methods=['POST'])
 def graph_request():
   """API endpoint untuk Graph API requests"""
   try:
@@ -550,68 +3994,67 @@ def graph_request():
         'message': 'Content-Type must be application/json'
       }), 400
     
-    data = request.get_json()
-    
-    method = data.get('method', 'GET')
-    path = data.get('path', '/me')
-    access_token = data.get('access_token')
-    params = data.get('params', {})
-    body = data.get('body', {})
-    
-    # Validate inputs
-    if not access_token:
-      return jsonify({
-        'error': 'Missing access token',
-        'message': 'Access token is required'
-      }), 400
-    
-    # Validate token format
-    if not isinstance(access_token, str) or len(access_token) < 50:
-      return jsonify({
-        'error': 'Invalid access token',
-        'message': 'Access token format is invalid'
-      }), 400
-    
-    # Validate method
-    allowed_methods = ['GET', 'POST', 'DELETE']
-    if method not in allowed_methods:
-      return jsonify({
-        'error': 'Invalid method',
-        'message': f'Method must be one of: {", ".join(allowed_methods)}'
-      }), 400
-    
-    # Validate path
-    if not path or not isinstance(path, str):
-      return jsonify({
-        'error': 'Invalid path',
-        'message': 'Path must be a non-empty string'
-      }), 400
-    
-    # Clean path
-    if path.startswith('/'):
-      path = path[1:]
-    
-    # Prevent path traversal
-    if '..' in path or path.startswith('/'):
-      return jsonify({
-        'error': 'Invalid path',
-        'message': 'Path traversal not allowed'
-      }), 400
-    
-    # Build URL
-    base_url = f'https://graph.facebook.com/v18.0/{path}'
-    
-    # Add access token to params
-    params['access_token'] = access_token
+    error_response, spec = parse_graph_request(request.get_json())
+    if error_response:
+      return error_response
     
     # Make request based on method
     try:
-      if method == 'GET':
-        response = requests.get(base_url, params=params, timeout=20)
-      elif method == 'POST':
-        response = requests.post(base_url, params=params, json=body, timeout=20)
-      elif method == 'DELETE':
-        response = requests.delete(base_url, params=params, timeout=20)
+      # Mode paginate: halaman pertama diambil dulu (supaya error Graph tetap
+      # dikembalikan dengan status aslinya), sisanya di-stream sebagai NDJSON
+      if spec['paginate']:
+        status_code, response_data = graph.get_shared(
+          spec['path'],
+          params=spec['params'],
+          timeout=GRAPH_PROXY_TIMEOUT,
+          operation='proxy'
+        )
+        if status_code != 200 or not isinstance(response_data, dict) or 'error' in response_data:
+          return jsonify(response_data), status_code
+        return Response(paginate_graph_items(
+          response_data,
+          spec['paginate']['max_items'],
+          spec['paginate']['max_pages'],
+          timeout=GRAPH_PROXY_TIMEOUT
+        ), mimetype='application/x-ndjson')
+      
+      # GET biasa lewat cache (kalau path-nya dikonfigurasi) dan single-flight;
+      # POST/DELETE dan stream tidak pernah digabung maupun di-cache
+      if spec['method'] == 'GET' and not spec['stream']:
+        ttl = graph_cache_ttl(spec['path'])
+        cache_key = graph_cache_key(spec['path'], spec['params']) if ttl else None
+        if cache_key and not spec['refresh']:
+          cached = graph_response_cache.get(cache_key)
+          if cached is not None:
+            return proxy_response(cached, 200, 'HIT')
+        
+        status_code, response_data = graph.get_shared(
+          spec['path'],
+          params=spec['params'],
+          timeout=GRAPH_PROXY_TIMEOUT,
+          operation='proxy'
+        )
+        if cache_key:
+          store_graph_response(cache_key, status_code, response_data, ttl)
+        return proxy_response(response_data, status_code, 'MISS')
+      
+      try:
+        response = graph.request(
+          spec['method'],
+          spec['path'],
+          params=spec['params'],
+          json=spec['body'],
+          timeout=GRAPH_PROXY_TIMEOUT,
+          stream=spec['stream'],
+          operation='proxy'
+        )
+      finally:
+        if spec['method'] != 'GET':
+          invalidate_graph_object(spec['path'], spec['params'])
+    except GraphRateLimited as e:
+      return rate_limited_response(e)
+    except GraphCircuitOpen as e:
+      return circuit_open_response(e)
     except requests.exceptions.Timeout:
       return jsonify({
         'error': 'Request Timeout',
@@ -623,20 +4066,263 @@ def graph_request():
         'message': str(e)
       }), 500
     
+    # Passthrough mode: body upstream diteruskan apa adanya per chunk
+    # (kompresi tetap diterapkan oleh Flask-Compress)
+    if spec['stream']:
+      return Response(
+        stream_upstream(response),
+        status=response.status_code,
+        content_type=response.headers.get('Content-Type', 'application/json')
+      )
+    
     # Return response
-    try:
-      response_data = response.json()
-    except:
-      response_data = {'message': response.text}
+    status_code, response_data = response_payload(response)
+    return jsonify(response_data), status_code
+    
+  except Exception as e:
+    logger.error(f'Exception in graph_request: {str(e)}')
+    return jsonify({
+      'error': 'Server Error',
+      'message': str(e)
+    }), 500
+
+@routes.route('/api/graph-batch', methods=['POST'])
+def graph_batch():
+  """API endpoint untuk banyak Graph API requests sekaligus
+  
+  Operasi dibagi ke Graph batch request berisi maksimal GRAPH_BATCH_SIZE item
+  (operasi yang saling bergantung tetap dalam satu batch) yang dikirim
+  paralel. Hasil per operasi dikembalikan sesuai urutan input.
+  """
+  try:
+    if not request.is_json:
+      return jsonify({
+        'error': 'Invalid Content-Type',
+        'message': 'Content-Type must be application/json'
+      }), 400
     
-    return jsonify(response_data), response.status_code
+    error_response, spec = parse_graph_batch(request.get_json())
+    if error_response:
+      return error_response
+    
+    results = run_graph_batch(spec['access_token'], spec['items'], spec['chunks'])
+    return jsonify({'results': results, 'batches': len(spec['chunks'])})
     
   except Exception as e:
-    app.logger.error(f'Exception in graph_request: {str(e)}')
+    logger.error(f'Exception in graph_batch: {str(e)}')
     return jsonify({
       'error': 'Server Error',
       'message': str(e)
     }), 500
 
+@routes.route('/api/export', methods=['POST'])
+def export_accounts():
+  """API endpoint untuk export akun sebagai file JSON, NDJSON, CSV atau TXT
+  
+  Body JSON, atau field form 'payload' berisi JSON supaya browser bisa
+  menyimpan download langsung ke disk, berisi 'accounts' (format
+  localStorage), 'format' dan opsional 'refresh': true untuk mengambil ulang
+  permissions dan pages tiap akun (maksimal EXPORT_CONCURRENCY akun
+  bersamaan). File dikirim per akun, tidak pernah dibangun utuh di memori.
+  """
+  # Batas default form Flask (500 KB) terlalu kecil untuk payload export besar
+  request.max_form_memory_size = EXPORT_MAX_FORM_BYTES
+  try:
+    data = request.get_json() if request.is_json else json.loads(request.form.get('payload', ''))
+  except ValueError:
+    data = None
+  if not isinstance(data, dict):
+    return jsonify({
+      'success': False,
+      'error': 'Body harus berupa JSON atau field form payload berisi JSON'
+    }), 400
+  
+  accounts = data.get('accounts')
+  export_format = data.get('format', 'json')
+  download_token = request.form.get('download_token', '')
+  
+  if not isinstance(accounts, list) or not all(isinstance(account, dict) for account in accounts):
+    return jsonify({
+      'success': False,
+      'error': 'accounts harus berupa list akun'
+    }), 400
+  
+  if len(accounts) > EXPORT_MAX_ACCOUNTS:
+    return jsonify({
+      'success': False,
+      'error': f'Maksimal {EXPORT_MAX_ACCOUNTS} akun per export'
+    }), 400
+  
+  if export_format not in EXPORT_FORMATS:
+    return jsonify({
+      'success': False,
+      'error': f"format harus salah satu dari: {', '.join(EXPORT_FORMATS)}"
+    }), 400
+  
+  if data.get('refresh') and accounts:
+    # Pool terpisah dari graph_executor, sama seperti /api/validate-tokens
+    accounts_iter = iter_bounded(refresh_export_account, accounts, min(EXPORT_CONCURRENCY, len(accounts)), 'export-refresh')
+  else:
+    accounts_iter = iter(accounts)
+  
+  mimetype, extension = EXPORT_FORMATS[export_format]
+  filename = f"FacebookOAuth_{datetime.now().strftime('%d-%m-%Y')}.{extension}"
+  response = Response(iter_export(accounts_iter, export_format), mimetype=mimetype)
+  response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+  response.headers['Cache-Control'] = 'no-store'
+  if EXPORT_DOWNLOAD_TOKEN.fullmatch(download_token):
+    # Tanda untuk export.js bahwa download sudah dimulai (dibaca lewat JS)
+    response.set_cookie('export_download', download_token, max_age=60, samesite='Strict')
+  return response
+
+@routes.route('/api/token-events', methods=['POST'])
+def token_events():
+  """API endpoint server-sent events untuk status token
+  
+  Body JSON {'tokens': [{'id', 'access_token'}, ...]}. Response stream
+  text/event-stream (dibaca client lewat fetch) berisi event 'status',
+  'expired' dan 'revoked' per token, plus komentar keepalive. Stream
+  ditutup setelah TOKEN_EVENTS_MAX_AGE atau kalau semua token sudah tidak
+  aktif; client cukup membuka ulang untuk token yang masih aktif.
+  
+  Di WSGI endpoint ini nonaktif (404) kecuali TOKEN_EVENTS_WSGI=1; halaman
+  memakai countdown expiry di browser sebagai gantinya.
+  """
+  if not current_app.config['TOKEN_EVENTS']:
+    return jsonify({
+      'success': False,
+      'error': 'Token events hanya aktif lewat asgi.py atau dengan TOKEN_EVENTS_WSGI=1'
+    }), 404
+  
+  if not request.is_json:
+    return jsonify({
+      'success': False,
+      'error': 'Content-Type must be application/json'
+    }), 400
+  
+  error_response, tokens = parse_token_events(request.get_json())
+  if error_response:
+    return error_response
+  
+  watch = TokenWatch(tokens, TOKEN_EVENTS_RECHECK, TOKEN_EVENTS_KEEPALIVE, TOKEN_EVENTS_MAX_AGE)
+  
+  def generate():
+    while not watch.done:
+      yield watch.render(watch.poll())
+      time.sleep(watch.wait_time())
+  
+  return token_events_response(generate())
+
+@routes.route('/deauthorize', methods=['POST'])
+def deauthorize():
+  """Deauthorize callback Facebook (user menghapus app)
+  
+  Body form signed_request berisi user_id. Cache dan state token registry
+  user dibuang di background; token registry menandai user sebagai revoked.
+  """
+  payload = parse_signed_request(request.form.get('signed_request'))
+  if payload is None or not payload.get('user_id'):
+    webhook_events.inc('deauthorize', 'invalid')
+    return jsonify({
+      'success': False,
+      'error': 'Invalid signed_request'
+    }), 400
+  
+  return queue_user_invalidations('deauthorize', [payload['user_id']], revoked=True)
+
+@routes.route('/webhooks/permissions', methods=['GET', 'POST'])
+def permissions_webhook():
+  """Webhook Facebook untuk object 'permissions'
+  
+  GET adalah verifikasi subscription (hub.verify_token harus sama dengan
+  FB_WEBHOOK_VERIFY_TOKEN). POST berisi perubahan permissions, ditandatangani
+  lewat header X-Hub-Signature-256; cache user terkait dibuang di background
+  dan state token registry-nya dicek ulang.
+  """
+  if request.method == 'GET':
+    verify_token = request.args.get('hub.verify_token', '')
+    if (
+      FB_WEBHOOK_VERIFY_TOKEN and request.args.get('hub.mode') == 'subscribe'
+      and secrets.compare_digest(verify_token.encode('utf-8'), FB_WEBHOOK_VERIFY_TOKEN.encode('utf-8'))
+    ):
+      return Response(request.args.get('hub.challenge', ''), mimetype='text/plain')
+    return Response('Forbidden\n', status=403, mimetype='text/plain')
+  
+  body = request.get_data()
+  if not verify_webhook_signature(body, request.headers.get('X-Hub-Signature-256', '')):
+    webhook_events.inc('permissions', 'invalid')
+    return jsonify({
+      'success': False,
+      'error': 'Invalid signature'
+    }), 403
+  
+  try:
+    user_ids = permissions_webhook_users(json.loads(body))
+  except ValueError:
+    user_ids = None
+  if user_ids is None:
+    webhook_events.inc('permissions', 'invalid')
+    return jsonify({
+      'success': False,
+      'error': 'Invalid webhook payload'
+    }), 400
+  
+  return queue_user_invalidations('permissions', user_ids, revoked=False)
+
+# ==================== APP SETUP ====================
+
+def init_compression(app):
+  """Pasang Flask-Compress dengan urutan after_request yang sama seperti hook lain
+  
+  after_request dijalankan terbalik dari urutan daftar; Compress mendaftar di
+  akhir (jalan paling awal), jadi dipindah ke belakang observe_compressed_response
+  supaya metrics ukuran sebelum kompresi tetap dicatat sebelum Compress.
+  """
+  from flask_compress import Compress
+  compress = Compress(app)
+  after_request_funcs = app.after_request_funcs[None]
+  after_request_funcs.insert(after_request_funcs.index(observe_compressed_response) + 1, after_request_funcs.pop())
+  return compress
+
+def create_app(config=None):
+  """App factory: Flask app, Graph client dan Flask-Compress dari config
+  
+  config (dict) menimpa default_config() sebelum apa pun dibangun. Session
+  HTTP Graph client baru dibuat saat call pertama. Fungsi di module ini
+  memakai `graph` global, jadi app terakhir yang dibuat menentukan Graph
+  client proses ini. State backend, cache dan token registry tetap dibangun
+  saat import dari environment variables.
+  """
+  global graph
+  app = Flask(__name__)
+  app.config.update(default_config())
+  if config:
+    app.config.update(config)
+  # Handler default Flask dipasang ke logger module ini (namanya sama)
+  app.logger
+  
+  graph = GraphClient(
+    app.config['GRAPH_API_URL'],
+    pool_size=app.config['GRAPH_POOL_SIZE'],
+    connect_timeout=app.config['GRAPH_CONNECT_TIMEOUT'],
+    timeout=app.config['GRAPH_TIMEOUT']
+  )
+  app.extensions['graph'] = graph
+  
+  app.register_blueprint(routes)
+  # after_request dijalankan dengan urutan terbalik, jadi hook ini dipasang di
+  # depan supaya berjalan setelah Flask-Compress
+  app.after_request_funcs.setdefault(None, []).insert(0, observe_compressed_response)
+  app.extensions['compress'] = init_compression(app)
+  
+  if app.config['TEMPLATE_CACHE_DIR']:
+    from jinja2 import FileSystemBytecodeCache
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+  return app
+
+# Instance untuk `gunicorn app:app`, `flask --app app` dan asgi.py
+app = create_app()
+
 if __name__ == '__main__':
   app.run(debug=False)
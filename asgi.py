@@ -0,0 +1,1025 @@
+#!/usr/bin/python
+
+# Copyright 2025 Rahmat Adha
+# Licensed under the Apache License, Version 2.0
+# Nama author tidak boleh diubah atau dihapus.
+
+# Entry point ASGI (opsional). Route /callback, /api/validate-token,
+# /api/graph-request dan stream /api/token-events dijalankan async dengan
+# httpx, jadi menunggu Graph API (atau event token) tidak menahan thread
+# worker. Route lain tetap dilayani app Flask biasa.
+#
+#   pip install -r requirements-async.txt
+#   uvicorn asgi:application --workers 4
+
+import io
+import os
+import sys
+import json
+import zlib
+import time
+import itertools
+import asyncio
+import brotli
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from flask import Response, request, jsonify
+
+import app as core
+
+ASYNC_GRAPH_MAX_CONNECTIONS = int(os.getenv('ASYNC_GRAPH_MAX_CONNECTIONS', '1000'))
+
+# ==================== STATE BACKEND ====================
+
+async def state_call(fn, *args):
+  """Jalankan fn yang membaca/menulis state backend
+  
+  Backend bersama (SQLite/Redis) berarti I/O disk/jaringan yang blocking,
+  jadi fn dijalankan di thread supaya event loop tidak tertahan. Backend
+  memory cukup dipanggil langsung.
+  """
+  if core.state_backend.shared:
+    return await asyncio.to_thread(fn, *args)
+  return fn(*args)
+
+# ==================== ASYNC GRAPH API CLIENT ====================
+
+def with_timeout(upstream_request, remaining):
+  """Salinan request GET dengan timeout dibatasi sisa budget (detik)"""
+  timeout = dict(upstream_request.extensions['timeout'])
+  timeout['read'] = remaining
+  timeout['connect'] = min(timeout['connect'], remaining)
+  return httpx.Request(
+    upstream_request.method,
+    upstream_request.url,
+    headers=upstream_request.headers,
+    extensions={**upstream_request.extensions, 'timeout': timeout}
+  )
+
+class AsyncGraphClient:
+  """Async HTTP client untuk Graph API dengan keep-alive connection pool"""
+
+  def __init__(self, base_url, max_connections=1000, pool_size=10, connect_timeout=5, timeout=15):
+    self.base_url = base_url.rstrip('/')
+    self.max_connections = max_connections
+    self.pool_size = pool_size
+    self.connect_timeout = connect_timeout
+    self.timeout = timeout
+    self._client = None
+
+  @property
+  def client(self):
+    """httpx.AsyncClient dibuat saat pertama dipakai (di dalam event loop)"""
+    if self._client is None:
+      self._client = httpx.AsyncClient(
+        limits=httpx.Limits(
+          max_connections=self.max_connections,
+          max_keepalive_connections=self.pool_size
+        ),
+        timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+      )
+    return self._client
+
+  def url(self, path):
+    """Build full Graph API URL dari path relatif"""
+    return f'{self.base_url}/{path.lstrip("/")}'
+
+  def _timeout(self, timeout):
+    return httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout)
+
+  async def request(self, method, path, params=None, json=None, data=None, timeout=None, operation=None, idempotent=True):
+    """Kirim request ke Graph API, timeout bisa di-override per call
+    
+    idempotent=False: GET dikirim tepat sekali (tanpa retry dan hedge).
+    """
+    upstream_request = self.client.build_request(
+      method,
+      self.url(path),
+      params=params,
+      json=json,
+      data=data,
+      timeout=self._timeout(timeout)
+    )
+    return await self._send(upstream_request, operation, path, core.request_access_token(params, data), idempotent=idempotent)
+
+  async def stream(self, method, path, params=None, json=None, timeout=None, operation=None):
+    """Kirim request dan kembalikan response yang body-nya belum dibaca"""
+    upstream_request = self.client.build_request(
+      method,
+      self.url(path),
+      params=params,
+      json=json,
+      timeout=self._timeout(timeout)
+    )
+    return await self._send(upstream_request, operation, path, core.request_access_token(params), stream=True)
+
+  async def _send(self, upstream_request, operation, path, access_token, stream=False, idempotent=True):
+    """Kirim request dengan retry, hedging dan circuit breaker (sama seperti core.GraphClient)"""
+    if upstream_request.method != 'GET' or not idempotent:
+      return await self._attempt(upstream_request, operation, path, access_token, stream)
+
+    read_timeout = upstream_request.extensions['timeout']['read']
+    deadline = time.monotonic() + read_timeout
+    hedge = core.GRAPH_HEDGE and not stream
+    for attempt in itertools.count():
+      attempt_request = with_timeout(upstream_request, core.time_left(deadline))
+      send = lambda: self._attempt(attempt_request, operation, path, access_token, stream)
+      error = response = None
+      try:
+        response = await (self._hedged(path, send) if hedge else send())
+        if response.status_code < 500:
+          return response
+        reason = 'server_error'
+      except httpx.TimeoutException as e:
+        error, reason = e, 'timeout'
+      except httpx.TransportError as e:
+        error, reason = e, 'connection'
+
+      delay = core.retry_backoff(attempt)
+      if attempt >= core.GRAPH_RETRY_MAX or core.time_left(deadline) <= delay:
+        if error is not None:
+          raise error
+        return response
+      if response is not None:
+        await response.aclose()
+      core.graph_retries.inc(reason)
+      await asyncio.sleep(delay)
+
+  async def _hedged(self, path, send):
+    """Jalankan send(); kalau belum selesai setelah delay hedge, kirim sekali lagi"""
+    delay = core.graph_hedging.delay(core.graph_path_template(path))
+    if delay is None:
+      return await send()
+
+    primary = asyncio.ensure_future(send())
+    done, _ = await asyncio.wait((primary,), timeout=delay)
+    if done or core.graph_breaker.state != 'closed' or not core.graph_hedging.acquire():
+      return await primary
+
+    hedge = asyncio.ensure_future(send())
+    pending = {primary, hedge}
+    while pending:
+      done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+      for task in done:
+        if task.exception() is None and task.result().status_code < 500:
+          for other in pending:
+            other.cancel()
+          if task is hedge:
+            core.graph_hedging.record_win()
+          return task.result()
+    return task.result()
+
+  async def _attempt(self, upstream_request, operation, path, access_token, stream=False):
+    """Kirim satu request dengan throttling rate limit, circuit breaker dan metrics"""
+    fingerprint = core.token_fingerprint(access_token) if access_token else None
+    delay, retry_after = await state_call(core.graph_usage.admit, fingerprint)
+    if retry_after:
+      core.observe_graph_call(operation, path, 'rate_limited', 0.0)
+      raise core.GraphRateLimited(retry_after)
+    if delay:
+      await asyncio.sleep(delay)
+    retry_after = core.graph_breaker.admit()
+    if retry_after:
+      core.observe_graph_call(operation, path, 'circuit_open', 0.0)
+      raise core.GraphCircuitOpen(retry_after)
+
+    status = 'error'
+    healthy = None
+    started = time.perf_counter()
+    try:
+      response = await self.client.send(upstream_request, stream=stream)
+      status = str(response.status_code)
+      healthy = response.status_code < 500
+      error_code = None
+      if response.status_code >= 400 and not stream:
+        error_code = core.graph_error_code(response)
+      await state_call(core.graph_usage.update, response.headers, fingerprint, error_code)
+      return response
+    except httpx.TimeoutException:
+      status = 'timeout'
+      healthy = False
+      raise
+    except httpx.TransportError:
+      healthy = False
+      raise
+    except asyncio.CancelledError:
+      # Hedge yang kalah dibatalkan begitu salah satu call selesai
+      status = 'cancelled'
+      raise
+    finally:
+      seconds = time.perf_counter() - started
+      core.graph_breaker.record(healthy)
+      if healthy and upstream_request.method == 'GET':
+        core.graph_hedging.observe(core.graph_path_template(path), seconds)
+      core.observe_graph_call(operation, path, status, seconds)
+
+  async def get_shared(self, path, params=None, timeout=None, operation=None):
+    """GET dan parse JSON, return (status_code, body); GET identik yang sedang berjalan dipakai bersama"""
+    async def fetch():
+      return core.response_payload(await self.request('GET', path, params=params, timeout=timeout, operation=operation))
+    return await agraph_flight.do(core.coalesce_key('GET', path, params), fetch)
+
+  async def get_json(self, path, params=None, timeout=None):
+    return (await self.get_shared(path, params=params, timeout=timeout))[1]
+
+  async def follow(self, next_url, timeout=None):
+    """GET URL paging.next dari response Graph API"""
+    core.check_paging_url(self.base_url, next_url)
+    async def fetch():
+      upstream_request = self.client.build_request('GET', next_url, timeout=self._timeout(timeout))
+      response = await self._send(upstream_request, 'paging', httpx.URL(next_url).path, core.request_access_token(url=next_url))
+      return core.response_payload(response)
+    return (await agraph_flight.do(core.paging_coalesce_key(next_url), fetch))[1]
+
+  async def batch(self, items, access_token, timeout=None):
+    """Kirim beberapa request sekaligus lewat Graph batch API"""
+    response = await self.request('POST', '', data=core.batch_payload(items, access_token), timeout=timeout)
+    return core.parse_batch_results(response.json())
+
+  async def aclose(self):
+    if self._client is not None:
+      await self._client.aclose()
+      self._client = None
+
+class AsyncSingleFlight:
+  """Versi async core.SingleFlight untuk satu event loop
+  
+  Call pertama dijalankan sebagai task; semua caller menunggu task itu lewat
+  shield, jadi timeout/cancel di satu caller tidak membatalkan caller lain.
+  """
+
+  def __init__(self, enabled=True):
+    self.enabled = enabled
+    self._tasks = {}
+
+  async def do(self, key, fn):
+    if not self.enabled:
+      return await fn()
+
+    task = self._tasks.get(key)
+    if task is None:
+      task = asyncio.ensure_future(fn())
+      self._tasks[key] = task
+      task.add_done_callback(lambda done: self._release(key, done))
+    else:
+      core.graph_coalesced.inc()
+    return await asyncio.shield(task)
+
+  def _release(self, key, task):
+    if self._tasks.get(key) is task:
+      del self._tasks[key]
+    # Ambil exception supaya tidak muncul warning kalau semua caller sudah batal
+    if not task.cancelled():
+      task.exception()
+
+agraph_flight = AsyncSingleFlight(enabled=core.GRAPH_COALESCE)
+
+# Config Graph sama dengan app Flask yang dilayani (core.app)
+agraph = AsyncGraphClient(
+  core.app.config['GRAPH_API_URL'],
+  max_connections=ASYNC_GRAPH_MAX_CONNECTIONS,
+  pool_size=core.app.config['GRAPH_POOL_SIZE'],
+  connect_timeout=core.app.config['GRAPH_CONNECT_TIMEOUT'],
+  timeout=core.app.config['GRAPH_TIMEOUT']
+)
+
+async def result_before(task, deadline, default):
+  """Ambil hasil task sebelum deadline (loop time), atau default kalau timeout"""
+  remaining = max(0.0, deadline - asyncio.get_running_loop().time())
+  try:
+    return await asyncio.wait_for(task, remaining)
+  except asyncio.TimeoutError:
+    return default
+
+# ==================== ASYNC GRAPH HELPERS ====================
+
+async def exchange_long_lived_token(access_token):
+  """Exchange token ke long-lived token, None kalau gagal"""
+  try:
+    new_token_data = await agraph.get_json('oauth/access_token', {
+      'grant_type': 'fb_exchange_token',
+      'client_id': core.FB_APP_ID,
+      'client_secret': core.FB_APP_SECRET,
+      'fb_exchange_token': access_token
+    })
+    if 'error' in new_token_data:
+      core.logger.warning(f'Token exchange failed: {new_token_data["error"]}')
+      return None
+    return new_token_data
+  except Exception as e:
+    core.logger.warning(f'Token exchange error: {str(e)}')
+    return None
+
+async def fetch_permissions(access_token):
+  """Ambil daftar permissions token, None kalau gagal"""
+  try:
+    permissions_data = await agraph.get_json('me/permissions', {'access_token': access_token})
+    if 'error' in permissions_data:
+      return None
+    return permissions_data.get('data', [])
+  except Exception:
+    return None
+
+async def iter_paging_bodies(body, max_pages=core.PAGES_MAX_PAGES, timeout=None):
+  """Versi async core.iter_paging_bodies, halaman berikutnya di-prefetch sebagai task"""
+  pages_fetched = 1
+  next_task = None
+  try:
+    while True:
+      if 'error' in body:
+        raise core.GraphAPIError(body['error'])
+
+      next_url = body.get('paging', {}).get('next')
+      next_task = None
+      if next_url and pages_fetched < max_pages:
+        next_task = asyncio.ensure_future(agraph.follow(next_url, timeout))
+
+      yield body
+
+      if next_task is None:
+        return
+      body = await next_task
+      next_task = None
+      pages_fetched += 1
+  finally:
+    if next_task is not None:
+      next_task.cancel()
+
+async def follow_paging(body, max_pages=core.PAGES_MAX_PAGES, timeout=None):
+  """Versi async core.follow_paging"""
+  async for page in iter_paging_bodies(body, max_pages=max_pages, timeout=timeout):
+    yield page.get('data', [])
+
+async def fetch_pages(access_token):
+  """Ambil semua pages beserta permissions-nya, None kalau gagal"""
+  pages = []
+  try:
+    body = await agraph.get_json('me/accounts', {
+      'fields': 'id,name,access_token,category,perms',
+      'access_token': access_token,
+      'limit': core.PAGES_PAGE_SIZE
+    })
+    async for batch in follow_paging(body):
+      pages.extend(core.with_page_permissions(page) for page in batch)
+  except Exception as e:
+    if not pages:
+      return None
+    core.logger.warning(f'Pages listing truncated: {str(e)}')
+  return pages
+
+async def collect_pages(body):
+  """Kumpulkan semua pages dari body /me/accounts pertama"""
+  pages = []
+  try:
+    async for batch in follow_paging(body):
+      pages.extend(batch)
+  except Exception as e:
+    core.logger.warning(f'Pages listing truncated: {str(e)}')
+  return pages
+
+async def fetch_login_data(access_token):
+  """Versi async core.fetch_login_data (satu batch, fallback berurutan)"""
+  try:
+    results = await agraph.batch([
+      core.batch_item('GET', 'me', {'fields': 'id,name,email,picture.type(large)'}),
+      core.batch_item('GET', 'me/permissions'),
+      core.batch_item('GET', 'me/accounts', {'fields': 'id,name,access_token,category', 'limit': core.PAGES_PAGE_SIZE})
+    ], access_token)
+  except (core.GraphRateLimited, core.GraphCircuitOpen):
+    raise
+  except Exception as e:
+    core.logger.warning(f'Batch request failed, falling back to sequential: {str(e)}')
+    results = None
+
+  if results and results[0] and results[1]:
+    user_info = results[0]['body'] or {}
+    all_permissions = (results[1]['body'] or {}).get('data', [])
+    pages = []
+    if core.has_pages_permission(all_permissions) and results[2]:
+      pages = await collect_pages(results[2]['body'] or {})
+    return user_info, all_permissions, pages
+
+  # Fallback: request berurutan
+  user_info = await agraph.get_json('me', {
+    'fields': 'id,name,email,picture.type(large)',
+    'access_token': access_token
+  })
+  if 'error' in user_info:
+    return user_info, [], []
+
+  permissions_data = await agraph.get_json('me/permissions', {'access_token': access_token})
+  all_permissions = permissions_data.get('data', [])
+
+  pages = []
+  if core.has_pages_permission(all_permissions):
+    try:
+      body = await agraph.get_json('me/accounts', {
+        'fields': 'id,name,access_token,category',
+        'access_token': access_token,
+        'limit': core.PAGES_PAGE_SIZE
+      })
+      pages = await collect_pages(body)
+    except Exception as e:
+      core.logger.warning(f'Pages listing truncated: {str(e)}')
+  return user_info, all_permissions, pages
+
+async def introspect_token(access_token, refresh=False, include_pages=True):
+  """Versi async core.introspect_token dengan cache dan response yang sama"""
+  fingerprint = core.token_fingerprint(access_token)
+  if refresh:
+    await state_call(core.invalidate_token_cache, access_token)
+
+  keys = [(fingerprint, kind) for kind in ('profile', 'exchange', 'permissions', 'pages')]
+  user_data, cached_exchange, all_permissions, pages = await state_call(core.introspection_cache.get_many, keys)
+  # Sama seperti core.introspect_token: pages lokal diambil ulang bersama profile
+  if user_data is None:
+    pages = None
+
+  deadline = asyncio.get_running_loop().time() + core.VALIDATE_DEADLINE
+  exchange_task = None
+  if cached_exchange is None:
+    exchange_task = asyncio.ensure_future(exchange_long_lived_token(access_token))
+  permissions_task = None
+  if all_permissions is None:
+    permissions_task = asyncio.ensure_future(fetch_permissions(access_token))
+
+  def cancel_branches():
+    for task in (exchange_task, permissions_task):
+      if task:
+        task.cancel()
+
+  if user_data is None:
+    try:
+      user_data = await asyncio.wait_for(agraph.get_json('me', {
+        'fields': 'id,name,email,picture.type(large)',
+        'access_token': access_token
+      }), max(0.0, deadline - asyncio.get_running_loop().time()))
+    except (httpx.TimeoutException, asyncio.TimeoutError):
+      cancel_branches()
+      return {
+        'success': False,
+        'error': 'Request timeout - Facebook API tidak merespons'
+      }, 408
+    except core.GraphRateLimited as e:
+      cancel_branches()
+      return core.rate_limited_payload(e), 429
+    except core.GraphCircuitOpen as e:
+      cancel_branches()
+      return core.circuit_open_payload(e), 503
+    except (httpx.HTTPError, ValueError) as e:
+      cancel_branches()
+      return {
+        'success': False,
+        'error': f'Gagal menghubungi Facebook API: {str(e)}'
+      }, 500
+
+    if 'error' in user_data:
+      cancel_branches()
+      return core.token_error_payload(user_data), 200
+
+    await state_call(core.cache_introspection, fingerprint, 'profile', user_data)
+
+  # known hanya berisi bagian yang valid (dari cache atau fetch berhasil)
+  known = {'profile': user_data}
+  if exchange_task:
+    new_token_data = await result_before(exchange_task, deadline, None)
+    if new_token_data and 'access_token' in new_token_data:
+      cached_exchange = core.exchange_cache_entry(new_token_data)
+      await state_call(core.cache_introspection, fingerprint, 'exchange', cached_exchange)
+  if cached_exchange is not None:
+    known['exchange'] = cached_exchange
+  new_token_data = core.exchange_from_cache(cached_exchange)
+
+  if permissions_task:
+    all_permissions = await result_before(permissions_task, deadline, None)
+    if all_permissions is None:
+      all_permissions = []
+    else:
+      await state_call(core.cache_introspection, fingerprint, 'permissions', all_permissions)
+      known['permissions'] = all_permissions
+  else:
+    known['permissions'] = all_permissions
+
+  if not include_pages:
+    pages = None
+  elif not core.has_pages_permission(all_permissions):
+    pages = []
+    if 'permissions' in known:
+      known['pages'] = pages
+  elif pages is None:
+    token_to_use = new_token_data.get('access_token') if new_token_data else access_token
+    pages = await result_before(fetch_pages(token_to_use), deadline, None)
+    if pages is None:
+      pages = []
+    else:
+      await state_call(core.cache_introspection, fingerprint, 'pages', pages)
+      known['pages'] = pages
+  else:
+    known['pages'] = pages
+
+  if new_token_data and new_token_data['access_token'] != access_token:
+    await state_call(core.seed_introspection_cache, new_token_data['access_token'], known)
+
+  return core.build_introspection_payload(user_data, new_token_data, all_permissions, pages), 200
+
+async def validate_with_registry(access_token, refresh=False, include_pages=True):
+  """Versi async core.validate_with_registry, akses SQLite dijalankan di thread"""
+  registry = core.token_registry
+  if registry is None:
+    return await introspect_token(access_token, refresh=refresh, include_pages=include_pages)
+
+  if not refresh:
+    payload = await asyncio.to_thread(registry.lookup, access_token)
+    if payload is not None:
+      return payload, 200
+
+  payload, status_code = await introspect_token(access_token, refresh=refresh, include_pages=include_pages)
+  try:
+    await asyncio.to_thread(registry.record, access_token, payload)
+  except Exception as e:
+    core.logger.warning(f'Token registry write failed: {str(e)}')
+  return payload, status_code
+
+# ==================== STREAMING ====================
+
+def choose_encoding(accept_encoding):
+  """Pilih encoding untuk response stream sesuai COMPRESS_ALGORITHM"""
+  accepted = set()
+  for part in accept_encoding.split(','):
+    name, _, params = part.strip().partition(';')
+    if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+      continue
+    accepted.add(name.strip().lower())
+  for algorithm in core.app.config['COMPRESS_ALGORITHM']:
+    if algorithm in accepted or '*' in accepted:
+      return algorithm
+  return None
+
+class StreamEncoder:
+  """Kompresi chunk demi chunk untuk response stream (br/gzip)"""
+
+  def __init__(self, encoding):
+    self.encoding = encoding
+    if encoding == 'br':
+      self._compressor = brotli.Compressor(quality=core.app.config['COMPRESS_BR_LEVEL'])
+    elif encoding == 'gzip':
+      self._compressor = zlib.compressobj(core.app.config['COMPRESS_LEVEL'], zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    else:
+      self._compressor = None
+
+  def encode(self, chunk):
+    if self._compressor is None:
+      return chunk
+    if self.encoding == 'br':
+      return self._compressor.process(chunk)
+    return self._compressor.compress(chunk)
+
+  def finish(self):
+    if self._compressor is None:
+      return b''
+    if self.encoding == 'br':
+      return self._compressor.finish()
+    return self._compressor.flush()
+
+async def stream_graph_response(spec):
+  """Passthrough mode /api/graph-request: body upstream diteruskan per chunk"""
+  try:
+    try:
+      upstream = await agraph.stream(
+        spec['method'],
+        spec['path'],
+        params=spec['params'],
+        json=spec['body'],
+        timeout=core.GRAPH_PROXY_TIMEOUT,
+        operation='proxy'
+      )
+    finally:
+      # Sama seperti mode biasa: POST/DELETE membuang cache object tersebut
+      if spec['method'] != 'GET':
+        await state_call(core.invalidate_graph_object, spec['path'], spec['params'])
+  except core.GraphRateLimited as e:
+    return core.rate_limited_response(e)
+  except core.GraphCircuitOpen as e:
+    return core.circuit_open_response(e)
+  except httpx.TimeoutException:
+    return jsonify({
+      'error': 'Request Timeout',
+      'message': 'Request took too long to complete'
+    }), 408
+  except httpx.HTTPError as e:
+    return jsonify({
+      'error': 'Request Failed',
+      'message': str(e)
+    }), 500
+
+  async def chunks():
+    try:
+      async for chunk in upstream.aiter_bytes(core.GRAPH_STREAM_CHUNK_SIZE):
+        yield chunk
+    finally:
+      await upstream.aclose()
+
+  return stream_response(
+    chunks(),
+    upstream.status_code,
+    upstream.headers.get('Content-Type', 'application/json')
+  )
+
+def stream_response(chunks, status, content_type):
+  """Flask Response dengan body async generator, dikompresi per chunk"""
+  response = Response(status=status, content_type=content_type)
+
+  # Aturan kompresi mengikuti Flask-Compress
+  encoding = None
+  if 200 <= status < 300 and response.mimetype in core.app.config['COMPRESS_MIMETYPES']:
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+  if encoding:
+    response.headers['Content-Encoding'] = encoding
+
+  async def body():
+    encoder = StreamEncoder(encoding)
+    try:
+      async for chunk in chunks:
+        data = encoder.encode(chunk)
+        if data:
+          yield data
+      data = encoder.finish()
+      if data:
+        yield data
+    finally:
+      await chunks.aclose()
+
+  response.async_body = body()
+  return response
+
+async def paginate_graph_items(body, max_items, max_pages, max_bytes=core.GRAPH_PAGINATE_MAX_BYTES, timeout=None):
+  """Versi async core.paginate_graph_items (baris NDJSON dalam bytes)"""
+  items = pages = sent_bytes = 0
+  truncated = None
+  at_boundary = False
+  page = body
+  try:
+    async for page in iter_paging_bodies(body, max_pages=max_pages, timeout=timeout):
+      pages += 1
+      for item in page.get('data', []):
+        if items >= max_items:
+          truncated = 'max_items'
+          break
+        line = (json.dumps(item) + '\n').encode('utf-8')
+        sent_bytes += len(line)
+        if sent_bytes > max_bytes:
+          truncated = 'max_bytes'
+          break
+        items += 1
+        yield line
+
+      has_next = bool(page.get('paging', {}).get('next'))
+      if not truncated and has_next and items >= max_items:
+        truncated = 'max_items'
+        at_boundary = True
+      if truncated:
+        break
+    else:
+      if page.get('paging', {}).get('next'):
+        truncated = 'max_pages'
+        at_boundary = True
+  except core.GraphAPIError as e:
+    yield (json.dumps({'error': e.error}) + '\n').encode('utf-8')
+    return
+  except httpx.HTTPError as e:
+    yield (json.dumps({'error': {'message': str(e)}}) + '\n').encode('utf-8')
+    return
+
+  summary = {'items': items, 'pages': pages, 'truncated': truncated is not None, 'reason': truncated}
+  if at_boundary:
+    summary['cursors'] = page.get('paging', {}).get('cursors')
+  yield (json.dumps({'paging': summary}) + '\n').encode('utf-8')
+
+# ==================== ASYNC ROUTES ====================
+
+async def callback():
+  """Handle OAuth callback dari Facebook"""
+  error_response, code = core.check_callback_request()
+  if error_response:
+    return error_response
+
+  try:
+    # OAuth code hanya bisa dipakai sekali: tanpa retry, hedge maupun single-flight
+    token_response = await agraph.request('GET', 'oauth/access_token', params=core.code_exchange_params(code), idempotent=False)
+    token_data = core.response_payload(token_response)[1]
+
+    if 'error' in token_data:
+      return core.render_token_error(token_data)
+
+    user_info, all_permissions, pages = await fetch_login_data(token_data.get('access_token'))
+    return core.render_callback_result(token_data, user_info, all_permissions, pages)
+
+  except core.GraphRateLimited as e:
+    return core.render_callback_error(
+      "Rate Limited",
+      f"Rate limit Facebook API tercapai, coba lagi dalam {e.retry_after} detik",
+      'rate_limited'
+    )
+  except core.GraphCircuitOpen as e:
+    return core.render_callback_error(
+      "Service Unavailable",
+      f"Facebook API sedang bermasalah, coba lagi dalam {e.retry_after} detik",
+      'circuit_open'
+    )
+  except httpx.TimeoutException:
+    core.logger.error('Request timeout in callback')
+    return core.render_callback_error(
+      "Timeout",
+      "Request timeout - Facebook API tidak merespons",
+      'timeout',
+      "Request timeout"
+    )
+  except Exception as e:
+    core.logger.error(f'Exception in callback: {str(e)}')
+    return core.render_callback_error("Exception", str(e), 'exception')
+
+async def validate_token():
+  """API endpoint untuk validasi token dan exchange ke long-lived token"""
+  try:
+    if not request.is_json:
+      return jsonify({
+        'success': False,
+        'error': 'Content-Type must be application/json'
+      }), 400
+
+    data = request.get_json()
+    if not isinstance(data, dict):
+      return jsonify({
+        'success': False,
+        'error': 'Body harus berupa JSON object'
+      }), 400
+    access_token = data.get('access_token')
+
+    if not access_token:
+      return jsonify({
+        'success': False,
+        'error': 'Access token tidak ditemukan'
+      }), 400
+
+    if not isinstance(access_token, str) or len(access_token) < 50:
+      return jsonify({
+        'success': False,
+        'error': 'Invalid access token format'
+      }), 400
+
+    response_data, status_code = await validate_with_registry(
+      access_token,
+      refresh=bool(data.get('refresh')),
+      include_pages=data.get('pages', True) is not False
+    )
+    response = jsonify(response_data)
+    if 'retry_after' in response_data:
+      response.headers['Retry-After'] = str(response_data['retry_after'])
+    return response, status_code
+
+  except Exception as e:
+    core.logger.error(f'Exception in validate_token: {str(e)}')
+    return jsonify({
+      'success': False,
+      'error': f'Server error: {str(e)}'
+    }), 500
+
+async def graph_request():
+  """API endpoint untuk Graph API requests"""
+  try:
+    if not request.is_json:
+      return jsonify({
+        'error': 'Invalid Content-Type',
+        'message': 'Content-Type must be application/json'
+      }), 400
+
+    error_response, spec = core.parse_graph_request(request.get_json())
+    if error_response:
+      return error_response
+
+    if spec['stream']:
+      return await stream_graph_response(spec)
+
+    try:
+      if spec['paginate']:
+        status_code, response_data = await agraph.get_shared(
+          spec['path'],
+          params=spec['params'],
+          timeout=core.GRAPH_PROXY_TIMEOUT,
+          operation='proxy'
+        )
+        if status_code != 200 or not isinstance(response_data, dict) or 'error' in response_data:
+          return jsonify(response_data), status_code
+        return stream_response(paginate_graph_items(
+          response_data,
+          spec['paginate']['max_items'],
+          spec['paginate']['max_pages'],
+          timeout=core.GRAPH_PROXY_TIMEOUT
+        ), 200, 'application/x-ndjson')
+
+      # GET biasa lewat cache dan single-flight; POST/DELETE tidak pernah
+      # digabung maupun di-cache
+      if spec['method'] == 'GET':
+        ttl = core.graph_cache_ttl(spec['path'])
+        cache_key = await state_call(core.graph_cache_key, spec['path'], spec['params']) if ttl else None
+        if cache_key and not spec['refresh']:
+          cached = await state_call(core.graph_response_cache.get, cache_key)
+          if cached is not None:
+            return core.proxy_response(cached, 200, 'HIT')
+
+        status_code, response_data = await agraph.get_shared(
+          spec['path'],
+          params=spec['params'],
+          timeout=core.GRAPH_PROXY_TIMEOUT,
+          operation='proxy'
+        )
+        if cache_key:
+          await state_call(core.store_graph_response, cache_key, status_code, response_data, ttl)
+        return core.proxy_response(response_data, status_code, 'MISS')
+
+      try:
+        response = await agraph.request(
+          spec['method'],
+          spec['path'],
+          params=spec['params'],
+          json=spec['body'],
+          timeout=core.GRAPH_PROXY_TIMEOUT,
+          operation='proxy'
+        )
+      finally:
+        await state_call(core.invalidate_graph_object, spec['path'], spec['params'])
+    except core.GraphRateLimited as e:
+      return core.rate_limited_response(e)
+    except core.GraphCircuitOpen as e:
+      return core.circuit_open_response(e)
+    except httpx.TimeoutException:
+      return jsonify({
+        'error': 'Request Timeout',
+        'message': 'Request took too long to complete'
+      }), 408
+    except httpx.HTTPError as e:
+      return jsonify({
+        'error': 'Request Failed',
+        'message': str(e)
+      }), 500
+
+    status_code, response_data = core.response_payload(response)
+    return jsonify(response_data), status_code
+
+  except Exception as e:
+    core.logger.error(f'Exception in graph_request: {str(e)}')
+    return jsonify({
+      'error': 'Server Error',
+      'message': str(e)
+    }), 500
+
+async def token_events():
+  """Versi async core.token_events: stream tidak menahan thread selama menunggu"""
+  if not request.is_json:
+    return jsonify({
+      'success': False,
+      'error': 'Content-Type must be application/json'
+    }), 400
+
+  error_response, tokens = core.parse_token_events(request.get_json())
+  if error_response:
+    return error_response
+
+  watch = core.TokenWatch(tokens, core.TOKEN_EVENTS_RECHECK, core.TOKEN_EVENTS_KEEPALIVE, core.TOKEN_EVENTS_MAX_AGE)
+
+  async def generate():
+    while not watch.done:
+      # Recheck memakai Graph batch dan token registry (blocking), jadi di thread
+      events = await asyncio.to_thread(watch.poll)
+      yield watch.render(events).encode('utf-8')
+      await asyncio.sleep(watch.wait_time())
+
+  response = stream_response(generate(), 200, 'text/event-stream')
+  response.headers['Cache-Control'] = 'no-cache'
+  response.headers['X-Accel-Buffering'] = 'no'
+  return response
+
+ASYNC_ROUTES = {
+  ('GET', '/callback'): callback,
+  ('POST', '/api/validate-token'): validate_token,
+  ('POST', '/api/graph-request'): graph_request,
+  ('POST', '/api/token-events'): token_events
+}
+
+# Stream token events tidak menahan thread di sini, jadi selalu aktif
+# (halaman yang dirender app Flask ikut memakai stream, bukan fallback)
+core.app.config['TOKEN_EVENTS'] = True
+
+# ==================== ASGI APPLICATION ====================
+
+def build_environ(scope, body):
+  """Build WSGI environ dari ASGI scope supaya request context Flask bisa dipakai"""
+  server = scope.get('server') or ('localhost', 80)
+  environ = {
+    'REQUEST_METHOD': scope['method'],
+    'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+    'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+    'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+    'SERVER_NAME': server[0],
+    'SERVER_PORT': str(server[1] or 80),
+    'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+    'wsgi.version': (1, 0),
+    'wsgi.url_scheme': scope.get('scheme', 'http'),
+    'wsgi.input': io.BytesIO(body),
+    'wsgi.errors': sys.stderr,
+    'wsgi.multithread': True,
+    'wsgi.multiprocess': True,
+    'wsgi.run_once': False
+  }
+  if scope.get('client'):
+    environ['REMOTE_ADDR'] = scope['client'][0]
+    environ['REMOTE_PORT'] = str(scope['client'][1])
+
+  for name, value in scope.get('headers', []):
+    name = name.decode('latin-1')
+    value = value.decode('latin-1')
+    if name == 'content-type':
+      key = 'CONTENT_TYPE'
+    elif name == 'content-length':
+      key = 'CONTENT_LENGTH'
+    else:
+      key = 'HTTP_' + name.upper().replace('-', '_')
+    if key in environ:
+      separator = '; ' if key == 'HTTP_COOKIE' else ','
+      environ[key] = f'{environ[key]}{separator}{value}'
+    else:
+      environ[key] = value
+  return environ
+
+async def read_body(receive):
+  body = b''
+  while True:
+    message = await receive()
+    body += message.get('body', b'')
+    if not message.get('more_body'):
+      return body
+
+async def send_response(response, send):
+  """Kirim Flask Response (biasa atau async stream) ke ASGI server"""
+  async_body = getattr(response, 'async_body', None)
+  if async_body is not None:
+    response.headers.pop('Content-Length', None)
+
+  headers = [
+    (name.lower().encode('latin-1'), value.encode('latin-1'))
+    for name, value in response.headers.items()
+  ]
+  await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+
+  if async_body is not None:
+    async for chunk in async_body:
+      await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+    return
+
+  try:
+    for chunk in response.iter_encoded():
+      await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+  finally:
+    response.close()
+
+async def dispatch(view, scope, receive, send):
+  """Jalankan async view di dalam request context Flask (hooks, session, template)"""
+  flask_app = core.app
+  environ = build_environ(scope, await read_body(receive))
+  with flask_app.request_context(environ):
+    try:
+      rv = flask_app.preprocess_request()
+      if rv is None:
+        rv = await view()
+      response = flask_app.finalize_request(rv)
+    except Exception as e:
+      response = flask_app.finalize_request(flask_app.handle_user_exception(e), from_error_handler=True)
+    await send_response(response, send)
+
+async def lifespan(receive, send):
+  while True:
+    message = await receive()
+    if message['type'] == 'lifespan.startup':
+      await send({'type': 'lifespan.startup.complete'})
+    elif message['type'] == 'lifespan.shutdown':
+      await agraph.aclose()
+      await send({'type': 'lifespan.shutdown.complete'})
+      return
+
+wsgi_application = WsgiToAsgi(core.app)
+
+async def application(scope, receive, send):
+  """ASGI application: route API async, sisanya diteruskan ke Flask (WSGI)"""
+  if scope['type'] == 'lifespan':
+    await lifespan(receive, send)
+    return
+
+  if scope['type'] == 'http':
+    view = ASYNC_ROUTES.get((scope['method'], scope['path']))
+    if view:
+      await dispatch(view, scope, receive, send)
+      return
+
+  await wsgi_application(scope, receive, send)
@@ -0,0 +1,472 @@
+#!/usr/bin/python
+
+# Copyright 2025 Rahmat Adha
+# Licensed under the Apache License, Version 2.0
+# Nama author tidak boleh diubah atau dihapus.
+
+# Benchmark app.py terhadap fake Graph API lokal.
+#
+#   python bench.py                         # semua skenario, hasil ke bench_results.json
+#   python bench.py -s validate-token -n 500 -c 20
+#   python bench.py --engine asgi           # jalankan lewat uvicorn asgi:application
+#   python bench.py --compare old.json      # bandingkan dengan hasil sebelumnya
+#   python bench.py --startup 20            # waktu start proses sampai response pertama
+#
+# Setiap skenario menjalankan fake Graph API dan app di proses terpisah,
+# lalu mencatat throughput, latency p50/p95/p99 dan peak RSS proses app.
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import socket
+import random
+import argparse
+import platform
+import threading
+import subprocess
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# ==================== SCENARIOS ====================
+
+# fake: konfigurasi fake Graph API (latency_ms, jitter_ms, error_rate,
+# payload_kb, pages, page_size, app_usage)
+SCENARIOS = {
+  'callback': {
+    'route': 'callback',
+    'fake': {'latency_ms': 50, 'pages': 3}
+  },
+  'callback-many-pages': {
+    'route': 'callback',
+    'fake': {'latency_ms': 50, 'pages': 500}
+  },
+  'validate-token': {
+    'route': 'validate-token',
+    'fake': {'latency_ms': 50, 'pages': 3}
+  },
+  'validate-token-warm': {
+    'route': 'validate-token',
+    'same_token': True,
+    'fake': {'latency_ms': 50, 'pages': 3}
+  },
+  'validate-token-many-pages': {
+    'route': 'validate-token',
+    'fake': {'latency_ms': 50, 'pages': 500}
+  },
+  'graph-request': {
+    'route': 'graph-request',
+    'fake': {'latency_ms': 50, 'payload_kb': 4}
+  },
+  'graph-request-large': {
+    'route': 'graph-request',
+    'fake': {'latency_ms': 50, 'payload_kb': 1024}
+  },
+  'graph-request-stream': {
+    'route': 'graph-request',
+    'body': {'stream': True},
+    'fake': {'latency_ms': 50, 'payload_kb': 1024}
+  },
+  'graph-request-errors': {
+    'route': 'graph-request',
+    'fake': {'latency_ms': 50, 'payload_kb': 4, 'error_rate': 0.05}
+  },
+  'graph-request-rate-limited': {
+    'route': 'graph-request',
+    'fake': {'latency_ms': 50, 'payload_kb': 4, 'app_usage': 100}
+  }
+}
+
+# ==================== FAKE GRAPH API ====================
+
+class FakeGraphHandler(BaseHTTPRequestHandler):
+  """Stand-in graph.facebook.com dengan latency, error dan payload yang bisa diatur"""
+
+  protocol_version = 'HTTP/1.1'
+  # Header dan body ditulis terpisah; tanpa TCP_NODELAY, Nagle + delayed ACK
+  # menambah ~40 ms ke setiap response keep-alive
+  disable_nagle_algorithm = True
+  config = {}
+
+  def log_message(self, *args):
+    pass
+
+  def send_json(self, status, data, headers=None):
+    body = json.dumps(data).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json; charset=UTF-8')
+    self.send_header('Content-Length', str(len(body)))
+    usage = self.config.get('app_usage', 1)
+    self.send_header('X-App-Usage', json.dumps({'call_count': usage, 'total_cputime': 1, 'total_time': 1}))
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(body)
+
+  def padding(self):
+    return 'x' * (self.config.get('payload_kb', 0) * 1024)
+
+  def route(self, method, path, params):
+    """Return (status, body) untuk satu Graph call"""
+    config = self.config
+    if random.random() < config.get('error_rate', 0):
+      return 500, {'error': {'message': 'An unexpected error has occurred.', 'type': 'OAuthException', 'code': 2, 'is_transient': True}}
+
+    path = path.strip('/')
+    if path.startswith('v18.0'):
+      path = path[len('v18.0'):].strip('/')
+
+    if path == 'oauth/access_token':
+      seed = params.get('fb_exchange_token') or params.get('code') or ''
+      return 200, {'access_token': f'EAAB{uuid.uuid5(uuid.NAMESPACE_OID, seed).hex * 3}', 'token_type': 'bearer', 'expires_in': 5183944}
+    if path == 'me':
+      return 200, {'id': '100000000000001', 'name': 'Bench User', 'email': 'bench@example.com', 'picture': {'data': {'url': 'https://example.com/p.jpg'}}, 'padding': self.padding()}
+    if path == 'me/permissions':
+      return 200, {'data': [{'permission': name, 'status': 'granted'} for name in ('public_profile', 'email', 'pages_show_list', 'pages_manage_posts')]}
+    if path == 'me/accounts':
+      total = config.get('pages', 3)
+      limit = int(params.get('limit', config.get('page_size', 25)))
+      after = int(params.get('after', 0))
+      data = [
+        {'id': str(200000 + i), 'name': f'Page {i}', 'access_token': f'EAAPAGE{i:08d}' + 'p' * 100, 'category': 'Brand', 'perms': ['ADMINISTER', 'EDIT_PROFILE', 'CREATE_CONTENT']}
+        for i in range(after, min(total, after + limit))
+      ]
+      body = {'data': data, 'paging': {'cursors': {'before': str(after), 'after': str(after + limit)}}}
+      if after + limit < total:
+        query = f'after={after + limit}&limit={limit}&access_token={params.get("access_token", "")}'
+        body['paging']['next'] = f'http://{self.headers["Host"]}/v18.0/me/accounts?{query}'
+      return 200, body
+    if path == 'debug_token':
+      return 200, {'data': {'app_id': '1', 'is_valid': True, 'user_id': '100000000000001', 'expires_at': int(time.time()) + 5183944, 'scopes': ['email']}}
+    return 200, {'id': path.split('/')[0] or 'root', 'method': method, 'padding': self.padding()}
+
+  def handle_request(self, method):
+    parts = urlsplit(self.path)
+    params = dict(parse_qsl(parts.query))
+    length = int(self.headers.get('Content-Length') or 0)
+    raw = self.rfile.read(length) if length else b''
+    if raw and 'json' not in self.headers.get('Content-Type', ''):
+      params.update(parse_qsl(raw.decode('utf-8')))
+
+    latency = self.config.get('latency_ms', 0) + random.uniform(0, self.config.get('jitter_ms', 0))
+    time.sleep(latency / 1000)
+
+    # Batch request: semua item diproses dalam satu round trip
+    if method == 'POST' and parts.path.strip('/') in ('', 'v18.0') and 'batch' in params:
+      results = []
+      for item in json.loads(params['batch']):
+        item_parts = urlsplit(item['relative_url'])
+        item_params = dict(parse_qsl(item_parts.query))
+        item_params.setdefault('access_token', params.get('access_token', ''))
+        status, body = self.route(item.get('method', 'GET'), item_parts.path, item_params)
+        results.append({'code': status, 'headers': [], 'body': json.dumps(body)})
+      self.send_json(200, results)
+      return
+
+    status, body = self.route(method, parts.path, params)
+    self.send_json(status, body)
+
+  def do_GET(self):
+    self.handle_request('GET')
+
+  def do_POST(self):
+    self.handle_request('POST')
+
+  def do_DELETE(self):
+    self.handle_request('DELETE')
+
+def serve_fake_graph(port, config):
+  FakeGraphHandler.config = config
+  server = ThreadingHTTPServer(('127.0.0.1', port), FakeGraphHandler)
+  server.daemon_threads = True
+  server.serve_forever()
+
+# ==================== PROCESS HELPERS ====================
+
+def free_port():
+  with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+def wait_for_port(port, timeout=30):
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    try:
+      with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+        return
+    except OSError:
+      time.sleep(0.05)
+  raise RuntimeError(f'Port {port} tidak siap dalam {timeout} detik')
+
+def peak_rss_kb(pid):
+  """Peak RSS (VmHWM) sebuah proses dalam KB, None kalau tidak tersedia"""
+  try:
+    with open(f'/proc/{pid}/status') as f:
+      for line in f:
+        if line.startswith('VmHWM:'):
+          return int(line.split()[1])
+  except OSError:
+    return None
+  return None
+
+def start_fake_graph(config):
+  port = free_port()
+  process = subprocess.Popen(
+    [sys.executable, __file__, '--serve-fake-graph', str(port), '--fake-config', json.dumps(config)],
+    cwd=ROOT
+  )
+  wait_for_port(port)
+  return process, f'http://127.0.0.1:{port}'
+
+def start_app(engine, graph_base_url, wait=True):
+  port = free_port()
+  env = dict(os.environ)
+  env.update({
+    'GRAPH_BASE_URL': graph_base_url,
+    'FB_APP_ID': env.get('FB_APP_ID', '1234567890'),
+    'FB_APP_SECRET': env.get('FB_APP_SECRET', 'bench-secret'),
+    'REDIRECT_URI': env.get('REDIRECT_URI', f'http://127.0.0.1:{port}/callback'),
+    'SECRET_KEY': env.get('SECRET_KEY', 'bench-secret-key')
+  })
+  if engine == 'asgi':
+    command = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', str(port), '--log-level', 'warning']
+  else:
+    command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--with-threads', '--no-reload', '--no-debugger']
+  process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  if wait:
+    wait_for_port(port)
+  return process, f'http://127.0.0.1:{port}'
+
+def stop(process):
+  process.terminate()
+  try:
+    process.wait(timeout=10)
+  except subprocess.TimeoutExpired:
+    process.kill()
+
+# ==================== LOAD DRIVER ====================
+
+def fake_token():
+  return 'EAAB' + uuid.uuid4().hex * 2
+
+def make_request(session, app_url, scenario, token):
+  """Kirim satu request skenario, return (latency_detik, sukses)"""
+  route = scenario['route']
+  if route == 'callback':
+    # Ambil state dan cookie session dulu (tidak ikut diukur). Cookie
+    # session memakai flag Secure, jadi dikirim manual lewat header.
+    home = session.get(f'{app_url}/')
+    state = re.search(r'state=([^&"]+)', home.text).group(1)
+    cookie = home.headers['Set-Cookie'].split(';', 1)[0]
+    started = time.perf_counter()
+    response = session.get(f'{app_url}/callback', params={'code': uuid.uuid4().hex, 'state': state}, headers={'Cookie': cookie})
+    ok = response.ok and 'Security Error' not in response.text
+  elif route == 'validate-token':
+    started = time.perf_counter()
+    response = session.post(f'{app_url}/api/validate-token', json={'access_token': token})
+    ok = response.ok and response.json().get('success')
+  else:
+    body = {'access_token': token, 'method': 'GET', 'path': '/me/feed', 'params': {'fields': 'id,message'}}
+    body.update(scenario.get('body', {}))
+    started = time.perf_counter()
+    response = session.post(f'{app_url}/api/graph-request', json=body)
+    response.content
+    ok = response.ok
+  return time.perf_counter() - started, bool(ok)
+
+def percentile(sorted_values, pct):
+  if not sorted_values:
+    return None
+  index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+  return sorted_values[index]
+
+def run_load(app_url, scenario, total, concurrency, warmup):
+  shared_token = fake_token()
+  lock = threading.Lock()
+  latencies = []
+  errors = [0]
+
+  def worker(counter, measured):
+    session = requests.Session()
+    while True:
+      with lock:
+        index = next(counter, None)
+      if index is None:
+        return
+      token = shared_token if scenario.get('same_token') else fake_token()
+      try:
+        latency, ok = make_request(session, app_url, scenario, token)
+      except Exception:
+        latency, ok = None, False
+      if not measured:
+        continue
+      with lock:
+        if latency is not None:
+          latencies.append(latency)
+        if not ok:
+          errors[0] += 1
+
+  def run_phase(count, measured):
+    counter = iter(range(count))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+      for _ in range(concurrency):
+        executor.submit(worker, counter, measured)
+
+  # Warmup selesai dulu supaya tidak ikut dihitung di throughput
+  run_phase(warmup, False)
+  started = time.perf_counter()
+  run_phase(total, True)
+  elapsed = time.perf_counter() - started
+
+  latencies.sort()
+  to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+  return {
+    'requests': total,
+    'errors': errors[0],
+    'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+    'p50_ms': to_ms(percentile(latencies, 50)),
+    'p95_ms': to_ms(percentile(latencies, 95)),
+    'p99_ms': to_ms(percentile(latencies, 99))
+  }
+
+def run_scenario(name, scenario, args):
+  fake_process, graph_url = start_fake_graph(scenario['fake'])
+  app_process, app_url = start_app(args.engine, graph_url)
+  try:
+    result = run_load(app_url, scenario, args.requests, args.concurrency, args.warmup)
+    result['peak_rss_kb'] = peak_rss_kb(app_process.pid)
+  finally:
+    stop(app_process)
+    stop(fake_process)
+  result.update({'scenario': name, 'engine': args.engine, 'concurrency': args.concurrency, 'fake': scenario['fake']})
+  return result
+
+def run_startup(runs, args):
+  """Cold start: waktu dari proses app dijalankan sampai response pertama GET /"""
+  fake_process, graph_url = start_fake_graph({})
+  samples = []
+  rss = []
+  try:
+    for _ in range(runs):
+      started = time.perf_counter()
+      app_process, app_url = start_app(args.engine, graph_url, wait=False)
+      try:
+        # Polling rapat supaya resolusi pengukuran tidak ditentukan jeda polling
+        deadline = started + 30
+        while True:
+          try:
+            response = requests.get(f'{app_url}/', timeout=5)
+            if response.status_code == 200:
+              break
+          except requests.exceptions.ConnectionError:
+            pass
+          if time.perf_counter() > deadline:
+            raise RuntimeError('App tidak merespons dalam 30 detik')
+          time.sleep(0.002)
+        samples.append(time.perf_counter() - started)
+        rss.append(peak_rss_kb(app_process.pid))
+      finally:
+        stop(app_process)
+  finally:
+    stop(fake_process)
+  
+  samples.sort()
+  return {
+    'scenario': 'startup',
+    'engine': args.engine,
+    'runs': runs,
+    'p50_ms': round(percentile(samples, 50) * 1000, 1),
+    'p95_ms': round(percentile(samples, 95) * 1000, 1),
+    'min_ms': round(samples[0] * 1000, 1),
+    'peak_rss_kb': max((value for value in rss if value), default=None)
+  }
+
+# ==================== REPORT ====================
+
+def git_revision():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def print_table(results, baseline=None):
+  baseline = {(r['scenario'], r['engine']): r for r in (baseline or {}).get('results', [])}
+  header = f'{"scenario":<28}{"rps":>10}{"p50":>10}{"p95":>10}{"p99":>10}{"err":>6}{"rss MB":>9}'
+  print(header)
+  print('-' * len(header))
+  for result in results:
+    rss = f'{result["peak_rss_kb"] / 1024:.1f}' if result.get('peak_rss_kb') else '-'
+    if result['scenario'] == 'startup':
+      print(f'{"startup (first response)":<28}{"-":>10}{result["p50_ms"]:>10}{result["p95_ms"]:>10}{"-":>10}{"-":>6}{rss:>9}')
+      old = baseline.get((result['scenario'], result['engine']))
+      if old:
+        print(f'{"":<28}vs baseline: p50_ms {(result["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100:+.1f}%, p95_ms {(result["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100:+.1f}%')
+      continue
+    print(f'{result["scenario"]:<28}{result["throughput_rps"]:>10}{result["p50_ms"]:>10}{result["p95_ms"]:>10}{result["p99_ms"]:>10}{result["errors"]:>6}{rss:>9}')
+    old = baseline.get((result['scenario'], result['engine']))
+    if old:
+      deltas = []
+      for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+        if old.get(key) and result.get(key) is not None:
+          deltas.append(f'{key} {(result[key] - old[key]) / old[key] * 100:+.1f}%')
+      print(f'{"":<28}vs baseline: {", ".join(deltas)}')
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark app.py terhadap fake Graph API lokal')
+  parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS), help='skenario yang dijalankan (default: semua)')
+  parser.add_argument('-n', '--requests', type=int, default=200, help='jumlah request per skenario')
+  parser.add_argument('-c', '--concurrency', type=int, default=10, help='jumlah client paralel')
+  parser.add_argument('--warmup', type=int, default=20, help='request awal yang tidak dihitung')
+  parser.add_argument('--engine', choices=['wsgi', 'asgi'], default='wsgi')
+  parser.add_argument('-o', '--output', default='bench_results.json')
+  parser.add_argument('--compare', help='file hasil sebelumnya untuk dibandingkan')
+  parser.add_argument('--list', action='store_true', help='tampilkan daftar skenario')
+  parser.add_argument('--startup', type=int, metavar='RUNS', help='ukur cold start (proses baru sampai response pertama GET /) sebanyak RUNS kali, tanpa skenario beban')
+  parser.add_argument('--serve-fake-graph', type=int, metavar='PORT', help=argparse.SUPPRESS)
+  parser.add_argument('--fake-config', default='{}', help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.serve_fake_graph:
+    serve_fake_graph(args.serve_fake_graph, json.loads(args.fake_config))
+    return
+
+  if args.list:
+    for name, scenario in SCENARIOS.items():
+      print(f'{name:<28}{scenario["route"]:<16}{json.dumps(scenario["fake"])}')
+    return
+
+  results = []
+  if args.startup:
+    print(f'Running startup x{args.startup} ...', file=sys.stderr)
+    results.append(run_startup(args.startup, args))
+  else:
+    for name in args.scenario or list(SCENARIOS):
+      print(f'Running {name} ...', file=sys.stderr)
+      results.append(run_scenario(name, SCENARIOS[name], args))
+
+  report = {
+    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    'git_revision': git_revision(),
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'results': results
+  }
+  with open(args.output, 'w') as f:
+    json.dump(report, f, indent=2)
+
+  baseline = None
+  if args.compare:
+    with open(args.compare) as f:
+      baseline = json.load(f)
+  print_table(results, baseline)
+  print(f'\nHasil disimpan di {args.output}', file=sys.stderr)
+
+if __name__ == '__main__':
+  main()
@@ -29,17 +29,13 @@ function loadAccounts() {
     const profilePic = account.profile_picture || '';
     
     return `
-      <div class="account-item" onclick="viewAccount('${account.user_id}')">
+      <div class="account-item" data-user-id="${account.user_id}" onclick="viewAccount('${account.user_id}')">
         <div class="account-avatar">
           ${profilePic ? `<img src="${profilePic}" alt="${account.name}" onerror="this.style.display='none'; this.parentElement.textContent='${initial}';">` : initial}
         </div>
         <div class="account-info">
           <div class="account-name">${account.name || 'Unknown'}</div>
-          <div class="account-status">
-            <span class="status-badge ${account.is_active ? 'status-active' : 'status-inactive'}">
-              ${account.is_active ? '<i class="fa-solid fa-check"></i> Aktif' : '<i class="fa-solid fa-xmark"></i> Tidak Aktif'}
-            </span>
-          </div>
+          <div class="account-status">${accountStatusBadge(account)}</div>
         </div>
         <div class="account-arrow">›</div>
       </div>
@@ -47,6 +43,23 @@ function loadAccounts() {
   }).join('');
 }
 
+// Badge status aktif/tidak aktif satu akun
+function accountStatusBadge(account) {
+  return `
+    <span class="status-badge ${account.is_active ? 'status-active' : 'status-inactive'}">
+      ${account.is_active ? '<i class="fa-solid fa-check"></i> Aktif' : '<i class="fa-solid fa-xmark"></i> Tidak Aktif'}
+    </span>
+  `;
+}
+
+// Update status satu akun di list tanpa render ulang semua akun
+function updateAccountItem(account) {
+  const item = document.querySelector(`.account-item[data-user-id="${account.user_id}"]`);
+  if (!item) return;
+  
+  item.querySelector('.account-status').innerHTML = accountStatusBadge(account);
+}
+
 // View account details
 function viewAccount(userId) {
   window.location.href = `/view/${userId}`;
@@ -76,6 +89,113 @@ function saveAccountToLocalStorage(accountData) {
   localStorage.setItem('fb_accounts', JSON.stringify(accounts));
 }
 
+// Apply hasil validasi (payload /api/validate-token) ke data akun
+function applyValidationResult(account, result) {
+  if (!result.success) {
+    account.is_active = false;
+    account.error_message = result.error;
+    return account;
+  }
+  
+  const userData = result.data;
+  account.name = userData.name;
+  account.email = userData.email || '';
+  
+  if (userData.profile_picture) {
+    account.profile_picture = userData.profile_picture;
+  }
+  if (userData.permissions) {
+    account.permissions = userData.permissions;
+  }
+  if (userData.pages) {
+    account.pages = userData.pages;
+  }
+  
+  // Update token if new token is available
+  if (userData.new_token) {
+    account.access_token = userData.new_token.access_token;
+    account.token_type = userData.new_token.token_type;
+    account.expires_in = userData.new_token.expires_in;
+    account.expiry_date = userData.new_token.expiry_date;
+    account.expiry_timestamp = userData.new_token.expiry_timestamp;
+  }
+  
+  account.is_active = true;
+  account.last_updated = new Date().toISOString();
+  delete account.error_message;
+  return account;
+}
+
+// Validate all saved accounts via bulk endpoint (hasil di-render bertahap)
+async function validateAllAccounts(btn) {
+  const accounts = JSON.parse(localStorage.getItem('fb_accounts') || '[]');
+  if (accounts.length === 0) return;
+  
+  const userIds = accounts.map(acc => acc.user_id);
+  const originalHTML = btn ? btn.innerHTML : '';
+  if (btn) {
+    btn.disabled = true;
+    btn.innerHTML = '<i class="fa-solid fa-spinner fa-spin"></i> Memvalidasi...';
+  }
+  
+  try {
+    const response = await fetch('/api/validate-tokens', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({
+        access_tokens: accounts.map(acc => acc.access_token)
+      })
+    });
+    
+    if (!response.ok) {
+      const result = await response.json();
+      throw new Error(result.error || `HTTP ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const result = JSON.parse(line);
+        
+        // Update hanya akun yang hasilnya sudah datang
+        const stored = JSON.parse(localStorage.getItem('fb_accounts') || '[]');
+        const index = stored.findIndex(acc => acc.user_id === userIds[result.index]);
+        if (index === -1) continue;
+        
+        stored[index] = applyValidationResult(stored[index], result);
+        localStorage.setItem('fb_accounts', JSON.stringify(stored));
+        loadAccounts();
+      }
+    }
+  } catch (error) {
+    console.error('Bulk validation error:', error);
+    Swal.fire({
+      icon: 'error',
+      title: 'Gagal Memvalidasi',
+      text: error.message,
+      confirmButtonColor: '#667eea'
+    });
+  } finally {
+    if (btn) {
+      btn.disabled = false;
+      btn.innerHTML = originalHTML;
+    }
+  }
+}
+
 // Initialize on DOM load
 window.addEventListener('DOMContentLoaded', () => {
   loadAccounts();
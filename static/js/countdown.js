@@ -4,10 +4,14 @@
 
 // Countdown Timer JavaScript
 
+let countdownInterval = null;
+
+// Mulai (atau mulai ulang, misalnya setelah token di-refresh) countdown
 function startCountdown() {
   const countdownEl = document.getElementById('countdown');
   if (!countdownEl) return;
   
+  clearInterval(countdownInterval);
   const expiryTimestamp = parseInt(countdownEl.getAttribute('data-expiry-timestamp'));
   
   function updateCountdown() {
@@ -17,12 +21,13 @@ function startCountdown() {
     if (remainingSeconds <= 0) {
       countdownEl.innerHTML = '<span style="color: #e53e3e;">Token telah kadaluarsa</span>';
       
-      // Update status in localStorage
+      // Status di localStorage cukup diupdate sekali, setelah itu timer berhenti
+      clearInterval(countdownInterval);
       const userId = countdownEl.getAttribute('data-user-id');
       if (userId) {
         let accounts = JSON.parse(localStorage.getItem('fb_accounts') || '[]');
         const index = accounts.findIndex(acc => acc.user_id === userId);
-        if (index !== -1) {
+        if (index !== -1 && accounts[index].is_active) {
           accounts[index].is_active = false;
           localStorage.setItem('fb_accounts', JSON.stringify(accounts));
         }
@@ -38,8 +43,8 @@ function startCountdown() {
     countdownEl.textContent = `${days} Hari, ${String(hours).padStart(2, '0')}:${String(minutes).padStart(2, '0')}:${String(seconds).padStart(2, '0')}`;
   }
   
+  countdownInterval = setInterval(updateCountdown, 1000);
   updateCountdown();
-  setInterval(updateCountdown, 1000);
 }
 
 // Initialize on DOM load
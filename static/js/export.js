@@ -55,7 +55,12 @@ function showExportModal() {
             <option value="json">JSON (.json)</option>
             <option value="txt">Text (.txt)</option>
             <option value="csv">CSV (.csv)</option>
+            <option value="ndjson">NDJSON (.ndjson)</option>
           </select>
+          <label style="display: flex; align-items: center; gap: 8px; margin-top: 12px; font-size: 14px; color: #1a202c; cursor: pointer;">
+            <input type="checkbox" id="exportRefresh" style="width: 16px; height: 16px;">
+            Perbarui permissions &amp; pages dari Facebook sebelum ekspor
+          </label>
         </div>
       </div>
     `,
@@ -69,18 +74,19 @@ function showExportModal() {
       const checkboxes = document.querySelectorAll('.export-checkbox:checked');
       const selectedIds = Array.from(checkboxes).map(cb => cb.value);
       const format = document.getElementById('exportFormat').value;
+      const refresh = document.getElementById('exportRefresh').checked;
       
       if (selectedIds.length === 0) {
         Swal.showValidationMessage('Pilih minimal satu akun untuk diekspor');
         return false;
       }
       
-      return { selectedIds, format };
+      return { selectedIds, format, refresh };
     }
   }).then((result) => {
     if (result.isConfirmed) {
-      const { selectedIds, format } = result.value;
-      exportAccounts(selectedIds, format);
+      const { selectedIds, format, refresh } = result.value;
+      exportAccounts(selectedIds, format, refresh);
     }
   });
 }
@@ -92,95 +98,124 @@ function toggleSelectAll() {
   checkboxes.forEach(cb => cb.checked = selectAll.checked);
 }
 
+// Iframe tersembunyi tujuan form export, supaya response error (400/413)
+// tidak membuka halaman JSON mentah di tab
+function getExportFrame() {
+  let iframe = document.getElementById('exportFrame');
+  if (!iframe) {
+    iframe = document.createElement('iframe');
+    iframe.id = 'exportFrame';
+    iframe.name = 'exportFrame';
+    iframe.style.display = 'none';
+    document.body.appendChild(iframe);
+  }
+  return iframe;
+}
+
+// Tunggu sampai download benar-benar dimulai: server mengirim cookie
+// export_download berisi downloadToken bersama response file. Response
+// attachment tidak memuat dokumen ke iframe, jadi event load berarti
+// server menjawab dengan error.
+function waitForExportDownload(iframe, downloadToken, timeout = 120000) {
+  return new Promise((resolve, reject) => {
+    const started = Date.now();
+    
+    const onLoad = () => {
+      if (iframe.contentWindow.location.href === 'about:blank') return;
+      let message = 'Ekspor gagal, coba lagi';
+      try {
+        message = JSON.parse(iframe.contentDocument.body.innerText).error || message;
+      } catch (e) {
+        // Response bukan JSON (misalnya 413 dari server), pakai pesan umum
+      }
+      cleanup();
+      reject(new Error(message));
+    };
+    
+    const timer = setInterval(() => {
+      if (document.cookie.split('; ').includes(`export_download=${downloadToken}`)) {
+        document.cookie = 'export_download=; Max-Age=0; path=/';
+        cleanup();
+        resolve();
+      } else if (Date.now() - started > timeout) {
+        cleanup();
+        reject(new Error('Server tidak merespons, coba lagi'));
+      }
+    }, 250);
+    
+    function cleanup() {
+      clearInterval(timer);
+      iframe.removeEventListener('load', onLoad);
+    }
+    
+    iframe.addEventListener('load', onLoad);
+  });
+}
+
 // Export accounts function
-function exportAccounts(selectedIds, format) {
+// File dibuat dan di-stream oleh server (/api/export); form POST biasa dipakai
+// supaya browser menyimpan download langsung ke disk tanpa Blob di memori tab
+function exportAccounts(selectedIds, format, refresh) {
   const accounts = JSON.parse(localStorage.getItem('fb_accounts') || '[]');
   const selectedAccounts = accounts.filter(acc => selectedIds.includes(acc.user_id));
   
   const today = new Date();
   const dateStr = `${String(today.getDate()).padStart(2, '0')}-${String(today.getMonth() + 1).padStart(2, '0')}-${today.getFullYear()}`;
   const filename = `FacebookOAuth_${dateStr}`;
+  const extension = format;
+  const downloadToken = `${Date.now()}${Math.random().toString(36).slice(2)}`;
   
-  let content, mimeType, extension;
+  const iframe = getExportFrame();
+  const form = document.createElement('form');
+  form.method = 'POST';
+  form.action = '/api/export';
+  form.target = iframe.name;
+  form.style.display = 'none';
   
-  switch (format) {
-    case 'json':
-      content = JSON.stringify(selectedAccounts, null, 2);
-      mimeType = 'application/json';
-      extension = 'json';
-      break;
-      
-    case 'txt':
-      content = selectedAccounts.map(acc => {
-        return `
-===========================================
-Nama: ${acc.name}
-User ID: ${acc.user_id}
-Email: ${acc.email || 'N/A'}
-Access Token: ${acc.access_token}
-Token Type: ${acc.token_type}
-Expires In: ${acc.expires_in} detik
-Expiry Date: ${acc.expiry_date}
-Status: ${acc.is_active ? 'Aktif' : 'Tidak Aktif'}
-Last Updated: ${acc.last_updated}
-
-Permissions (${acc.permissions.length}):
-${acc.permissions.map(p => `  - ${p.permission}: ${p.status}`).join('\n')}
-
-${acc.pages && acc.pages.length > 0 ? `Pages (${acc.pages.length}):\n${acc.pages.map(page => `  - ${page.name} (${page.id})\n    Token: ${page.access_token}`).join('\n\n')}` : 'No Pages'}
-===========================================
-        `.trim();
-      }).join('\n\n');
-      mimeType = 'text/plain';
-      extension = 'txt';
-      break;
-      
-    case 'csv':
-      const headers = ['Nama', 'User ID', 'Email', 'Access Token', 'Token Type', 'Expires In', 'Expiry Date', 'Status', 'Permissions Count', 'Pages Count'];
-      const rows = selectedAccounts.map(acc => [
-        acc.name,
-        acc.user_id,
-        acc.email || 'N/A',
-        acc.access_token,
-        acc.token_type,
-        acc.expires_in,
-        acc.expiry_date,
-        acc.is_active ? 'Aktif' : 'Tidak Aktif',
-        acc.permissions.length,
-        (acc.pages || []).length
-      ]);
-      
-      content = [headers, ...rows].map(row => 
-        row.map(cell => `"${String(cell).replace(/"/g, '""')}"`).join(',')
-      ).join('\n');
-      
-      mimeType = 'text/csv';
-      extension = 'csv';
-      break;
-  }
+  const payload = document.createElement('input');
+  payload.type = 'hidden';
+  payload.name = 'payload';
+  payload.value = JSON.stringify({ accounts: selectedAccounts, format, refresh });
+  form.appendChild(payload);
   
-  // Create and download file
-  const blob = new Blob([content], { type: mimeType });
-  const url = URL.createObjectURL(blob);
-  const a = document.createElement('a');
-  a.href = url;
-  a.download = `${filename}.${extension}`;
-  document.body.appendChild(a);
-  a.click();
-  document.body.removeChild(a);
-  URL.revokeObjectURL(url);
+  const token = document.createElement('input');
+  token.type = 'hidden';
+  token.name = 'download_token';
+  token.value = downloadToken;
+  form.appendChild(token);
   
-  // Show success message
   Swal.fire({
-    icon: 'success',
-    title: 'Berhasil!',
-    html: `<div style="text-align: left;">
-      <p><strong>${selectedAccounts.length}</strong> akun berhasil diekspor</p>
-      <p style="font-size: 14px; color: #718096; margin-top: 10px;">
-        File: <strong>${filename}.${extension}</strong>
-      </p>
-    </div>`,
-    confirmButtonColor: '#667eea',
-    timer: 3000
+    title: 'Menyiapkan File...',
+    text: refresh ? 'Memperbarui data akun dari Facebook' : 'Mohon tunggu sebentar',
+    allowOutsideClick: false,
+    didOpen: () => Swal.showLoading()
+  });
+  
+  const download = waitForExportDownload(iframe, downloadToken);
+  document.body.appendChild(form);
+  form.submit();
+  document.body.removeChild(form);
+  
+  download.then(() => {
+    // Show success message
+    Swal.fire({
+      icon: 'success',
+      title: 'Berhasil!',
+      html: `<div style="text-align: left;">
+        <p>Download <strong>${selectedAccounts.length}</strong> akun dimulai</p>
+        <p style="font-size: 14px; color: #718096; margin-top: 10px;">
+          File: <strong>${filename}.${extension}</strong>
+        </p>
+      </div>`,
+      confirmButtonColor: '#667eea',
+      timer: 3000
+    });
+  }).catch(error => {
+    Swal.fire({
+      icon: 'error',
+      title: 'Ekspor Gagal',
+      text: error.message,
+      confirmButtonColor: '#667eea'
+    });
   });
 }
@@ -0,0 +1,118 @@
+//Copyright 2025 Rahmat Adha
+//Licensed under the Apache License, Version 2.0
+//Nama author tidak boleh diubah atau dihapus.
+
+// Token Events JavaScript
+// Status token (expired, revoked) dikirim server lewat /api/token-events,
+// jadi halaman tidak perlu polling validasi. Kalau stream tidak aktif
+// (WSGI tanpa TOKEN_EVENTS_WSGI), watchTokenExpiry dipakai sebagai gantinya.
+
+// Update satu akun di localStorage; fn menerima akun dan mengubahnya
+function updateStoredAccount(userId, fn) {
+  const accounts = JSON.parse(localStorage.getItem('fb_accounts') || '[]');
+  const index = accounts.findIndex(acc => acc.user_id === userId);
+  if (index === -1) return null;
+
+  fn(accounts[index]);
+  localStorage.setItem('fb_accounts', JSON.stringify(accounts));
+  return accounts[index];
+}
+
+// Terapkan satu event ke data akun
+function applyTokenEvent(account, type, data) {
+  if (type === 'status') {
+    account.is_active = true;
+    if (data.expires_at) {
+      account.expiry_timestamp = data.expires_at;
+    }
+  } else {
+    account.is_active = false;
+    if (data.error) {
+      account.error_message = data.error;
+    }
+  }
+  return account;
+}
+
+// Pecah buffer stream jadi event SSE; return sisa buffer yang belum lengkap
+function parseTokenEvents(buffer, onEvent) {
+  const frames = buffer.split('\n\n');
+  const rest = frames.pop();
+
+  for (const frame of frames) {
+    let type = 'message';
+    let data = '';
+    for (const line of frame.split('\n')) {
+      if (line.startsWith('event:')) {
+        type = line.slice(6).trim();
+      } else if (line.startsWith('data:')) {
+        data += line.slice(5).trim();
+      }
+    }
+    // Frame tanpa data adalah komentar keepalive
+    if (data) onEvent(type, JSON.parse(data));
+  }
+  return rest;
+}
+
+// Buka stream untuk semua akun aktif; onEvent(type, account) dipanggil
+// setelah akun di localStorage diupdate. Stream yang ditutup server dibuka
+// ulang langsung, stream yang gagal dicoba ulang dengan backoff, selama
+// masih ada akun aktif.
+function watchTokenEvents(onEvent, retryDelay = 1000) {
+  const accounts = JSON.parse(localStorage.getItem('fb_accounts') || '[]')
+    .filter(acc => acc.is_active && acc.access_token);
+  if (accounts.length === 0) return;
+
+  fetch('/api/token-events', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify({
+      tokens: accounts.map(acc => ({ id: acc.user_id, access_token: acc.access_token }))
+    })
+  }).then(async response => {
+    // Error request (misalnya app credential belum diset) tidak dicoba ulang
+    if (!response.ok) return;
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      buffer = parseTokenEvents(buffer, (type, data) => {
+        const account = updateStoredAccount(data.id, acc => applyTokenEvent(acc, type, data));
+        if (account && onEvent) onEvent(type, account);
+      });
+    }
+    watchTokenEvents(onEvent);
+  }).catch(error => {
+    console.error('Token events error:', error);
+    setTimeout(() => watchTokenEvents(onEvent, Math.min(retryDelay * 2, 60000)), retryDelay);
+  });
+}
+
+// Fallback tanpa stream: tandai akun expired saat expiry_timestamp lewat,
+// sama seperti countdown di halaman detail akun
+function watchTokenExpiry(onEvent) {
+  const now = Math.floor(Date.now() / 1000);
+  const accounts = JSON.parse(localStorage.getItem('fb_accounts') || '[]')
+    .filter(acc => acc.is_active && acc.expiry_timestamp);
+  
+  for (const acc of accounts) {
+    // setTimeout maksimal ~24,8 hari; expiry yang lebih jauh dicek saat halaman dibuka lagi
+    const delay = (acc.expiry_timestamp - now) * 1000;
+    if (delay > 2147483647) continue;
+    
+    setTimeout(() => {
+      const data = { id: acc.user_id, expires_at: acc.expiry_timestamp };
+      const account = updateStoredAccount(acc.user_id, stored => applyTokenEvent(stored, 'expired', data));
+      if (account && onEvent) onEvent('expired', account);
+    }, Math.max(0, delay));
+  }
+}
@@ -86,7 +86,9 @@ async function loadAndValidateAccount(userId) {
         'Content-Type': 'application/json'
       },
       body: JSON.stringify({
-        access_token: account.access_token
+        access_token: account.access_token,
+        // Pages diambil terpisah secara bertahap dari /api/pages
+        pages: false
       })
     });
     
@@ -149,6 +151,10 @@ async function loadAndValidateAccount(userId) {
       
       // Show account details
       showAccountDetails(account);
+      
+      if (!userData.pages && hasPagesPermission(account.permissions)) {
+        await streamAccountPages(account);
+      }
     }
   } catch (error) {
     console.error('Validation error:', error);
@@ -247,27 +253,9 @@ function showAccountDetails(account) {
           </div>
         </div>
         
-        ${account.pages && account.pages.length > 0 ? `
-        <div class="card full-width">
-          <div class="card-header">
-            <div class="card-icon"><i class="fa-solid fa-file-alt"></i></div>
-            <div class="card-title">Facebook Pages (${account.pages.length})</div>
-            <div class="pages-control">
-              <button class="btn-control" onclick="showPageSettings('${account.user_id}')">
-                <i class="fa-solid fa-sliders"></i>
-              </button>
-            </div>
-          </div>
-          
-          <div id="pages-container-${account.user_id}">
-            <!-- Pages will be rendered here -->
-          </div>
-          
-          <div class="pages-pagination" id="pages-pagination-${account.user_id}">
-            <!-- Pagination will be rendered here -->
-          </div>
+        <div id="pages-section-${account.user_id}">
+          ${pagesCardHtml(account)}
         </div>
-        ` : ''}
         
         <div class="card full-width">
           <div class="card-header">
@@ -303,6 +291,129 @@ function showAccountDetails(account) {
   }
 }
 
+const PAGES_PERMISSIONS = ['pages_show_list', 'pages_read_engagement', 'pages_manage_posts'];
+
+function hasPagesPermission(permissions) {
+  return (permissions || []).some(perm =>
+    perm.status === 'granted' && PAGES_PERMISSIONS.includes(perm.permission)
+  );
+}
+
+function pagesCardHtml(account) {
+  if (!account.pages || account.pages.length === 0) return '';
+  
+  return `
+  <div class="card full-width">
+    <div class="card-header">
+      <div class="card-icon"><i class="fa-solid fa-file-alt"></i></div>
+      <div class="card-title">Facebook Pages (${account.pages.length})</div>
+      <div class="pages-control">
+        <button class="btn-control" onclick="showPageSettings('${account.user_id}')">
+          <i class="fa-solid fa-sliders"></i>
+        </button>
+      </div>
+    </div>
+    
+    <div id="pages-container-${account.user_id}">
+      <!-- Pages will be rendered here -->
+    </div>
+    
+    <div class="pages-pagination" id="pages-pagination-${account.user_id}">
+      <!-- Pagination will be rendered here -->
+    </div>
+  </div>
+  `;
+}
+
+function renderPagesSection(account, initialize) {
+  const section = document.getElementById(`pages-section-${account.user_id}`);
+  if (!section) return;
+  
+  section.innerHTML = pagesCardHtml(account);
+  if (!account.pages || account.pages.length === 0) return;
+  
+  if (initialize) {
+    initializePagesDisplay(account.user_id, account.pages);
+  } else {
+    renderPages(account.user_id, account.pages);
+    renderPagination(account.user_id, account.pages);
+  }
+}
+
+// Ambil pages dari /api/pages (NDJSON, satu page per baris) dan tampilkan
+// bertahap; kalau stream gagal di tengah, pages yang sudah diterima tetap dipakai
+async function streamAccountPages(account) {
+  const pages = [];
+  let initialized = false;
+  
+  try {
+    const response = await fetch('/api/pages', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({
+        access_token: account.access_token
+      })
+    });
+    
+    if (!response.ok) {
+      const result = await response.json();
+      throw new Error(result.error || `HTTP ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      
+      let received = false;
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const item = JSON.parse(line);
+        if (item.error) {
+          throw new Error(item.error.message || 'Gagal mengambil pages');
+        }
+        pages.push(item);
+        received = true;
+      }
+      
+      if (received) {
+        // Simpan juga ke localStorage: pagination & settings membaca dari sana
+        account.pages = pages;
+        saveAccountPages(account.user_id, pages);
+        renderPagesSection(account, !initialized);
+        initialized = true;
+      }
+    }
+    
+    if (!initialized) {
+      // Tidak ada pages sama sekali
+      account.pages = pages;
+      saveAccountPages(account.user_id, pages);
+      renderPagesSection(account, false);
+    }
+  } catch (error) {
+    console.error('Pages stream error:', error);
+  }
+}
+
+function saveAccountPages(userId, pages) {
+  const accounts = JSON.parse(localStorage.getItem('fb_accounts') || '[]');
+  const accountIndex = accounts.findIndex(acc => acc.user_id === userId);
+  if (accountIndex !== -1) {
+    accounts[accountIndex].pages = pages;
+    localStorage.setItem('fb_accounts', JSON.stringify(accounts));
+  }
+}
+
 // Pages pagination state
 let pagesPagination = {
   perPage: 2,
@@ -0,0 +1,105 @@
+# Copyright 2025 Rahmat Adha
+# Licensed under the Apache License, Version 2.0
+# Nama author tidak boleh diubah atau dihapus.
+
+import app
+
+ACCESS_TOKEN = 'EAAbatch' + 'c' * 60
+
+
+def item(path, name=None, depends_on=None, params=None, body=None):
+  result = app.batch_item('POST' if body else 'GET', path, params, body)
+  if name:
+    result['name'] = name
+  if depends_on:
+    result['depends_on'] = depends_on
+  return result
+
+
+def parse(operations):
+  with app.app.test_request_context():
+    error_response, spec = app.parse_graph_batch({'access_token': ACCESS_TOKEN, 'operations': operations})
+  if error_response:
+    response, status_code = error_response
+    return status_code, response.get_json()
+  return 200, spec
+
+
+def test_independent_items_fill_chunks_in_order():
+  items = [item(f'obj{index}') for index in range(5)]
+
+  chunks, error = app.chunk_batch_items(items, 2)
+
+  assert error is None
+  assert chunks == [[0, 1], [2, 3], [4]]
+
+
+def test_dependency_chain_stays_in_one_chunk():
+  items = [
+    item('me', name='profile'),
+    item('obj1'),
+    item('me/feed', depends_on='profile'),
+    item('me', params={'ids': '{result=profile:$.id}'}),
+    item('obj2')
+  ]
+
+  chunks, error = app.chunk_batch_items(items, 3)
+
+  assert error is None
+  assert [0, 2, 3] in chunks
+  # Urutan input tetap dipertahankan di setiap chunk
+  assert all(chunk == sorted(chunk) for chunk in chunks)
+  assert sorted(index for chunk in chunks for index in chunk) == list(range(5))
+
+
+def test_chain_longer_than_chunk_is_rejected():
+  items = [item('me', name='a'), item('me', name='b', depends_on='a'), item('me', depends_on='b')]
+
+  chunks, error = app.chunk_batch_items(items, 2)
+
+  assert chunks is None
+  assert 'more than 2' in error
+
+
+def test_unknown_reference_is_rejected():
+  chunks, error = app.chunk_batch_items([item('me', params={'ids': '{result=missing:$.id}'})], 50)
+
+  assert chunks is None
+  assert 'missing' in error
+
+
+def test_forward_result_reference_returns_400():
+  status_code, body = parse([
+    {'path': 'me', 'params': {'ids': '{result=later:$.id}'}},
+    {'path': 'me', 'name': 'later'}
+  ])
+
+  assert status_code == 400
+  assert 'earlier operation' in body['message']
+
+
+def test_forward_depends_on_returns_400():
+  status_code, body = parse([
+    {'path': 'me', 'depends_on': 'later'},
+    {'path': 'me', 'name': 'later'}
+  ])
+
+  assert status_code == 400
+  assert 'earlier operation' in body['message']
+
+
+def test_duplicate_name_returns_400():
+  status_code, body = parse([{'path': 'me', 'name': 'a'}, {'path': 'me', 'name': 'a'}])
+
+  assert status_code == 400
+  assert 'Duplicate' in body['message']
+
+
+def test_backward_reference_is_grouped():
+  status_code, spec = parse([
+    {'path': 'me', 'name': 'profile'},
+    {'method': 'POST', 'path': 'me/feed', 'body': {'message': '{result=profile:$.name}'}}
+  ])
+
+  assert status_code == 200
+  assert spec['chunks'] == [[0, 1]]
@@ -0,0 +1,122 @@
+# Copyright 2025 Rahmat Adha
+# Licensed under the Apache License, Version 2.0
+# Nama author tidak boleh diubah atau dihapus.
+
+import os
+import time
+
+import pytest
+import requests
+
+import app
+
+ACCESS_TOKEN = 'EAAclient' + 'd' * 60
+
+
+class FakeSession:
+  """Session palsu: setiap call mengambil hasil berikutnya (status code atau exception)"""
+
+  def __init__(self, outcomes):
+    self.outcomes = list(outcomes)
+    self.calls = []
+
+  def request(self, method, url, **kwargs):
+    self.calls.append((method, url))
+    outcome = self.outcomes.pop(0)
+    if isinstance(outcome, Exception):
+      raise outcome
+    response = requests.Response()
+    response.status_code = outcome
+    response._content = b'{}'
+    return response
+
+
+@pytest.fixture
+def client(monkeypatch):
+  monkeypatch.setattr(app, 'graph_breaker', app.CircuitBreaker(100, 0.5, 30))
+  monkeypatch.setattr(app, 'graph_retries', app.Counter('graph_retries_total', '', ('reason',)))
+  monkeypatch.setattr(app, 'retry_backoff', lambda attempt: 0)
+  monkeypatch.setattr(app, 'GRAPH_HEDGE', False)
+  monkeypatch.setattr(app, 'GRAPH_RETRY_MAX', 2)
+  return app.GraphClient('http://graph.test')
+
+
+def use_session(client, outcomes):
+  session = FakeSession(outcomes)
+  client._session = session
+  client._pid = os.getpid()
+  return session
+
+
+def test_breaker_opens_after_failure_ratio():
+  breaker = app.CircuitBreaker(4, 0.5, 30)
+  for success in (True, True, False):
+    breaker.record(success)
+  assert breaker.state == 'closed'
+
+  breaker.record(False)
+
+  assert breaker.state == 'open'
+  assert breaker.opened == 1
+  assert breaker.admit() >= 1
+  assert breaker.rejected == 1
+
+
+def test_breaker_half_open_probe():
+  breaker = app.CircuitBreaker(2, 0.5, 0.01)
+  breaker.record(False)
+  breaker.record(False)
+  time.sleep(0.02)
+
+  # Hanya satu call percobaan yang lolos saat half-open
+  assert breaker.admit() is None
+  assert breaker.state == 'half_open'
+  assert breaker.admit() is not None
+
+  breaker.record(False)
+  assert breaker.state == 'open'
+  assert breaker.opened == 2
+
+  time.sleep(0.02)
+  assert breaker.admit() is None
+  breaker.record(True)
+  assert breaker.state == 'closed'
+
+
+def test_get_retries_server_errors(client):
+  session = use_session(client, [503, 502, 200])
+
+  response = client.get('me', params={'access_token': ACCESS_TOKEN})
+
+  assert response.status_code == 200
+  assert len(session.calls) == 3
+  assert app.graph_retries._values == {('server_error',): 2}
+
+
+def test_get_gives_up_after_retry_max(client):
+  session = use_session(client, [requests.exceptions.ConnectionError()] * 3)
+
+  with pytest.raises(requests.exceptions.ConnectionError):
+    client.get('me', params={'access_token': ACCESS_TOKEN})
+
+  assert len(session.calls) == 3
+  assert app.graph_retries._values == {('connection',): 2}
+
+
+def test_non_idempotent_get_is_sent_once(client):
+  session = use_session(client, [503, 200])
+
+  response = client.get('oauth/access_token', params={'code': 'abc'}, idempotent=False)
+
+  assert response.status_code == 503
+  assert len(session.calls) == 1
+  assert app.graph_retries._values == {}
+
+
+def test_post_is_sent_once(client):
+  session = use_session(client, [requests.exceptions.Timeout()])
+
+  with pytest.raises(requests.exceptions.Timeout):
+    client.post('me/feed', params={'access_token': ACCESS_TOKEN})
+
+  assert len(session.calls) == 1
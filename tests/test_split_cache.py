@@ -0,0 +1,71 @@
+# Copyright 2025 Rahmat Adha
+# Licensed under the Apache License, Version 2.0
+# Nama author tidak boleh diubah atau dihapus.
+
+import sqlite3
+
+import pytest
+
+import app
+
+PAGE_TOKEN = 'EAApage' + 'e' * 60
+
+
+@pytest.fixture
+def backend(tmp_path):
+  return app.SQLiteBackend(str(tmp_path / 'state.db'), 'test')
+
+
+def graph_cache(backend):
+  return backend.cache('graph-response', 1 << 20, private=lambda key, value: app.has_access_token(value))
+
+
+def stored_values(backend):
+  with sqlite3.connect(backend.path) as conn:
+    return [row[0] for row in conn.execute('SELECT value FROM state')]
+
+
+def test_token_bearing_entry_stays_local(backend):
+  cache = graph_cache(backend)
+  private = {'data': [{'id': '1', 'access_token': PAGE_TOKEN}]}
+  public = {'id': '1', 'name': 'Page'}
+
+  cache.set_many([('pages', private, 60), ('page', public, 60)])
+
+  assert isinstance(cache, app.SplitCache)
+  assert cache.get_many(['pages', 'page']) == [private, public]
+  assert not any(PAGE_TOKEN in value for value in stored_values(backend))
+
+  # Worker lain hanya melihat entry tanpa token
+  other = graph_cache(backend)
+  assert other.get_many(['pages', 'page']) == [None, public]
+
+
+def test_introspection_private_kinds(backend):
+  cache = backend.cache(
+    'introspection',
+    1 << 20,
+    private=lambda key, value: key[1] in app.INTROSPECTION_PRIVATE_KINDS
+  )
+
+  cache.set(('fp', 'exchange'), {'access_token': PAGE_TOKEN}, 60)
+  cache.set(('fp', 'profile'), {'id': '42'}, 60)
+
+  assert cache.local.get(('fp', 'exchange')) == {'access_token': PAGE_TOKEN}
+  assert cache.shared.get(('fp', 'exchange')) is None
+  assert cache.shared.get(('fp', 'profile')) == {'id': '42'}
+
+
+def test_delete_removes_both_sides(backend):
+  cache = graph_cache(backend)
+  cache.set('pages', {'access_token': PAGE_TOKEN}, 60)
+  cache.set('page', {'id': '1'}, 60)
+
+  cache.delete_many(['pages', 'page'])
+
+  assert cache.get_many(['pages', 'page']) == [None, None]
+  assert stored_values(backend) == []
+
+
+def test_memory_backend_has_no_split():
+  assert isinstance(app.MemoryBackend().cache('graph-response', 1 << 20, private=bool), app.TTLCache)
@@ -0,0 +1,73 @@
+# Copyright 2025 Rahmat Adha
+# Licensed under the Apache License, Version 2.0
+# Nama author tidak boleh diubah atau dihapus.
+
+import pytest
+
+fernet = pytest.importorskip('cryptography.fernet')
+
+import app
+
+OLD_TOKEN = 'EAAold' + 'a' * 60
+NEW_TOKEN = 'EAAnew' + 'b' * 60
+
+
+def validated_payload(new_access_token):
+  return {
+    'success': True,
+    'data': {
+      'id': '42',
+      'name': 'Test User',
+      'permissions': [],
+      'pages': [],
+      'new_token': app.new_token_info({'access_token': new_access_token, 'expires_in': 5184000})
+    }
+  }
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+  registry = app.TokenRegistry(
+    str(tmp_path / 'tokens.db'),
+    fernet.Fernet(fernet.Fernet.generate_key()),
+    refresh_before=86400,
+    recheck_interval=3600,
+    refresh_interval=60,
+    batch_size=10
+  )
+  monkeypatch.setattr(app, 'token_registry', registry)
+  return registry
+
+
+def test_lookup_serves_current_token(registry):
+  registry.record(OLD_TOKEN, validated_payload(NEW_TOKEN))
+
+  payload = registry.lookup(NEW_TOKEN)
+
+  assert payload['success']
+  assert payload['data']['new_token']['access_token'] == NEW_TOKEN
+
+
+def test_old_token_does_not_return_new_token(registry):
+  registry.record(OLD_TOKEN, validated_payload(NEW_TOKEN))
+
+  assert registry.lookup(OLD_TOKEN) is None
+
+
+def test_validate_with_registry_introspects_old_token(registry, monkeypatch):
+  registry.record(OLD_TOKEN, validated_payload(NEW_TOKEN))
+  introspected = []
+
+  def introspect_token(access_token, refresh=False, include_pages=True):
+    introspected.append(access_token)
+    return {'success': False, 'error': 'Token tidak valid atau sudah expired', 'error_code': 190}, 200
+
+  monkeypatch.setattr(app, 'introspect_token', introspect_token)
+  payload, status_code = app.validate_with_registry(OLD_TOKEN)
+
+  assert introspected == [OLD_TOKEN]
+  assert status_code == 200
+  assert not payload['success']
+  assert NEW_TOKEN not in str(payload)
+  # Error 190 untuk token lama menandai state user invalid
+  assert registry.lookup(NEW_TOKEN) is None
@@ -0,0 +1,109 @@
+# Copyright 2025 Rahmat Adha
+# Licensed under the Apache License, Version 2.0
+# Nama author tidak boleh diubah atau dihapus.
+
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+import app
+
+APP_SECRET = 'webhook-test-secret'
+
+
+def base64url(data):
+  return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def signed_request(payload, secret=APP_SECRET):
+  encoded_payload = base64url(json.dumps(payload).encode('utf-8'))
+  signature = hmac.new(secret.encode('utf-8'), encoded_payload.encode('utf-8'), hashlib.sha256).digest()
+  return f'{base64url(signature)}.{encoded_payload}'
+
+
+def hub_signature(body, secret=APP_SECRET):
+  return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def app_secret(monkeypatch):
+  monkeypatch.setattr(app, 'FB_APP_SECRET', APP_SECRET)
+
+
+@pytest.fixture
+def queued(monkeypatch):
+  calls = []
+
+  def queue_user_invalidations(kind, user_ids, revoked):
+    calls.append((kind, user_ids, revoked))
+    return app.jsonify({'success': True}), 200
+
+  monkeypatch.setattr(app, 'queue_user_invalidations', queue_user_invalidations)
+  return calls
+
+
+def test_signed_request_valid():
+  payload = {'algorithm': 'HMAC-SHA256', 'user_id': '42'}
+
+  assert app.parse_signed_request(signed_request(payload)) == payload
+
+
+@pytest.mark.parametrize('value', [
+  signed_request({'algorithm': 'HMAC-SHA256', 'user_id': '42'}, secret='other-secret'),
+  signed_request({'algorithm': 'MD5', 'user_id': '42'}),
+  signed_request({'algorithm': 'HMAC-SHA256', 'user_id': '42'}) + '.extra',
+  'not-base64!.payload',
+  None
+])
+def test_signed_request_rejected(value):
+  assert app.parse_signed_request(value) is None
+
+
+def test_signed_request_tampered_payload():
+  signature, _ = signed_request({'algorithm': 'HMAC-SHA256', 'user_id': '42'}).split('.')
+  forged = base64url(json.dumps({'algorithm': 'HMAC-SHA256', 'user_id': '43'}).encode('utf-8'))
+
+  assert app.parse_signed_request(f'{signature}.{forged}') is None
+
+
+def test_signed_request_without_app_secret(monkeypatch):
+  monkeypatch.setattr(app, 'FB_APP_SECRET', None)
+
+  assert app.parse_signed_request(signed_request({'algorithm': 'HMAC-SHA256', 'user_id': '42'})) is None
+
+
+def test_hub_signature():
+  body = b'{"object": "permissions"}'
+
+  assert app.verify_webhook_signature(body, hub_signature(body))
+  assert not app.verify_webhook_signature(body + b' ', hub_signature(body))
+  assert not app.verify_webhook_signature(body, hub_signature(body, secret='other-secret'))
+  assert not app.verify_webhook_signature(body, hub_signature(body)[len('sha256='):])
+  assert not app.verify_webhook_signature(body, '')
+
+
+def test_permissions_webhook_checks_signature(queued):
+  body = json.dumps({'object': 'permissions', 'entry': [{'uid': '42'}]}).encode('utf-8')
+  client = app.app.test_client()
+
+  rejected = client.post('/webhooks/permissions', data=body, headers={'X-Hub-Signature-256': hub_signature(b'{}')})
+  accepted = client.post('/webhooks/permissions', data=body, headers={'X-Hub-Signature-256': hub_signature(body)})
+
+  assert rejected.status_code == 403
+  assert accepted.status_code == 200
+  assert queued == [('permissions', ['42'], False)]
+
+
+def test_deauthorize_checks_signed_request(queued):
+  client = app.app.test_client()
+  valid = signed_request({'algorithm': 'HMAC-SHA256', 'user_id': '42'})
+
+  rejected = client.post('/deauthorize', data={'signed_request': valid + 'x'})
+  accepted = client.post('/deauthorize', data={'signed_request': valid})
+
+  assert rejected.status_code == 400
+  assert accepted.status_code == 200
+  assert queued == [('deauthorize', ['42'], True)]